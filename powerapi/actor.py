@@ -28,12 +28,13 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import logging
 
-from typing import Any, Type
+from typing import Any, Type, List
 from datetime import timedelta
 
 from thespian.actors import ActorTypeDispatcher, ActorAddress, ActorExitRequest, WakeupMessage
 
-from powerapi.message import PingMessage, OKMessage, ErrorMessage, StartMessage
+from powerapi.message import PingMessage, OKMessage, ErrorMessage, StartMessage, GetWakeupStatsMessage, \
+    WakeupStatsMessage, FlowControlMessage, AckMessage
 from powerapi.exception import PowerAPIExceptionWithMessage, PowerAPIException
 
 
@@ -64,6 +65,7 @@ class Actor(ActorTypeDispatcher):
         self.parent: ActorAddress = None
         self.initialized: bool = False
         self.start_message_cls = start_message_cls
+        self._ack_requesters = set()
 
     def log_critical(self, message: str):
         """
@@ -107,6 +109,31 @@ class Actor(ActorTypeDispatcher):
         self.log_debug('received message ' + str(message))
         self.send(sender, OKMessage(self.name))
 
+    def receiveMsg_FlowControlMessage(self, message: FlowControlMessage, sender: ActorAddress):
+        """
+        When receiving a FlowControlMessage, register its sender as an actor that want its reports to be acknowledged
+        """
+        self.log_debug('received message ' + str(message))
+        self._ack_requesters.add(str(sender))
+
+    def _ack_requested(self, sender: ActorAddress) -> bool:
+        """
+        :return: True if the given actor asked to acknowledge the reports it sends
+        """
+        return str(sender) in self._ack_requesters
+
+    def _acknowledge(self, upstreams: List[ActorAddress]):
+        """
+        send an AckMessage to each given actor that asked for it, with the number of times it appears in the list
+        """
+        counts = {}
+        for upstream in upstreams:
+            if self._ack_requested(upstream):
+                address, count = counts.get(str(upstream), (upstream, 0))
+                counts[str(upstream)] = (address, count + 1)
+        for address, count in counts.values():
+            self.send(address, AckMessage(self.name, count))
+
     def receiveMsg_StartMessage(self, message: StartMessage, sender: ActorAddress):
         """
         When receiving a StartMessage :
@@ -163,14 +190,25 @@ class Actor(ActorTypeDispatcher):
 class TimedActor(Actor):
     """
     An actor that process a task at regular time interval
+
+    The time interval adapts to the workload : it is halved (down to a minimum) after each task that found data to
+    process and doubled (up to a maximum) after each task that found nothing
     """
 
-    def __init__(self, start_message_cls, time_interval: float):
+    def __init__(self, start_message_cls, time_interval: float, min_time_interval: float = None,
+                 max_time_interval: float = None):
         """
         :param time_interval: time (in seconds) to wait between each task to launch
+        :param min_time_interval: lower bound (in seconds) of the time interval, time_interval if None
+        :param max_time_interval: upper bound (in seconds) of the time interval, time_interval if None
         """
         Actor.__init__(self, start_message_cls)
         self._time_interval = timedelta(seconds=time_interval)
+        self._min_time_interval = timedelta(seconds=time_interval if min_time_interval is None else min_time_interval)
+        self._max_time_interval = timedelta(seconds=time_interval if max_time_interval is None else max_time_interval)
+        self._current_time_interval = self._time_interval
+        self._hit_count = 0
+        self._miss_count = 0
 
     def receiveMsg_StartMessage(self, message: StartMessage, sender: ActorAddress):
         """
@@ -178,7 +216,7 @@ class TimedActor(Actor):
         ask the actor system to wake after a given time period
         """
         Actor.receiveMsg_StartMessage(self, message, sender)
-        self.wakeupAfter(self._time_interval)
+        self.wakeupAfter(self._current_time_interval)
 
     def receiveMsg_WakeupMessage(self, _: WakeupMessage, __: ActorAddress):
         """
@@ -190,5 +228,32 @@ class TimedActor(Actor):
             self.log_error('received a wakeup message without being initialized before')
             raise ActorNotInitializedException()
 
+    def receiveMsg_GetWakeupStatsMessage(self, message: GetWakeupStatsMessage, sender: ActorAddress):
+        """
+        When receiving a GetWakeupStatsMessage, answer with the current time interval and the task hit/miss counts
+        """
+        self.log_debug('received message ' + str(message))
+        self.send(sender, WakeupStatsMessage(self.name, self._current_time_interval.total_seconds(), self._hit_count,
+                                             self._miss_count))
+
+    def _schedule_next_task(self, data_found: bool, backlog: bool = False):
+        """
+        Adapt the time interval to the result of the last task and ask the actor system to wake the actor up after it
+
+        :param data_found: True if the last task found data to process
+        :param backlog: True if the last task left data to process, the actor is then woken up immediately
+        """
+        if data_found:
+            self._hit_count += 1
+            self._current_time_interval = max(self._current_time_interval / 2, self._min_time_interval)
+        else:
+            self._miss_count += 1
+            self._current_time_interval = min(self._current_time_interval * 2, self._max_time_interval)
+
+        self.wakeupAfter(timedelta(seconds=0) if backlog else self._current_time_interval)
+
     def _launch_task(self):
+        """
+        Process the actor task, implementations must call _schedule_next_task to be woken up again
+        """
         raise NotImplementedError()
@@ -0,0 +1,129 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+from datetime import datetime
+from typing import Hashable, List, Tuple
+
+from thespian.actors import ActorAddress, ActorExitRequest
+
+from powerapi.actor import Actor, InitializationException
+from powerapi.message import AggregatorStartMessage, EndMessage, ReportBatch
+from powerapi.report import PowerReport
+from powerapi.utils import TumblingWindowAggregator, AggregationWindow
+
+
+class AggregatorActor(Actor):
+    """
+    AggregatorActor class
+
+    The Aggregator sits between formulas and pushers. It aggregates the received power reports per sensor, target and
+    tag values over tumbling windows and sends one power report per window to the pushers, so that they save one report
+    per window instead of one per sample.
+
+    The power of an aggregated report is the mean power over the window. Its metadata contains the tag values, the min
+    and max power, the energy (in joules) and the number of aggregated reports. A report is acknowledged once it is
+    aggregated.
+    """
+
+    def __init__(self):
+        Actor.__init__(self, AggregatorStartMessage)
+        self.pushers = None
+        self.tags = None
+        self.window_aggregator: TumblingWindowAggregator = None
+        self._timezone = None
+
+    def _initialization(self, start_message: AggregatorStartMessage):
+        Actor._initialization(self, start_message)
+        if start_message.window_length <= 0:
+            raise InitializationException('window length must be greater than 0')
+        if not start_message.pushers:
+            raise InitializationException('no pusher given to the aggregator')
+        self.pushers = start_message.pushers
+        self.tags = start_message.tags
+        self.window_aggregator = TumblingWindowAggregator(start_message.window_length)
+
+    def receiveMsg_PowerReport(self, message: PowerReport, sender: ActorAddress):
+        """
+        When receiving a PowerReport, add it to its window and send the closed windows to the pushers
+        """
+        self.log_debug('received message ' + str(message))
+        self._aggregate([message])
+        self._acknowledge([sender])
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, sender: ActorAddress):
+        """
+        When receiving a ReportBatch, add its reports to their window and send the closed windows to the pushers
+        """
+        self.log_debug('received message ' + str(message))
+        self._aggregate(message.reports)
+        self._acknowledge([sender])
+
+    def _aggregate(self, reports: List[PowerReport]):
+        closed = []
+        for report in reports:
+            key = (report.sensor, report.target, self._freeze_tags(report))
+            self._timezone = report.timestamp.tzinfo
+            closed += self.window_aggregator.add(key, report.timestamp.timestamp(), report.power, report.sensor)
+        self._send_to_pushers(closed)
+
+    def _freeze_tags(self, report: PowerReport) -> Tuple:
+        """
+        Return the aggregation tag values of the report as a hashable tuple of (tag, json dump of the value), as tag
+        values can be unhashable (lists, dicts)
+        """
+        return tuple((tag, json.dumps(report.metadata[tag], sort_keys=True, default=str)) for tag in self.tags if tag in report.metadata)
+
+    def _send_to_pushers(self, windows: List[Tuple[Hashable, AggregationWindow]]):
+        """
+        Send one power report per closed window to all the pushers
+        """
+        if not windows:
+            return
+        batch = ReportBatch(self.name, [self._gen_report(key, window) for key, window in windows])
+        for _, pusher in self.pushers.items():
+            self.send(pusher, batch)
+
+    def _gen_report(self, key: Hashable, window: AggregationWindow) -> PowerReport:
+        sensor, target, tags = key
+        metadata = {tag: json.loads(value) for tag, value in tags}
+        metadata['min_power'] = window.min
+        metadata['max_power'] = window.max
+        metadata['energy'] = window.energy
+        metadata['sample_count'] = window.count
+        return PowerReport(datetime.fromtimestamp(window.start, self._timezone), sensor, target, window.mean, metadata)
+
+    def receiveMsg_EndMessage(self, message: EndMessage, _: ActorAddress):
+        """
+        When receiving an EndMessage, send the open windows and forward the EndMessage to the pushers, then kill itself
+        """
+        self.log_debug('received message ' + str(message))
+        self._send_to_pushers(self.window_aggregator.pop_all())
+        for _, pusher in self.pushers.items():
+            self.send(pusher, EndMessage(self.name))
+        self.send(self.myAddress, ActorExitRequest())
@@ -31,16 +31,20 @@ import os
 import sys
 from typing import Dict, Tuple, Type
 
+from thespian.actors import ActorAddress
+
 from powerapi.actor import Actor
 from powerapi.database.influxdb2 import InfluxDB2
 from powerapi.exception import PowerAPIException
 from powerapi.report import HWPCReport, PowerReport, ControlReport, ProcfsReport
 from powerapi.database import MongoDB, CsvDB, InfluxDB, OpenTSDB, SocketDB, PrometheusDB, DirectPrometheusDB, \
-    VirtioFSDB, FileDB
+    VirtioFSDB, FileDB, ThreadedSocketDB
 from powerapi.puller import PullerActor
 from powerapi.pusher import PusherActor
+from powerapi.fan_out_pusher import FanOutPusherActor
+from powerapi.aggregator import AggregatorActor
 from powerapi.message import StartMessage, PusherStartMessage, PullerStartMessage, SimplePusherStartMessage, \
-    SimplePullerStartMessage
+    SimplePullerStartMessage, FanOutPusherStartMessage, AggregatorStartMessage
 from powerapi.report_modifier.libvirt_mapper import LibvirtMapper
 from powerapi.simple_puller import SimplePullerActor
 from powerapi.simple_pusher import SimplePusherActor
@@ -151,7 +155,9 @@ class DBActorGenerator(Generator):
         self.db_factory = {
             'mongodb': lambda db_config: MongoDB(db_config['model'], db_config['uri'], db_config['db'],
                                                  db_config['collection']),
-            'socket': lambda db_config: SocketDB(db_config['model'], db_config['port']),
+            'socket': lambda db_config: ThreadedSocketDB(db_config['model'], db_config['port'],
+                                                         0 if 'max_queue_size' not in db_config else db_config['max_queue_size'])
+            if 'threaded' in db_config and db_config['threaded'] else SocketDB(db_config['model'], db_config['port']),
             'csv': lambda db_config: CsvDB(db_config['model'], gen_tag_list(db_config),
                                            current_path=os.getcwd() if 'directory' not in db_config else db_config[
                                                'directory'],
@@ -252,6 +258,22 @@ class PullerGenerator(DBActorGenerator):
         self.report_filter = report_filter
         self.report_modifier_list = report_modifier_list
 
+    def _gen_actor(self, db_name, db_config, main_config, actor_name):
+        actor, start_message = DBActorGenerator._gen_actor(self, db_name, db_config, main_config, actor_name)
+        if 'batch_size' in db_config:
+            start_message.batch_size = db_config['batch_size']
+        if 'time_budget' in db_config:
+            start_message.time_budget = db_config['time_budget']
+        if 'report_batch_size' in db_config:
+            start_message.report_batch_size = db_config['report_batch_size']
+        if 'linger_time' in db_config:
+            start_message.linger_time = db_config['linger_time']
+        if 'credits' in db_config:
+            start_message.credits = db_config['credits']
+        if 'overflow_policy' in db_config:
+            start_message.overflow_policy = db_config['overflow_policy']
+        return actor, start_message
+
     def _actor_factory(self, db_config):
         return PullerActor
 
@@ -311,14 +333,45 @@ class SimplePullerGenerator(SimpleGenerator):
         return SimplePullerStartMessage('system', name, db['number_of_reports_to_send'], self.report_filter, model)
 
 
+#: name of the pusher generated when the fan-out mode is enabled
+FAN_OUT_PUSHER_NAME = 'fan_out_pusher'
+
+
 class PusherGenerator(DBActorGenerator):
     """
     Generate Pusher actor and Pusher start message from config
+
+    When the fan-out mode is enabled, generate only one FanOutPusher actor that saves reports to all the outputs
     """
 
     def __init__(self):
         DBActorGenerator.__init__(self, 'output')
 
+    def generate(self, config: Dict) -> Dict[str, Tuple[Type[Actor], StartMessage]]:
+        actors = DBActorGenerator.generate(self, config)
+        if 'fan_out' not in config or not config['fan_out']:
+            return actors
+        outputs = {name: start_message for name, (_, start_message) in actors.items()}
+        return {FAN_OUT_PUSHER_NAME: (FanOutPusherActor, FanOutPusherStartMessage('system', FAN_OUT_PUSHER_NAME, outputs))}
+
+    def _gen_actor(self, db_name, db_config, main_config, actor_name):
+        actor, start_message = DBActorGenerator._gen_actor(self, db_name, db_config, main_config, actor_name)
+        if 'batch_size' in db_config:
+            start_message.batch_size = db_config['batch_size']
+        if 'linger_time' in db_config:
+            start_message.linger_time = db_config['linger_time']
+        if 'async_writes' in db_config:
+            start_message.async_writes = db_config['async_writes']
+        if 'write_queue_size' in db_config:
+            start_message.write_queue_size = db_config['write_queue_size']
+        if 'spill_directory' in db_config:
+            start_message.spill_directory = db_config['spill_directory']
+        if 'spill_retry_period' in db_config:
+            start_message.spill_retry_period = db_config['spill_retry_period']
+        if 'max_spill_retry_period' in db_config:
+            start_message.max_spill_retry_period = db_config['max_spill_retry_period']
+        return actor, start_message
+
     def _actor_factory(self, _):
         return PusherActor
 
@@ -341,6 +394,27 @@ class SimplePusherGenerator(SimpleGenerator):
         return SimplePusherStartMessage('system', name)
 
 
+#: name of the aggregator generated when an aggregation window is given
+AGGREGATOR_NAME = 'aggregator'
+
+
+class AggregatorGenerator:
+    """
+    Generate Aggregator actor and Aggregator start message from config
+    """
+
+    def generate(self, config: Dict, pushers: Dict[str, ActorAddress]) -> Dict[str, Tuple[Type[Actor], StartMessage]]:
+        """
+        Generate an aggregator that sends the aggregated power reports to the given pushers, no aggregator is generated
+        if no aggregation window is given
+        """
+        if 'aggregation_window' not in config or config['aggregation_window'] is None:
+            return {}
+        tags = [] if 'aggregation_tags' not in config or config['aggregation_tags'] is None else config['aggregation_tags'].split(',')
+        start_message = AggregatorStartMessage('system', AGGREGATOR_NAME, pushers, config['aggregation_window'], tags)
+        return {AGGREGATOR_NAME: (AggregatorActor, start_message)}
+
+
 class ReportModifierGenerator:
     """
     Generate Report modifier list from config
@@ -45,6 +45,106 @@ def extract_file_names(arg, val, args, acc):
     return args, acc
 
 
+def add_puller_arguments(subparser: SubConfigParser):
+    """
+    add to an input subparser the arguments used to configure how the puller drains its database
+    """
+    subparser.add_argument(
+        "B",
+        "batch_size",
+        type=int,
+        help="specify the maximum number of reports pulled each time the puller wakes up",
+        default=10,
+    )
+    subparser.add_argument(
+        "T",
+        "time_budget",
+        type=float,
+        help="specify the maximum time (in seconds) spent pulling reports each time the puller wakes up",
+    )
+    subparser.add_argument(
+        "R",
+        "report_batch_size",
+        type=int,
+        help="specify the maximum number of reports sent to a dispatcher in one message, 1 to send them one by one",
+        default=1,
+    )
+    subparser.add_argument(
+        "L",
+        "linger_time",
+        type=float,
+        help="specify the maximum time (in seconds) a report can wait for its batch to be sent",
+        default=0.1,
+    )
+    subparser.add_argument(
+        "C",
+        "credits",
+        type=int,
+        help="specify the maximum number of messages sent to a dispatcher that are not processed by the whole pipeline,"
+             " flow control is disabled if not set",
+    )
+    subparser.add_argument(
+        "O",
+        "overflow_policy",
+        help="specify what to do when a dispatcher has no credit left : pause (stop pulling) or drop (drop the reports)",
+        default="pause",
+    )
+
+
+def add_pusher_arguments(subparser: SubConfigParser):
+    """
+    add to an output subparser the arguments used to configure how the pusher saves reports to its database
+    """
+    subparser.add_argument(
+        "B",
+        "batch_size",
+        type=int,
+        help="specify the maximum number of reports saved to the database in one call, 1 to save them as they come",
+        default=1,
+    )
+    subparser.add_argument(
+        "L",
+        "linger_time",
+        type=float,
+        help="specify the maximum time (in seconds) a report can wait before being saved to the database",
+        default=0.1,
+    )
+    subparser.add_argument(
+        "W",
+        "async_writes",
+        flag=True,
+        action=store_true,
+        default=False,
+        help="save reports from a background thread so that the pusher does not wait for the database",
+    )
+    subparser.add_argument(
+        "Q",
+        "write_queue_size",
+        type=int,
+        help="specify the maximum number of writes waiting for the background thread, 0 for no limit",
+        default=100,
+    )
+    subparser.add_argument(
+        "S",
+        "spill_directory",
+        help="specify the directory where the reports that can't be saved are spilled until the database recovers",
+    )
+    subparser.add_argument(
+        "R",
+        "spill_retry_period",
+        type=float,
+        help="specify the time (in seconds) to wait before saving spilled reports back to the database",
+        default=1.0,
+    )
+    subparser.add_argument(
+        "X",
+        "max_spill_retry_period",
+        type=float,
+        help="specify the maximum time (in seconds) to wait before saving spilled reports back to the database",
+        default=60.0,
+    )
+
+
 class CommonCLIParser(MainConfigParser):
     """
     PowerAPI basic config parser
@@ -69,6 +169,25 @@ class CommonCLIParser(MainConfigParser):
             default=False,
             help="enable stream mode",
         )
+        self.add_argument(
+            "F",
+            "fan_out",
+            flag=True,
+            action=store_true,
+            default=False,
+            help="save reports to all the outputs with one pusher, so that formulas send each report once",
+        )
+        self.add_argument(
+            "A",
+            "aggregation_window",
+            type=float,
+            help="specify the length (in seconds) of the windows power reports are aggregated over before being saved",
+        )
+        self.add_argument(
+            "G",
+            "aggregation_tags",
+            help="specify the metadata, separated by commas, that identify the power reports aggregated together",
+        )
 
         subparser_libvirt_mapper_modifier = SubConfigParser("libvirt_mapper")
         subparser_libvirt_mapper_modifier.add_argument(
@@ -105,6 +224,7 @@ class CommonCLIParser(MainConfigParser):
             help="specify data type that will be storen in the database",
             default="HWPCReport",
         )
+        add_puller_arguments(subparser_mongo_input)
         self.add_subparser(
             "input",
             subparser_mongo_input,
@@ -118,12 +238,28 @@ class CommonCLIParser(MainConfigParser):
         subparser_socket_input.add_argument(
             "n", "name", help="specify puller name", default="puller_socket"
         )
+        subparser_socket_input.add_argument(
+            "t",
+            "threaded",
+            flag=True,
+            action=store_true,
+            default=False,
+            help="run the socket server in a background thread that decodes reports as soon as they arrive",
+        )
+        subparser_socket_input.add_argument(
+            "q",
+            "max_queue_size",
+            type=int,
+            default=0,
+            help="specify the maximum number of decoded reports waiting for the puller in threaded mode, 0 for no limit",
+        )
         subparser_socket_input.add_argument(
             "m",
             "model",
             help="specify data type that will be sent through the socket",
             default="HWPCReport",
         )
+        add_puller_arguments(subparser_socket_input)
         self.add_subparser(
             "input",
             subparser_socket_input,
@@ -147,6 +283,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_csv_input.add_argument(
             "n", "name", help="specify puller name", default="puller_csv"
         )
+        add_puller_arguments(subparser_csv_input)
         self.add_subparser(
             "input",
             subparser_csv_input,
@@ -164,6 +301,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_file_input.add_argument(
             "n", "name", help="specify pusher name", default="pusher_filedb"
         )
+        add_puller_arguments(subparser_file_input)
         self.add_subparser(
             "input",
             subparser_file_input,
@@ -181,6 +319,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_file_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_filedb"
         )
+        add_pusher_arguments(subparser_file_output)
         self.add_subparser(
             "output",
             subparser_file_output,
@@ -217,6 +356,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_virtiofs_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_virtiofs"
         )
+        add_pusher_arguments(subparser_virtiofs_output)
         self.add_subparser(
             "output",
             subparser_virtiofs_output,
@@ -241,6 +381,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_mongo_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_mongodb"
         )
+        add_pusher_arguments(subparser_mongo_output)
         self.add_subparser(
             "output",
             subparser_mongo_output,
@@ -276,6 +417,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_prom_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_prom"
         )
+        add_pusher_arguments(subparser_prom_output)
         self.add_subparser(
             "output",
             subparser_prom_output,
@@ -308,6 +450,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_direct_prom_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_prom"
         )
+        add_pusher_arguments(subparser_direct_prom_output)
         self.add_subparser(
             "output",
             subparser_direct_prom_output,
@@ -331,6 +474,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_csv_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_csv"
         )
+        add_pusher_arguments(subparser_csv_output)
         self.add_subparser(
             "output",
             subparser_csv_output,
@@ -355,6 +499,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_influx_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_influxdb"
         )
+        add_pusher_arguments(subparser_influx_output)
         self.add_subparser(
             "output",
             subparser_influx_output,
@@ -379,6 +524,7 @@ class CommonCLIParser(MainConfigParser):
         subparser_opentsdb_output.add_argument(
             "n", "name", help="specify pusher name", default="pusher_opentsdb"
         )
+        add_pusher_arguments(subparser_opentsdb_output)
         self.add_subparser(
             "output",
             subparser_opentsdb_output,
@@ -407,6 +553,7 @@ class CommonCLIParser(MainConfigParser):
             "n", "name", help="specify pusher name", default="pusher_influxdb2"
         )
 
+        add_pusher_arguments(subparser_influx2_output)
         self.add_subparser(
             "output",
             subparser_influx2_output,
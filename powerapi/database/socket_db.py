@@ -27,16 +27,21 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import asyncio
+import logging
+from queue import Queue, Empty, Full
+from threading import Thread
 from typing import Type, List
 import json
 
 
 from powerapi.utils import JsonStream
-from powerapi.report import Report
+from powerapi.report import Report, BadInputData
 from .base_db import IterDB, BaseDB, DBError
 
 BUFFER_SIZE = 4096
 SOCKET_TIMEOUT = 0.5
+#: time (in seconds) to wait for a report before considering that no sensor sends reports anymore, in non stream mode
+NON_STREAM_TIMEOUT = 2
 
 
 class SocketDB(BaseDB):
@@ -77,11 +82,16 @@ class SocketDB(BaseDB):
                     count += 1
                     continue
                 count = 0
-                await self.queue.put(json_str)
-                # self.queue.put(json_str)
+                await self._on_json_object(json_str)
 
         return callback
 
+    async def _on_json_object(self, json_str: str):
+        """
+        handle a json object received from the socket
+        """
+        await self.queue.put(json_str)
+
     def __iter__(self):
         raise DBError('Socket db don\'t support __iter__ method')
 
@@ -109,11 +119,99 @@ class IterSocketDB(IterDB):
 
     async def __anext__(self):
         try:
-            json_str = await asyncio.wait_for(self.queue.get(), 2)
-            # json = self.queue.get_nowait()
-            # self.queue.get()
-            report = self.report_type.from_json(json.loads(json_str))
-            return report
-        # except Empty:
+            json_str = await asyncio.wait_for(self.queue.get(), NON_STREAM_TIMEOUT)
         except asyncio.TimeoutError:
             return None
+        try:
+            return self.report_type.from_json(json.loads(json_str))
+        except ValueError as exn:
+            raise BadInputData('can\'t decode json object : ' + str(exn), json_str) from exn
+
+
+class ThreadedSocketDB(SocketDB):
+    """
+    SocketDB that runs its server on an event loop owned by a background thread
+
+    The server reads and decodes reports as soon as they arrive, whether or not the puller is pulling at this moment.
+    Decoded reports wait in a thread-safe queue that the puller drains without blocking. When this queue is full, the
+    server stops reading the sockets until the puller pulls reports
+    """
+
+    def __init__(self, report_type: Type[Report], port: int, max_queue_size: int = 0):
+        """
+        :param max_queue_size: maximum number of decoded reports waiting for the puller, 0 for no limit
+        """
+        SocketDB.__init__(self, report_type, port)
+        self.asynchrone = False
+        self.max_queue_size = max_queue_size
+        self.loop = None
+        self.thread = None
+
+    def connect(self):
+        self.queue = Queue(self.max_queue_size)
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        server_creation = asyncio.start_server(self._gen_server_callback(), host='0.0.0.0', port=self.port)
+        try:
+            self.server = asyncio.run_coroutine_threadsafe(server_creation, self.loop).result()
+        except OSError as exn:
+            self.close()
+            raise DBError('can\'t open socket on port ' + str(self.port) + ' : ' + str(exn)) from exn
+
+    async def _on_json_object(self, json_str: str):
+        try:
+            report = self.report_type.from_json(json.loads(json_str))
+        except BadInputData as exn:
+            logging.warning('BadinputData exception raised for input data' + str(exn.input_data) + ' with message : ' +
+                            exn.msg)
+            return
+        except ValueError as exn:
+            # the connection keeps being served, only the malformed object is dropped
+            logging.warning('can\'t decode json object ' + json_str + ' : ' + str(exn))
+            return
+        try:
+            self.queue.put_nowait(report)
+        except Full:
+            # wait for the puller without blocking the event loop, the other connections keep being served
+            await self.loop.run_in_executor(None, self.queue.put, report)
+
+    def close(self):
+        """
+        stop the server and its thread
+        """
+        if self.server is not None:
+            asyncio.run_coroutine_threadsafe(SocketDB.stop(self), self.loop).result()
+            self.server = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def iter(self, stream_mode):
+        return IterThreadedSocketDB(self.report_type, stream_mode, self.queue)
+
+
+class IterThreadedSocketDB(IterDB):
+    """
+    iterator over the reports decoded by a ThreadedSocketDB
+
+    In stream mode, it never blocks and stops when no report is waiting. Otherwise it waits for a report for
+    NON_STREAM_TIMEOUT seconds before stopping, so that the sensors have time to connect and send their first reports
+    """
+
+    def __init__(self, report_type, stream_mode, queue):
+        IterDB.__init__(self, None, report_type, stream_mode)
+
+        self.queue = queue
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Report:
+        try:
+            if self.stream_mode:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=NON_STREAM_TIMEOUT)
+        except Empty as exn:
+            raise StopIteration() from exn
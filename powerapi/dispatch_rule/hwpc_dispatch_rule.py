@@ -72,23 +72,19 @@ class HWPCDispatchRule(DispatchRule):
         if self.depth == HWPCDepthLevel.ROOT:
             return [(report.sensor,)]
 
-        non_shared_group = _extract_non_shared_group(report)
+        if self.depth not in (HWPCDepthLevel.SOCKET, HWPCDepthLevel.CORE):
+            return []
 
+        non_shared_group = _extract_non_shared_group(report)
+        sensor = report.sensor
         if self.depth == HWPCDepthLevel.SOCKET:
-            id_list = []
-            for socket_report in non_shared_group.items():
-                id_list.append((report.sensor, socket_report[0]))
-            return id_list
-
-        if self.depth == HWPCDepthLevel.CORE:
-            id_list = []
-            for socket_report in non_shared_group.items():
-                for core_report in socket_report[1].items():
-                    id_list.append((report.sensor, socket_report[0],
-                                    core_report[0]))
-            return id_list
+            return [(sensor, socket_id) for socket_id in non_shared_group]
 
-        return []
+        id_list = []
+        for socket_id, socket_report in non_shared_group.items():
+            for core_id in socket_report:
+                id_list.append((sensor, socket_id, core_id))
+        return id_list
 
 
 def _number_of_core_per_socket(group):
@@ -98,7 +94,7 @@ def _number_of_core_per_socket(group):
     :type group: Dict
     :rtype: int : the number of core per socket in this group
     """
-    return len(list(group.values())[0])
+    return len(next(iter(group.values()), {}))
 
 
 def _extract_non_shared_group(report):
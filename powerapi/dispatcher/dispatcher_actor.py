@@ -26,18 +26,33 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import math
+import time
+from collections import OrderedDict
+from datetime import timedelta
 from typing import Type, Tuple, List
 
-from thespian.actors import ActorAddress, ActorExitRequest, ChildActorExited, PoisonMessage
+from thespian.actors import ActorAddress, ActorExitRequest, ChildActorExited, PoisonMessage, WakeupMessage
 
 from powerapi.actor import Actor, InitializationException
-from powerapi.formula import FormulaActor, FormulaValues
+from powerapi.formula import FormulaActor, FormulaValues, FormulaWorkerActor, HostedFormulaAddress, FormulaStateStoreException
 from powerapi.dispatch_rule import DispatchRule
-from powerapi.utils import Tree
+from powerapi.utils import PrefixIndex, ReportBatcher, AckTracker, PendingAck, hold_pending_acks, release_pending_acks
 from powerapi.report import Report
-from powerapi.message import StartMessage, DispatcherStartMessage, FormulaStartMessage, EndMessage, ErrorMessage, OKMessage
+from powerapi.message import StartMessage, DispatcherStartMessage, FormulaStartMessage, EndMessage, ErrorMessage, OKMessage, \
+    ReportBatch, FlowControlMessage, AckMessage, FormulaWorkerStartMessage, HostedFormulaMessage, HostedFormulaMessageBatch, \
+    SaveFormulaStateMessage
 from powerapi.dispatcher.blocking_detector import BlockingDetector
-from powerapi.dispatcher.route_table import RouteTable
+from powerapi.dispatcher.route_table import RouteTable, formula_id_prefix_length
+
+
+LINGER_WAKEUP = 'linger'
+EVICTION_WAKEUP = 'eviction'
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+COALESCE_LATEST = 'coalesce-latest'
+WAITING_OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE_LATEST)
 
 
 def _clean_list(id_list):
@@ -54,7 +69,8 @@ def _clean_list(id_list):
     return r_list
 
 
-def _extract_formula_id(report: Report, dispatch_rule: DispatchRule, primary_dispatch_rule: DispatchRule) -> List[Tuple]:
+def _extract_formula_id(report: Report, dispatch_rule: DispatchRule, primary_dispatch_rule: DispatchRule,
+                        prefix_length: int = None) -> List[Tuple]:
     """
     Use the dispatch rule to extract formula_id from the given report.
     Formula id are then mapped to an identifier that match the primary
@@ -67,6 +83,8 @@ def _extract_formula_id(report: Report, dispatch_rule: DispatchRule, primary_dis
 
     :param powerapi.Report report:                 Report to split
     :param powerapi.DispatchRule dispatch_rule: DispatchRule rule
+    :param int prefix_length: number of leading fields of dispatch_rule equal to the primary dispatch rule fields,
+                              computed if None
 
     :return: List of formula_id associated to a sub-report of report
     :rtype: [tuple]
@@ -77,29 +95,9 @@ def _extract_formula_id(report: Report, dispatch_rule: DispatchRule, primary_dis
     if dispatch_rule.is_primary:
         return id_list
 
-    def f(formula_id):
-        return _match_report_id(formula_id, dispatch_rule, primary_dispatch_rule)
-
-    return _clean_list(list(map(f, id_list)))
-
-
-def _match_report_id(report_id: Tuple, dispatch_rule: DispatchRule, primary_rule: DispatchRule) -> Tuple:
-    """
-    Return the new_report_id with the report_id by removing
-    every "useless" fields from it.
-
-    :param tuple report_id:                     Original report id
-    :param powerapi.DispatchRule dispatch_rule: DispatchRule rule
-    """
-    new_report_id = ()
-    for i in range(len(report_id)):
-        if i >= len(primary_rule.fields):
-            return new_report_id
-        if dispatch_rule.fields[i] == primary_rule.fields[i]:
-            new_report_id += (report_id[i], )
-        else:
-            return new_report_id
-    return new_report_id
+    if prefix_length is None:
+        prefix_length = formula_id_prefix_length(dispatch_rule, primary_dispatch_rule)
+    return _clean_list([tuple(formula_id[:prefix_length]) for formula_id in id_list])
 
 
 class DispatcherActor(Actor):
@@ -122,7 +120,33 @@ class DispatcherActor(Actor):
         self.formula_name_service = None
         self.formula_waiting_service = FormulaWaitingService()
         self.formula_pool = {}
+        self.formula_pool_names = {}
         self.formula_number_id = 0
+        self.report_batcher = None
+        self._linger_wakeup_pending = False
+        self._flow_control = False
+        self._ack_tracker = AckTracker()
+        self.formula_idle_ttl = None
+        self.max_formula_number = None
+        #: (OrderedDict): time of the last report sent to each live formula, from the least to the most recently used
+        self.formula_last_activity = OrderedDict()
+        self._eviction_wakeup_pending = False
+        #: (set): name of the formulas stopped by the dispatcher that did not exit yet
+        self._evicted_formulas = set()
+        self.created_formula_count = 0
+        self.evicted_formula_count = 0
+        self.formula_workers = []
+        self._formula_worker_names = set()
+        self._next_formula_worker = 0
+        self.prewarmed_formula_number = 0
+        #: (list): address of the formula actors created in advance and not started yet
+        self.prewarmed_formulas = []
+        #: (dict): messages sent to hosted formulas while processing a message, per worker
+        self._hosted_outbox = None
+        #: (ShardRouter): router splitting the formula ids between the dispatcher shards, None without shards
+        self.shard_router = None
+        #: (int): index of the shard handled by the dispatcher
+        self.shard = None
 
     def _initialization(self, message: StartMessage):
         Actor._initialization(self, message)
@@ -135,6 +159,106 @@ class DispatcherActor(Actor):
 
         if self.route_table.primary_dispatch_rule is None:
             raise InitializationException('Dispatcher initialized without primary dispatch rule')
+        if message.report_batch_size < 1:
+            raise InitializationException('report batch size must be greater than 0')
+        if message.coalescing_window is not None:
+            if message.coalescing_window <= 0:
+                raise InitializationException('coalescing window must be greater than 0')
+            batch_size = message.report_batch_size if message.report_batch_size > 1 else math.inf
+            self.report_batcher = ReportBatcher(batch_size, message.coalescing_window)
+        elif message.report_batch_size > 1:
+            self.report_batcher = ReportBatcher(message.report_batch_size, message.linger_time)
+        if message.formula_idle_ttl is not None and message.formula_idle_ttl <= 0:
+            raise InitializationException('formula idle ttl must be greater than 0')
+        if message.max_formula_number is not None and message.max_formula_number < 1:
+            raise InitializationException('max formula number must be greater than 0')
+        if message.formula_worker_number is not None and message.formula_worker_number < 1:
+            raise InitializationException('formula worker number must be greater than 0')
+        if message.prewarmed_formula_number < 0:
+            raise InitializationException('prewarmed formula number must be positive')
+        if message.max_waiting_reports is not None and message.max_waiting_reports < 1:
+            raise InitializationException('max waiting reports must be greater than 0')
+        if message.max_total_waiting_reports is not None and message.max_total_waiting_reports < 1:
+            raise InitializationException('max total waiting reports must be greater than 0')
+        if message.shard_router is not None and message.shard not in range(message.shard_router.shard_number):
+            raise InitializationException('shard must be between 0 and ' + str(message.shard_router.shard_number - 1))
+        self.shard_router = message.shard_router
+        self.shard = message.shard
+        if message.waiting_overflow_policy not in WAITING_OVERFLOW_POLICIES:
+            raise InitializationException('waiting overflow policy must be one of ' + ', '.join(WAITING_OVERFLOW_POLICIES))
+        self.formula_waiting_service = FormulaWaitingService(message.max_waiting_reports, message.max_total_waiting_reports,
+                                                             message.waiting_overflow_policy)
+        self.formula_idle_ttl = message.formula_idle_ttl
+        self.max_formula_number = message.max_formula_number
+        if message.formula_worker_number is not None:
+            self._create_formula_workers(message.formula_worker_number)
+        else:
+            self.prewarmed_formula_number = message.prewarmed_formula_number
+            self._prewarm_formulas()
+
+    def _prewarm_formulas(self):
+        """
+        create formula actors in advance until the prewarmed formula number is reached
+        """
+        while len(self.prewarmed_formulas) < self.prewarmed_formula_number:
+            self.prewarmed_formulas.append(self.createActor(self.formula_class))
+
+    def _create_formula_workers(self, worker_number: int):
+        """
+        create the workers that host the formulas, instead of creating one actor per formula
+        """
+        for index in range(worker_number):
+            worker_name = self.name + '_worker' + str(index)
+            worker = self.createActor(FormulaWorkerActor)
+            self.send(worker, FormulaWorkerStartMessage(self.name, worker_name, self.formula_class))
+            self.formula_workers.append(worker)
+            self._formula_worker_names.add(worker_name)
+
+    def receiveMessage(self, message, sender: ActorAddress):
+        """
+        Process the received message with the handler of its type
+
+        When formulas are hosted by workers, the messages sent to the formulas of a worker while processing the received
+        message are sent to the worker at once, so that a report sent to several of these formulas is serialized once
+        """
+        if not self.formula_workers or self._hosted_outbox is not None:
+            Actor.receiveMessage(self, message, sender)
+            return
+
+        self._hosted_outbox = {}
+        try:
+            Actor.receiveMessage(self, message, sender)
+        finally:
+            outbox = self._hosted_outbox
+            self._hosted_outbox = None
+            for worker, messages in outbox.values():
+                if len(messages) == 1:
+                    formula_name, hosted_message = messages[0]
+                    Actor.send(self, worker, HostedFormulaMessage(self.name, formula_name, hosted_message))
+                else:
+                    Actor.send(self, worker, HostedFormulaMessageBatch(self.name, messages))
+
+    def send(self, targetAddr, msg):
+        """
+        Send a message to an actor, messages sent to a formula hosted by a worker are wrapped and sent to the worker
+        """
+        if not isinstance(targetAddr, HostedFormulaAddress):
+            Actor.send(self, targetAddr, msg)
+        elif self._hosted_outbox is None:
+            Actor.send(self, targetAddr.worker, HostedFormulaMessage(self.name, targetAddr.formula_name, msg))
+        else:
+            _, messages = self._hosted_outbox.setdefault(str(targetAddr.worker), (targetAddr.worker, []))
+            messages.append((targetAddr.formula_name, msg))
+
+    def receiveMsg_HostedFormulaMessage(self, message: HostedFormulaMessage, sender: ActorAddress):
+        """
+        When receiving a message sent by a formula hosted by a worker, process it as if it was sent by the formula
+        """
+        formula_address = HostedFormulaAddress(sender, message.formula_name)
+        hosted_message = message.message
+        if isinstance(hosted_message, ChildActorExited):
+            hosted_message = ChildActorExited(formula_address)
+        self.receiveMessage(hosted_message, formula_address)
 
     def receiveMsg_PoisonMessage(self, message: PoisonMessage, sender: ActorAddress):
         """
@@ -144,18 +268,20 @@ class DispatcherActor(Actor):
             - if the formula crashed, restart it
         """
         poison_message = message.poisonMessage
-        for formula_name, (formula, blocking_detector) in self.formula_pool.items():
-            if sender == formula:
-                log_line = 'received poison messsage from formula ' + formula_name + ' for message ' + str(poison_message)
-                log_line += 'with this error stack : ' + message.details
-                self.log_debug(log_line)
-                blocking_detector.notify_poison_received(poison_message)
-                if blocking_detector.is_blocked():
-                    self.log_debug('formula ' + formula_name + ' is blocked : ' + str(blocking_detector.is_blocked()))
-                    self.log_debug('restart formula ' + formula_name)
-                    self.log_error('formula ' + formula_name + ' is blocked after this error : ' + message.details)
-                    self._restart_formula(formula_name)
-                    return
+        formula_name = self.formula_pool_names.get(str(sender))
+        if formula_name is None:
+            return
+        _, blocking_detector = self.formula_pool[formula_name]
+        log_line = 'received poison messsage from formula ' + formula_name + ' for message ' + str(poison_message)
+        log_line += 'with this error stack : ' + message.details
+        self.log_debug(log_line)
+        blocking_detector.notify_poison_received(poison_message)
+        # an evicted formula is already stopping, it is not restarted
+        if blocking_detector.is_blocked() and formula_name not in self._evicted_formulas:
+            self.log_debug('formula ' + formula_name + ' is blocked : ' + str(blocking_detector.is_blocked()))
+            self.log_debug('restart formula ' + formula_name)
+            self.log_error('formula ' + formula_name + ' is blocked after this error : ' + message.details)
+            self._restart_formula(formula_name)
 
     def receiveMsg_ActorExitRequest(self, message: ActorExitRequest, sender: ActorAddress):
         """
@@ -166,6 +292,8 @@ class DispatcherActor(Actor):
             self.send(formula, ActorExitRequest())
         for _, formula in self.formula_waiting_service.get_all_formula():
             self.send(formula, ActorExitRequest())
+        for formula in self.prewarmed_formulas:
+            self.send(formula, ActorExitRequest())
 
     def _gen_formula_name(self, formula_id):
         name = 'formula' + str(self.formula_number_id)
@@ -174,62 +302,335 @@ class DispatcherActor(Actor):
             name += '__' + str(field)
         return name
 
-    def _send_message(self, formula_name, message):
-        try:
-            formula, blocking_detector = self.formula_pool[formula_name]
-            message.dispatcher_report_id = blocking_detector.get_message_id()
-            self.log_debug('send ' + str(message) + ' to ' + formula_name)
-            self.send(formula, message)
-        except KeyError:
-            self.formula_waiting_service.add_message(formula_name, message)
+    def _send_message(self, formula_name, message, pending_acks: List[PendingAck] = None):
+        """
+        send a message to a formula, or keep it until the formula is started
 
-    def receiveMsg_Report(self, message: Report, _: ActorAddress):
+        :param pending_acks: messages received from upstream actors that will be acknowledged with the sent message,
+                             None if the sent message is not acknowledged
         """
-        When receiving a report, split it into sub-reports (if needed) and send them to their corresponding formula.
-        If the corresponding formula does not exist, the dispatcher create it and send it the report
+        if formula_name in self.formula_pool:
+            self._send_to_started_formula(formula_name, message, pending_acks)
+            return
+        if pending_acks is not None:
+            hold_pending_acks(pending_acks)
+        for dropped_message, dropped_pending_acks in self.formula_waiting_service.add_message(formula_name, message, pending_acks):
+            self.log_warning('too many reports waiting for formula ' + formula_name + ' to start, drop ' + str(dropped_message))
+            if dropped_pending_acks is not None:
+                self._acknowledge(release_pending_acks(dropped_pending_acks))
+
+    def _send_to_started_formula(self, formula_name, message, pending_acks: List[PendingAck], held: bool = False):
+        """
+        :param held: True if the pending acknowledgments already count the message, when it waited for the formula to
+                     start
+        """
+        formula, blocking_detector = self.formula_pool[formula_name]
+        message.dispatcher_report_id = blocking_detector.get_message_id()
+        self.log_debug('send ' + str(message) + ' to ' + formula_name)
+        self.send(formula, message)
+        if pending_acks is not None:
+            self._ack_tracker.sent(formula_name, pending_acks, held)
+
+    def _send_report_message(self, formula_name, message, pending_acks: List[PendingAck]):
+        """
+        send a report or a report batch to a formula and, if flow control is enabled, wait for its acknowledgment
+
+        :param pending_acks: messages received from upstream actors that will be acknowledged with the sent message
+        """
+        self._send_message(formula_name, message, pending_acks if self._flow_control else None)
+
+    def _send_report(self, formula_name, report, pending_ack: PendingAck = None):
+        """
+        send a report to a formula, or add it to the formula's report batch if batching is enabled
+        """
+        if self.report_batcher is None:
+            self._send_report_message(formula_name, report, [] if pending_ack is None else [pending_ack])
+            return
+        batch = self.report_batcher.add(formula_name, (report, pending_ack))
+        if batch is not None:
+            self._send_report_batch(formula_name, batch)
+
+    def _send_report_batch(self, formula_name, batch):
+        """
+        send a batch built by the report batcher to a formula
+
+        :param batch: list of tuple (report, pending acknowledgment or None)
+        """
+        reports = [report for report, _ in batch]
+        pending_acks = [pending_ack for _, pending_ack in batch if pending_ack is not None]
+        self._send_report_message(formula_name, ReportBatch(self.name, reports), pending_acks)
+
+    def _flush_report_batches(self, expired_only: bool = False):
+        """
+        send the waiting report batches to their formula
+
+        :param expired_only: if True, only send the batches that waited for more than the linger time
+        """
+        if self.report_batcher is None:
+            return
+        batches = self.report_batcher.pop_expired() if expired_only else self.report_batcher.pop_all()
+        for formula_name, batch in batches:
+            self._send_report_batch(formula_name, batch)
+
+    def _wait_for_linger_time(self):
+        """
+        ask to be woken up after the linger time to send the batches that are not full yet
+        """
+        if self.report_batcher is None or self.report_batcher.is_empty() or self._linger_wakeup_pending:
+            return
+        self._linger_wakeup_pending = True
+        self.wakeupAfter(timedelta(seconds=self.report_batcher.linger_time), LINGER_WAKEUP)
+
+    def _get_destination_formulas(self, message: Report) -> List[str]:
+        """
+        split the report into sub-reports (if needed) and return the name of their corresponding formula.
+        If the corresponding formula does not exist, the dispatcher create it
+        With a shard router, the formula ids owned by other shards are ignored, their shard creates their formula
         """
-        self.log_debug('received ' + str(message))
         dispatch_rule = self.route_table.get_dispatch_rule(message)
         primary_dispatch_rule = self.route_table.primary_dispatch_rule
         if dispatch_rule is None:
             self.log_warning('no dispatch rule for report ' + str(message))
-            return
-        formula_ids = _extract_formula_id(message, dispatch_rule, primary_dispatch_rule)
+            return []
+        formula_ids = _extract_formula_id(message, dispatch_rule, primary_dispatch_rule,
+                                          self.route_table.get_formula_id_prefix_length(dispatch_rule))
 
+        formula_names = []
+        primary_id_length = len(primary_dispatch_rule.fields)
+        now = time.monotonic()
         for formula_id in formula_ids:
-            primary_rule_fields = primary_dispatch_rule.fields
-            if len(formula_id) == len(primary_rule_fields):
+            if len(formula_id) == primary_id_length:
+                if self.shard_router is not None and self.shard_router.get_shard(formula_id) != self.shard:
+                    continue
                 try:
-                    formula_name = self.formula_name_service.get_direct_formula_name(formula_id)
-                    self._send_message(formula_name, message)
+                    id_formula_names = [self.formula_name_service.get_direct_formula_name(formula_id)]
                 except KeyError:
                     formula_name = self._gen_formula_name(formula_id)
                     self.log_info('create formula ' + formula_name)
+                    self._evict_least_recently_used_formulas(formula_names)
                     formula = self._create_formula(formula_id, formula_name)
                     self.formula_name_service.add(formula_id, formula_name)
                     self.formula_waiting_service.add(formula_name, formula)
-                    self.formula_waiting_service.add_message(formula_name, message)
+                    self._enable_formula_flow_control(formula_name)
+                    self.created_formula_count += 1
+                    id_formula_names = [formula_name]
             else:
-                for formula_name in self.formula_name_service.get_corresponding_formula(list(formula_id)):
-                    self._send_message(formula_name, message)
+                id_formula_names = self.formula_name_service.get_corresponding_formula(list(formula_id))
+            # the formulas of the report are marked as used at once, so that creating its next formulas never evict them
+            for formula_name in id_formula_names:
+                self._record_formula_activity(formula_name, now)
+            formula_names += id_formula_names
+
+        return [formula_name for formula_name in formula_names if formula_name not in self._evicted_formulas]
+
+    def _record_formula_activity(self, formula_name: str, activity_time: float):
+        """
+        mark the formula as the most recently used one and start watching idle formulas if a ttl is defined
+        Evicted formulas are not live anymore, their activity is ignored
+        """
+        if formula_name in self._evicted_formulas:
+            return
+        self.formula_last_activity[formula_name] = activity_time
+        self.formula_last_activity.move_to_end(formula_name)
+        if self.formula_idle_ttl is not None and not self._eviction_wakeup_pending:
+            self._eviction_wakeup_pending = True
+            self.wakeupAfter(timedelta(seconds=self.formula_idle_ttl), EVICTION_WAKEUP)
+
+    def _evict_least_recently_used_formulas(self, protected_formulas: List[str]):
+        """
+        stop the least recently used formulas to leave room for a new formula if the live formula limit is reached
+        The protected formulas, that must receive the report being dispatched, are never evicted, the limit is exceeded
+        if no other formula is live
+        """
+        if self.max_formula_number is None:
+            return
+        live_formula_number = len(self.formula_last_activity)
+        for formula_name in list(self.formula_last_activity):
+            if live_formula_number < self.max_formula_number:
+                return
+            if formula_name in protected_formulas:
+                continue
+            self.log_info('formula limit reached, evict least recently used formula ' + formula_name)
+            self._evict_formula(formula_name)
+            live_formula_number -= 1
+
+    def _evict_idle_formulas(self):
+        """
+        stop the formulas that received no report for more than the idle ttl
+        """
+        deadline = time.monotonic() - self.formula_idle_ttl
+        for formula_name, last_activity in list(self.formula_last_activity.items()):
+            if last_activity > deadline:
+                break
+            self.log_info('evict idle formula ' + formula_name)
+            self._evict_formula(formula_name)
+
+    def _evict_formula(self, formula_name: str):
+        """
+        stop a live formula after it processed the reports already sent to it
+        The formula id is unregistered so that the next report with this id creates a new formula. The formula is
+        removed from the formula pool when it exits. Evicting a formula that is not live anymore does nothing
+        """
+        if formula_name in self._evicted_formulas or formula_name not in self.formula_last_activity:
+            return
+        del self.formula_last_activity[formula_name]
+        self.formula_name_service.remove_formula(formula_name)
+        self._evicted_formulas.add(formula_name)
+        if self.report_batcher is not None:
+            batch = self.report_batcher.pop(formula_name)
+            if batch is not None:
+                self._send_report_batch(formula_name, batch)
+        self._send_message(formula_name, EndMessage(self.name))
+        self.evicted_formula_count += 1
+        self.log_info('formulas created : ' + str(self.created_formula_count) + ', evicted : ' + str(self.evicted_formula_count))
+
+    def receiveMsg_Report(self, message: Report, sender: ActorAddress):
+        """
+        When receiving a report, split it into sub-reports (if needed) and send them to their corresponding formula.
+        If the corresponding formula does not exist, the dispatcher create it and send it the report
+        """
+        self.log_debug('received ' + str(message))
+        pending_ack = PendingAck(sender) if self._ack_requested(sender) else None
+        formula_names = self._get_destination_formulas(message)
+        for formula_name in formula_names:
+            self._send_report(formula_name, message, pending_ack)
+        if pending_ack is not None and not formula_names:
+            self._acknowledge([sender])
+        self._wait_for_linger_time()
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, sender: ActorAddress):
+        """
+        When receiving a batch of reports, dispatch each report of the batch and send to each formula one batch
+        containing all the reports it has to process
+        If batching is enabled, the reports join the batch of their formula instead, only the full or expired batches
+        are sent
+        """
+        self.log_debug('received ' + str(message))
+        if self.report_batcher is not None:
+            self._batch_reports(message.reports, sender)
+            return
+        batches = {}
+        for report in message.reports:
+            for formula_name in self._get_destination_formulas(report):
+                batches.setdefault(formula_name, []).append(report)
+        pending_acks = [PendingAck(sender)] if self._ack_requested(sender) else []
+        for formula_name, reports in batches.items():
+            self._send_report_message(formula_name, ReportBatch(self.name, reports), pending_acks)
+        if pending_acks and not batches:
+            self._acknowledge([sender])
+
+    def _batch_reports(self, reports: List[Report], sender: ActorAddress):
+        """
+        add the reports received in one message to the report batches of their formulas
+        """
+        pending_ack = PendingAck(sender) if self._ack_requested(sender) else None
+        dispatched = False
+        for report in reports:
+            for formula_name in self._get_destination_formulas(report):
+                self._send_report(formula_name, report, pending_ack)
+                dispatched = True
+        if pending_ack is not None and not dispatched:
+            self._acknowledge([sender])
+        self._wait_for_linger_time()
+
+    def _enable_formula_flow_control(self, formula_name: str):
+        """
+        ask the formula to acknowledge the reports sent to it, if flow control is enabled
+        """
+        if self._flow_control:
+            self._send_message(formula_name, FlowControlMessage(self.name))
+
+    def receiveMsg_FlowControlMessage(self, message: FlowControlMessage, sender: ActorAddress):
+        """
+        When receiving a FlowControlMessage, ask all the formulas to acknowledge the reports sent to them too
+        Reports received from the sender are then acknowledged once all the formulas that received them acknowledged them
+        """
+        Actor.receiveMsg_FlowControlMessage(self, message, sender)
+        if self._flow_control:
+            return
+        self._flow_control = True
+        for formula_name in list(self.formula_pool):
+            self._enable_formula_flow_control(formula_name)
+        for formula_name, _ in self.formula_waiting_service.get_all_formula():
+            self._enable_formula_flow_control(formula_name)
+
+    def receiveMsg_AckMessage(self, message: AckMessage, sender: ActorAddress):
+        """
+        When receiving an AckMessage from a formula, acknowledge the reports that are now processed by all the formulas
+        """
+        try:
+            formula_name = self._get_formula_name_from_address(sender)
+        except AttributeError:
+            return
+        self._acknowledge(self._ack_tracker.acknowledged(formula_name, message.count))
+
+    def receiveMsg_WakeupMessage(self, message: WakeupMessage, _: ActorAddress):
+        """
+        When receiving a WakeupMessage :
+            - send the report batches that waited for more than the linger time
+            - or stop the formulas that are idle for more than the idle ttl
+        """
+        if message.payload == EVICTION_WAKEUP:
+            self._eviction_wakeup_pending = False
+            if self._exit_mode:
+                return
+            self._evict_idle_formulas()
+            if self.formula_last_activity:
+                self._eviction_wakeup_pending = True
+                self.wakeupAfter(timedelta(seconds=self.formula_idle_ttl), EVICTION_WAKEUP)
+            return
+        self._linger_wakeup_pending = False
+        self._flush_report_batches(expired_only=True)
+        self._wait_for_linger_time()
+
+    def _add_to_formula_pool(self, formula_name: str, formula_address: ActorAddress):
+        """
+        add a started formula to the formula pool
+        """
+        self.formula_pool[formula_name] = (formula_address, BlockingDetector())
+        # actor addresses are not hashable, formula names are indexed by the address string
+        self.formula_pool_names[str(formula_address)] = formula_name
+
+    def _remove_from_formula_pool(self, formula_name: str) -> ActorAddress:
+        """
+        remove a formula from the formula pool
+
+        :return: the address of the removed formula
+        """
+        formula_address, _ = self.formula_pool.pop(formula_name)
+        del self.formula_pool_names[str(formula_address)]
+        return formula_address
 
     def _get_formula_name_from_address(self, formula_address: ActorAddress):
-        for name, (address, _) in self.formula_pool.items():
-            if formula_address == address:
-                return name
-        return self.formula_waiting_service.get_formula_by_address(formula_address)
+        """
+        :return: the name of the started or waiting formula with the given address
+        :raise AttributeError: if no formula with the given address exists
+        """
+        try:
+            return self.formula_pool_names[str(formula_address)]
+        except KeyError:
+            return self.formula_waiting_service.get_formula_by_address(formula_address)
 
     def receiveMsg_ChildActorExited(self, message: ChildActorExited, _: ActorAddress):
         """
         When receive ChildActorExited from a formula:
         remove formula from formula pool and if dispatcher is in exit_mode and no formula is running, send an EndMessage to all pusher
         """
+        if message.childAddress in self.prewarmed_formulas:
+            self.prewarmed_formulas.remove(message.childAddress)
+            return
         try:
             formula_name = self._get_formula_name_from_address(message.childAddress)
         except AttributeError:
             return
-        self.formula_name_service.remove_formula(formula_name)
-        del self.formula_pool[formula_name]
+        # evicted formulas are already removed from the name service
+        if formula_name in self._evicted_formulas:
+            self._evicted_formulas.remove(formula_name)
+        else:
+            self.formula_last_activity.pop(formula_name, None)
+            self.formula_name_service.remove_formula(formula_name)
+        self._remove_from_formula_pool(formula_name)
+        self._acknowledge(self._ack_tracker.forget(formula_name))
         if self._exit_mode and not self.formula_pool:
             for _, pusher in self.formula_values.pushers.items():
                 self.send(pusher, EndMessage(self.name))
@@ -240,18 +641,28 @@ class DispatcherActor(Actor):
         When receiving an ErrorMessage after trying to start a formula, remove formula from waiting service
         """
         self.log_info('error while trying to start ' + message.sender_name + ' : ' + message.error_message)
+        if message.sender_name in self._formula_worker_names:
+            self.log_error('formula worker ' + message.sender_name + ' failed to start')
+            return
+        for _, pending_acks in self.formula_waiting_service.get_waiting_messages(message.sender_name):
+            if pending_acks is not None:
+                self._acknowledge(release_pending_acks(pending_acks))
         self.formula_waiting_service.remove_formula(message.sender_name)
+        self.formula_last_activity.pop(message.sender_name, None)
+        self._acknowledge(self._ack_tracker.forget(message.sender_name))
 
     def receiveMsg_OKMessage(self, message: OKMessage, sender: ActorAddress):
         """
         When receiving OKMessage after trying to start a formula, move formula from the waiting service to the formula pool
         """
         formula_name = message.sender_name
+        if formula_name in self._formula_worker_names:
+            return
         waiting_messages = self.formula_waiting_service.get_waiting_messages(formula_name)
         self.formula_waiting_service.remove_formula(formula_name)
-        self.formula_pool[formula_name] = (sender, BlockingDetector())
-        for waiting_msg in waiting_messages:
-            self._send_message(formula_name, waiting_msg)
+        self._add_to_formula_pool(formula_name, sender)
+        for waiting_msg, pending_acks in waiting_messages:
+            self._send_to_started_formula(formula_name, waiting_msg, pending_acks, held=True)
         self.log_info('formula ' + formula_name + 'started')
 
     def receiveMsg_EndMessage(self, message: EndMessage, _: ActorAddress):
@@ -260,19 +671,29 @@ class DispatcherActor(Actor):
         """
         self.log_debug('received message ' + str(message))
         self._exit_mode = True
+        self._flush_report_batches()
         for _, (formula, __) in self.formula_pool.items():
             self.send(formula, EndMessage(self.name))
         for formula_name, _ in self.formula_waiting_service.get_all_formula():
             self.formula_waiting_service.add_message(formula_name, message)
 
+    def receiveMsg_SaveFormulaStateMessage(self, message: SaveFormulaStateMessage, _: ActorAddress):
+        """
+        When receiving a SaveFormulaStateMessage, forward it to all the started formulas
+        """
+        self.log_debug('received message ' + str(message))
+        for _, (formula, __) in self.formula_pool.items():
+            self.send(formula, SaveFormulaStateMessage(self.name))
+
     def _restart_formula(self, formula_name: str):
-        formula, _ = self.formula_pool[formula_name]
         formula_id = self.formula_name_service.get_formula_id(formula_name)
 
         # remove crashed formula
         self.formula_name_service.remove_formula(formula_name)
-        del self.formula_pool[formula_name]
+        last_activity = self.formula_last_activity.pop(formula_name, time.monotonic())
+        formula = self._remove_from_formula_pool(formula_name)
         self.send(formula, ActorExitRequest())
+        self._acknowledge(self._ack_tracker.forget(formula_name))
 
         # create new formula
         new_name = self._gen_formula_name(formula_id)
@@ -280,23 +701,71 @@ class DispatcherActor(Actor):
         formula = self._create_formula(formula_id, new_name)
         self.formula_name_service.add(formula_id, new_name)
         self.formula_waiting_service.add(new_name, formula)
+        self._enable_formula_flow_control(new_name)
+        self.formula_last_activity[new_name] = last_activity
         self.log_debug('restart formula' + formula_name + ' with new name : ' + new_name)
 
     def _create_formula(self, formula_id: Tuple, formula_name: str) -> ActorAddress:
-        formula = self.createActor(self.formula_class)
+        if self.formula_workers:
+            worker = self.formula_workers[self._next_formula_worker]
+            self._next_formula_worker = (self._next_formula_worker + 1) % len(self.formula_workers)
+            formula = HostedFormulaAddress(worker, formula_name)
+        elif self.prewarmed_formulas:
+            formula = self.prewarmed_formulas.pop(0)
+            self._prewarm_formulas()
+        else:
+            formula = self.createActor(self.formula_class)
         domain_values = self.formula_class.gen_domain_values(self.device_id, formula_id)
+        domain_values.state = self._load_formula_state(formula_id)
         start_message = FormulaStartMessage(self.name, formula_name, self.formula_values, domain_values)
         self.send(formula, start_message)
         return formula
 
+    def _load_formula_state(self, formula_id: Tuple):
+        """
+        :return: the state saved by the last formula with the given id, None if there is no state to restore
+        """
+        state_store = self.formula_values.state_store
+        if state_store is None:
+            return None
+        try:
+            return state_store.load(formula_id)
+        except FormulaStateStoreException as exn:
+            self.log_warning(exn.msg + ', the formula starts without state')
+            return None
+
 
 class FormulaWaitingService:
     """
     Pool of fomula that received a StartMessage but didn't answer yet
+
+    The number of reports waiting for a formula to start can be bounded per formula and for all the formulas. When a
+    bound is reached, the overflow policy applies to the reports of the formula receiving a new report :
+        - drop-oldest : the oldest waiting report is dropped
+        - drop-newest : the new report is dropped
+        - coalesce-latest : the new report replaces the newest waiting report
+    If the global bound is reached while the formula has no waiting report, the new report is dropped.
+    A report batch counts as one report. Other messages (EndMessage, FlowControlMessage) are never dropped and don't
+    count in the bounds
     """
-    def __init__(self):
+    def __init__(self, max_formula_reports: int = None, max_reports: int = None, overflow_policy: str = 'drop-oldest'):
+        """
+        :param max_formula_reports: maximum number of reports waiting for one formula, None for no limit
+        :param max_reports: maximum number of reports waiting for all the formulas, None for no limit
+        :param overflow_policy: what to do with a report received when a bound is reached, one of
+                                WAITING_OVERFLOW_POLICIES
+        """
+        self.max_formula_reports = max_formula_reports
+        self.max_reports = max_reports
+        self.overflow_policy = overflow_policy
         self.formulas = {}
+        self.formula_names = {}
+        self._address_keys = {}
         self.waiting_messages = {}
+        self.waiting_report_counts = {}
+        self.waiting_report_count = 0
+        self.dropped_report_count = 0
+        self.coalesced_report_count = 0
 
     def get_all_formula(self) -> List[Tuple[str, ActorAddress]]:
         """
@@ -309,17 +778,54 @@ class FormulaWaitingService:
         add a formula to the waiting service
         """
         self.formulas[formula_name] = formula_address
+        # actor addresses are not hashable, formula names are indexed by the address string
+        self._address_keys[formula_name] = str(formula_address)
+        self.formula_names[str(formula_address)] = formula_name
         self.waiting_messages[formula_name] = []
+        self.waiting_report_counts[formula_name] = 0
 
-    def add_message(self, formula_name: str, message: Report):
+    def add_message(self, formula_name: str, message, pending_acks: List[PendingAck] = None) -> List[Tuple]:
         """
         store a message receive by a not started formula
-        """
-        self.waiting_messages[formula_name].append(message)
 
-    def get_waiting_messages(self, formula_name: str) -> List[Report]:
-        """
-        :return: the list of message receive by the formula since the first StartMessage was send to the formula
+        :param pending_acks: upstream messages that wait for the acknowledgment of this message, None if the message
+                             is not acknowledged
+        :return: list of tuple (message, pending_acks) of the messages dropped or replaced to respect the bounds
+        """
+        messages = self.waiting_messages[formula_name]
+        if not isinstance(message, (Report, ReportBatch)):
+            messages.append((message, pending_acks))
+            return []
+
+        formula_full = self.max_formula_reports is not None and self.waiting_report_counts[formula_name] >= self.max_formula_reports
+        service_full = self.max_reports is not None and self.waiting_report_count >= self.max_reports
+        if not formula_full and not service_full:
+            messages.append((message, pending_acks))
+            self.waiting_report_counts[formula_name] += 1
+            self.waiting_report_count += 1
+            return []
+
+        if self.overflow_policy == DROP_NEWEST or self.waiting_report_counts[formula_name] == 0:
+            self.dropped_report_count += 1
+            return [(message, pending_acks)]
+
+        if self.overflow_policy == COALESCE_LATEST:
+            index = _last_report_index(messages)
+            replaced = messages[index]
+            messages[index] = (message, pending_acks)
+            self.coalesced_report_count += 1
+            return [replaced]
+
+        index = _last_report_index(messages, oldest=True)
+        dropped = messages.pop(index)
+        messages.append((message, pending_acks))
+        self.dropped_report_count += 1
+        return [dropped]
+
+    def get_waiting_messages(self, formula_name: str) -> List[Tuple]:
+        """
+        :return: the list of tuple (message, pending_acks) of the messages receive by the formula since the first
+                 StartMessage was send to the formula
         :raise AttributeError: if no formula with the given name exists
         """
         if formula_name in self.formulas:
@@ -331,6 +837,10 @@ class FormulaWaitingService:
         :return: the formula name bind to the given formula address
         :raise AttributeError: if no formula with the given address exists
         """
+        formula_name = self.formula_names.get(str(formula_address))
+        if formula_name is not None:
+            return formula_name
+        # the actor system resolves the address of a created actor later, its string may differ from the indexed one
         for name, address in self.formulas.items():
             if formula_address == address:
                 return name
@@ -343,25 +853,40 @@ class FormulaWaitingService:
         """
         if formula_name in self.formulas:
             del self.formulas[formula_name]
+            del self.formula_names[self._address_keys.pop(formula_name)]
             del self.waiting_messages[formula_name]
+            self.waiting_report_count -= self.waiting_report_counts.pop(formula_name)
         else:
             raise AttributeError('unknow formula ' + str(formula_name))
 
 
+def _last_report_index(messages: List[Tuple], oldest: bool = False) -> int:
+    """
+    :return: index of the newest (or oldest) report or report batch of a list of waiting messages
+    """
+    indexes = range(len(messages)) if oldest else range(len(messages) - 1, -1, -1)
+    for index in indexes:
+        if isinstance(messages[index][0], (Report, ReportBatch)):
+            return index
+    raise ValueError('no waiting report')
+
+
 class FormulaNameService:
     """
     Service that make correspondance between formula name and formula id
     """
     def __init__(self):
         self.formula_name = {}
-        self.formula_tree = Tree()
+        self.formula_id = {}
+        self.formula_index = PrefixIndex()
 
     def add(self, formula_id, formula_name: str):
         """
         add a formula name into the service with its main id
         """
         self.formula_name[formula_id] = formula_name
-        self.formula_tree.add(list(formula_id), formula_name)
+        self.formula_id[formula_name] = formula_id
+        self.formula_index.add(formula_id, formula_name)
 
     def get_direct_formula_name(self, formula_id) -> str:
         """
@@ -378,10 +903,7 @@ class FormulaNameService:
         """
         return main formula id from formula name
         """
-        for formula_id, formula_name in self.formula_name.items():
-            if formula_name == formula_name_to_find:
-                return formula_id
-        return None
+        return self.formula_id.get(formula_name_to_find)
 
     def get_corresponding_formula(self, formula_id):
         """
@@ -391,19 +913,16 @@ class FormulaNameService:
         :return: All Formulas that match with the key
         :rtype: list(Formula)
         """
-        return self.formula_tree.get(formula_id)
+        return self.formula_index.get(formula_id)
 
     def remove_formula(self, formula_name_to_remove: str):
         """
-        remove from the pool the formula with the given address
-        :param formula_address_to_remove: address of the formula to remove
-        :raise AttributeError: if the pool doesn't contain any formula with this address
+        remove from the service the formula with the given name
+        :param formula_name_to_remove: name of the formula to remove
+        :raise AttributeError: if the service doesn't contain any formula with this name
         """
-        formula_id_to_remove = None
-        for formula_id, formula_name in self.formula_name.items():
-            if formula_name_to_remove == formula_name:
-                formula_id_to_remove = formula_id
-        if formula_id_to_remove is not None:
-            del self.formula_name[formula_id_to_remove]
-        else:
+        if formula_name_to_remove not in self.formula_id:
             raise AttributeError
+        formula_id = self.formula_id.pop(formula_name_to_remove)
+        del self.formula_name[formula_id]
+        self.formula_index.remove(formula_id)
@@ -35,6 +35,20 @@ class PrimaryDispatchRuleRuleAlreadyDefinedException(PowerAPIException):
     """
 
 
+def formula_id_prefix_length(dispatch_rule, primary_dispatch_rule) -> int:
+    """
+    Return the number of leading fields of a dispatch rule that are equal to the fields of the primary dispatch rule
+
+    A formula id extracted with the dispatch rule is truncated to this length to match the primary formula ids
+    """
+    length = 0
+    for field, primary_field in zip(dispatch_rule.fields, primary_dispatch_rule.fields):
+        if field != primary_field:
+            break
+        length += 1
+    return length
+
+
 class RouteTable:
     """
     Structure that map a :class:`Report<powerapi.report.Report>` type to a
@@ -47,6 +61,10 @@ class RouteTable:
         self.route_table = []
         #: (powerapi.DispatchRule): Allow to define how to create the Formula id
         self.primary_dispatch_rule = None
+        #: (dict): dispatch rule of each report class already received
+        self._dispatch_rule_cache = {}
+        #: (dict): formula id prefix length of each dispatch rule, indexed by the rule id
+        self._prefix_length_cache = {}
 
     def get_dispatch_rule(self, msg):
         """
@@ -59,11 +77,33 @@ class RouteTable:
         :raise: UnknowMessageTypeException if no group by rule is mapped to the
                 received message type
         """
-        for (report_class, dispatch_rule) in self.route_table:
-            if isinstance(msg, report_class):
-                return dispatch_rule
+        msg_class = type(msg)
+        try:
+            return self._dispatch_rule_cache[msg_class]
+        except KeyError:
+            pass
 
-        return None
+        dispatch_rule = None
+        for (report_class, rule) in self.route_table:
+            if issubclass(msg_class, report_class):
+                dispatch_rule = rule
+                break
+        self._dispatch_rule_cache[msg_class] = dispatch_rule
+        return dispatch_rule
+
+    def get_formula_id_prefix_length(self, dispatch_rule) -> int:
+        """
+        Return the length of the formula ids extracted with the given dispatch rule that match the primary formula ids
+
+        :param dispatch_rule: a dispatch rule of the route table
+        :type dispatch_rule:  powerapi.dispatch_rule.DispatchRule
+        """
+        try:
+            return self._prefix_length_cache[id(dispatch_rule)]
+        except KeyError:
+            length = formula_id_prefix_length(dispatch_rule, self.primary_dispatch_rule)
+            self._prefix_length_cache[id(dispatch_rule)] = length
+            return length
 
     def dispatch_rule(self, report_class, dispatch_rule):
         """
@@ -80,3 +120,5 @@ class RouteTable:
             self.primary_dispatch_rule = dispatch_rule
 
         self.route_table.append((report_class, dispatch_rule))
+        self._dispatch_rule_cache = {}
+        self._prefix_length_cache = {}
@@ -0,0 +1,160 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from bisect import bisect_right
+from hashlib import blake2b
+from typing import List, Set, Tuple
+
+from powerapi.exception import PowerAPIException
+from powerapi.report import Report
+from powerapi.dispatcher.route_table import RouteTable
+from powerapi.dispatcher.dispatcher_actor import _extract_formula_id
+
+
+class ShardRouterException(PowerAPIException):
+    """
+    Exception raised when a shard router is created with a wrong configuration
+    """
+
+
+def _stable_hash(key: str) -> int:
+    """
+    Hash a string with a function that give the same result in every process, unlike the builtin hash function
+    """
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class ShardRouter:
+    """
+    Split the primary formula id space between several dispatcher shards with consistent hashing
+
+    Each shard is a DispatcherActor started with the router and its shard index, it only receives the reports of its
+    formula ids and only creates the formulas it owns, so a report with ids owned by several shards is not processed
+    twice. Reports whose formula id is only a prefix of the primary formula id (ex: socket level reports when formulas
+    are defined per core) are sent to every shard, as the formulas matching this prefix can be owned by any shard.
+
+    A puller route reports to the shards with a filter rule per shard::
+
+        router = ShardRouter(route_table, shard_number)
+        for shard in range(shard_number):
+            dispatchers[shard] = supervisor.launch(DispatcherActor, DispatcherStartMessage(..., shard_router=router,
+                                                                                           shard=shard))
+            report_filter.filter(router.filter_rule(shard), dispatchers[shard])
+    """
+
+    def __init__(self, route_table: RouteTable, shard_number: int, virtual_nodes: int = 64):
+        """
+        :param route_table: route table used by the dispatcher shards
+        :param shard_number: number of dispatcher shards
+        :param virtual_nodes: number of points of each shard on the hash ring
+        """
+        if shard_number <= 0:
+            raise ShardRouterException('shard number must be greater than 0')
+        if virtual_nodes <= 0:
+            raise ShardRouterException('virtual node number must be greater than 0')
+        if route_table.primary_dispatch_rule is None:
+            raise ShardRouterException('route table must define a primary dispatch rule')
+
+        self.route_table = route_table
+        self.shard_number = shard_number
+        self._all_shards = frozenset(range(shard_number))
+
+        ring = sorted((_stable_hash(str(shard) + '-' + str(node)), shard)
+                      for shard in range(shard_number) for node in range(virtual_nodes))
+        self._ring_hashes = [point for point, _ in ring]
+        self._ring_shards = [shard for _, shard in ring]
+
+        self._last_report = None
+        self._last_shards = self._all_shards
+
+    def get_shard(self, formula_id: Tuple) -> int:
+        """
+        Return the shard that own the given primary formula id
+        """
+        position = bisect_right(self._ring_hashes, _stable_hash(repr(formula_id)))
+        return self._ring_shards[position % len(self._ring_shards)]
+
+    def get_shards(self, report: Report) -> Set[int]:
+        """
+        Return the shards that must receive the given report
+
+        A report without dispatch rule is sent to every shard, each shard will then log it as unhandled
+        """
+        if report is self._last_report:
+            return self._last_shards
+
+        dispatch_rule = self.route_table.get_dispatch_rule(report)
+        if dispatch_rule is None:
+            shards = self._all_shards
+        else:
+            primary_rule = self.route_table.primary_dispatch_rule
+            prefix_length = self.route_table.get_formula_id_prefix_length(dispatch_rule)
+            shards = self._get_formula_ids_shards(_extract_formula_id(report, dispatch_rule, primary_rule, prefix_length),
+                                                  len(primary_rule.fields))
+
+        self._last_report = report
+        self._last_shards = shards
+        return shards
+
+    def _get_formula_ids_shards(self, formula_ids: List[Tuple], primary_length: int) -> Set[int]:
+        shards = set()
+        for formula_id in formula_ids:
+            if len(formula_id) < primary_length:
+                return self._all_shards
+            shards.add(self.get_shard(formula_id))
+        return shards
+
+    def filter_rule(self, shard: int) -> 'ShardFilterRule':
+        """
+        Return the filter rule that accept the reports of the given shard
+        """
+        if shard not in self._all_shards:
+            raise ShardRouterException('shard must be between 0 and ' + str(self.shard_number - 1))
+        return ShardFilterRule(self, shard)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_last_report'] = None
+        state['_last_shards'] = self._all_shards
+        return state
+
+
+class ShardFilterRule:
+    """
+    Filter rule that accept the reports routed to a dispatcher shard
+
+    Rules of the same router share the shards computed for the last report, so the formula ids of a report are only
+    extracted once when the puller's filter evaluates every shard rule
+    """
+
+    def __init__(self, router: ShardRouter, shard: int):
+        self.router = router
+        self.shard = shard
+
+    def __call__(self, report: Report) -> bool:
+        return self.shard in self.router.get_shards(report)
@@ -0,0 +1,138 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from typing import Dict, List
+
+from thespian.actors import ActorAddress, ActorExitRequest, WakeupMessage
+
+from powerapi.actor import Actor, InitializationException
+from powerapi.message import FanOutPusherStartMessage, EndMessage, ReportBatch, GetPusherStatsMessage
+from powerapi.pusher import PusherOutput
+from powerapi.report import Report, PowerReport
+from powerapi.utils import PendingAck
+
+
+class FanOutPusherActor(Actor):
+    """
+    FanOutPusherActor class
+
+    The FanOutPusher saves the reports sent by formulas to several databases, so that formulas send each report once
+    instead of once per output.
+
+    Each database is a PusherOutput with its own writer thread, so the databases are written concurrently and a slow
+    database does not delay the others, its own buffer when its batch size is greater than 1 and its own spill queue
+    when it has a spill directory. A message is acknowledged once its reports are saved to all the databases.
+    """
+
+    def __init__(self):
+        Actor.__init__(self, FanOutPusherStartMessage)
+        self.outputs: Dict[str, PusherOutput] = {}
+
+    def _initialization(self, start_message: FanOutPusherStartMessage):
+        Actor._initialization(self, start_message)
+        if not start_message.outputs:
+            raise InitializationException('no output given to the fan-out pusher')
+        spill_directories = [output.spill_directory for output in start_message.outputs.values() if output.spill_directory is not None]
+        if len(set(spill_directories)) != len(spill_directories):
+            raise InitializationException('outputs of the fan-out pusher must use different spill directories')
+
+        for output_name, output in start_message.outputs.items():
+            self.outputs[output_name] = PusherOutput(self, output, output_name, async_writes=True)
+        for output in self.outputs.values():
+            output.start()
+
+    def receiveMsg_PowerReport(self, message: PowerReport, sender: ActorAddress):
+        """
+        When receiving a PowerReport save it to all the databases, or buffer it for the databases with a batch size
+        """
+        self.log_debug('received message ' + str(message))
+        self._push([message], sender)
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, sender: ActorAddress):
+        """
+        When receiving a ReportBatch save all its reports to all the databases, or buffer them for the databases with a
+        batch size
+        """
+        self.log_debug('received message ' + str(message))
+        self._push(message.reports, sender)
+
+    def _push(self, reports: List[Report], sender: ActorAddress):
+        """
+        save reports to each database, or add them to the buffer of the database and save the buffered reports if the
+        buffer is full
+        the message that contained the reports is acknowledged once all of them are saved to all the databases
+        """
+        if not reports:
+            self._acknowledge([sender])
+            return
+        pending_ack = PendingAck(sender)
+        for output in self.outputs.values():
+            output.hold(reports, pending_ack)
+        upstreams = []
+        for output in self.outputs.values():
+            upstreams += output.push(reports, pending_ack)
+        self._acknowledge(upstreams)
+
+    def receiveMsg_WakeupMessage(self, message: WakeupMessage, __: ActorAddress):
+        """
+        When receiving a WakeupMessage, give it to the output that asked for it
+        """
+        wakeup, output_name = message.payload
+        self._acknowledge(self.outputs[output_name].on_wakeup(wakeup))
+
+    def receiveMsg_GetPusherStatsMessage(self, message: GetPusherStatsMessage, sender: ActorAddress):
+        """
+        When receiving a GetPusherStatsMessage, answer with the write statistics summed over all the databases
+        """
+        self.log_debug('received message ' + str(message))
+        self.send(sender, PusherOutput.gen_stats_message(self.name, list(self.outputs.values())))
+
+    def _close_outputs(self):
+        """
+        save the buffered reports to the databases and wait for the writer threads to save the submitted reports
+        """
+        upstreams = []
+        for output in self.outputs.values():
+            upstreams += output.close()
+        self._acknowledge(upstreams)
+
+    def receiveMsg_EndMessage(self, message: EndMessage, _: ActorAddress):
+        """
+        When receiving an EndMessage notify the ActorSystem and Kill itself
+        """
+        self.log_debug('received message ' + str(message))
+        self._close_outputs()
+        self.send(self.parent, EndMessage(self.name))
+        self.send(self.myAddress, ActorExitRequest())
+
+    def receiveMsg_ActorExitRequest(self, message: ActorExitRequest, sender: ActorAddress):
+        """
+        When receiving ActorExitRequest, save the buffered reports to all the databases before exiting
+        """
+        self._close_outputs()
+        Actor.receiveMsg_ActorExitRequest(self, message, sender)
@@ -26,5 +26,10 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from powerapi.formula.formula_state_store import FormulaStateStore, FormulaStateStoreException
 from powerapi.formula.formula_actor import FormulaActor, FormulaValues, DomainValues
 from powerapi.formula.abstract_cpu_dram_formula import AbstractCpuDramFormula, CpuDramDomainValues
+from powerapi.formula.formula_worker_actor import FormulaWorkerActor, HostedFormulaAddress
+from powerapi.formula.batch_formula_actor import BatchFormulaActor
+from powerapi.formula.multi_target_formula_actor import MultiTargetFormulaActor
+from powerapi.formula.regression import RecursiveLeastSquares, RegressionException
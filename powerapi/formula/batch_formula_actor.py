@@ -0,0 +1,128 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from typing import Dict, List, Tuple, Type
+
+import numpy as np
+from thespian.actors import ActorAddress
+
+from powerapi.formula.abstract_cpu_dram_formula import AbstractCpuDramFormula
+from powerapi.message import FormulaStartMessage, ReportBatch
+from powerapi.report import Report, HWPCReport, PowerReport
+
+
+class BatchFormulaActor(AbstractCpuDramFormula):
+    """
+    Formula that computes the power consumption of all the reports of a ReportBatch at once
+
+    The counters of the reports are gathered in a matrix with one row per report (i.e. per target and timestamp) and one
+    column per (group, event) couple. Formulas implement the compute_power method that estimates the power of all the
+    rows in one vectorized call. The power reports are then sent to the pushers in one ReportBatch.
+    """
+
+    def __init__(self, start_message_cls: Type[FormulaStartMessage]):
+        AbstractCpuDramFormula.__init__(self, start_message_cls)
+
+    def receiveMsg_Report(self, message: Report, _: ActorAddress):
+        """
+        When receiving a report, compute its power consumption as a batch of one report
+        If several power reports are produced, they are sent in one ReportBatch
+        """
+        self.log_debug('received message ' + str(message))
+        power_reports = self._process_reports([message])
+        if len(power_reports) == 1:
+            self._push_report(power_reports[0])
+        elif power_reports:
+            self._send_to_pushers(ReportBatch(self.name, power_reports))
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, _: ActorAddress):
+        """
+        When receiving a batch of reports, compute the power consumption of all its reports and send the power reports
+        in one ReportBatch
+        """
+        self.log_debug('received message ' + str(message))
+        power_reports = self._process_reports(message.reports)
+        if power_reports:
+            self._send_to_pushers(ReportBatch(self.name, power_reports))
+
+    def _process_reports(self, reports: List[Report]) -> List[PowerReport]:
+        reports = [report for report in reports if isinstance(report, HWPCReport)]
+        if not reports:
+            return []
+        events, counters = self.build_counter_matrix(reports)
+        powers = self.compute_power(counters, events)
+        return [self._gen_power_report(report, float(power)) for report, power in zip(reports, powers)]
+
+    def build_counter_matrix(self, reports: List[HWPCReport]) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        """
+        Gather the counters of the reports in a matrix
+
+        :return: the (group, event) couple of each column, sorted, and the matrix with one row per report. An event
+                 missing from a report has a value of 0
+        """
+        report_counters = [self._get_counters(report) for report in reports]
+        events = sorted({event for counters in report_counters for event in counters})
+        columns = {event: index for index, event in enumerate(events)}
+        matrix = np.zeros((len(reports), len(events)))
+        for row, counters in enumerate(report_counters):
+            for event, value in counters.items():
+                matrix[row, columns[event]] = value
+        return events, matrix
+
+    def _get_counters(self, report: HWPCReport) -> Dict[Tuple[str, str], float]:
+        """
+        :return: the value of each (group, event) couple of the report, summed over the sockets and cores of the
+                 formula domain
+        """
+        counters = {}
+        for group_name, sockets in report.groups.items():
+            for socket_id, cores in sockets.items():
+                if self.socket is not None and int(socket_id) != self.socket:
+                    continue
+                for core_id, events in cores.items():
+                    if self.core is not None and int(core_id) != self.core:
+                        continue
+                    for event_name, value in events.items():
+                        key = (group_name, event_name)
+                        counters[key] = counters.get(key, 0) + value
+        return counters
+
+    def _gen_power_report(self, report: HWPCReport, power: float) -> PowerReport:
+        metadata = dict(report.metadata)
+        metadata['socket'] = self.socket
+        return PowerReport(report.timestamp, report.sensor, report.target, power, metadata)
+
+    def compute_power(self, counters: np.ndarray, events: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Compute the power consumption of each row of the counter matrix
+
+        :param counters: matrix with one row per report and one column per event
+        :param events: (group, event) couple of each column
+        :return: array with the power consumption (in Watts) of each row
+        """
+        raise NotImplementedError()
@@ -40,8 +40,8 @@ class DummyFormulaValues(FormulaValues):
     """
     Formula values with configurable sleeping time for dummy formula
     """
-    def __init__(self, pushers: Dict[str, ActorAddress], sleeping_time: int):
-        FormulaValues.__init__(self, pushers)
+    def __init__(self, pushers: Dict[str, ActorAddress], sleeping_time: int, freshness_budget: float = None):
+        FormulaValues.__init__(self, pushers, freshness_budget=freshness_budget)
         self.sleeping_time = sleeping_time
 
 
@@ -73,5 +73,4 @@ class DummyFormulaActor(AbstractCpuDramFormula):
         metadata = dict(message.metadata)
         metadata["socket"] = self.socket
         power_report = PowerReport(message.timestamp, message.sensor, message.target, 42, metadata)
-        for _, pusher in self.pushers.items():
-            self.send(pusher, power_report)
+        self._push_report(power_report)
@@ -26,20 +26,38 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from typing import Dict, Type, Tuple
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Type, Tuple
 
 from thespian.actors import ActorAddress, ActorExitRequest
 
 from powerapi.actor import Actor
-from powerapi.message import FormulaStartMessage, EndMessage
+from powerapi.formula.formula_state_store import FormulaStateStore, FormulaStateStoreException
+from powerapi.message import FormulaStartMessage, EndMessage, ReportBatch, FlowControlMessage, AckMessage, SaveFormulaStateMessage, \
+    GetFormulaStatsMessage, FormulaStatsMessage
+from powerapi.report import Report
+from powerapi.utils import AckTracker, PendingAck
 
 
 class FormulaValues:
     """
     values used to initialize formula actor
     """
-    def __init__(self, pushers: Dict[str, ActorAddress]):
+    def __init__(self, pushers: Dict[str, ActorAddress], state_store: FormulaStateStore = None, snapshot_period: float = None,
+                 freshness_budget: float = None):
+        """
+        :param pushers: pushers the power reports are sent to
+        :param state_store: store where the formulas save their state, None to not save it
+        :param snapshot_period: minimum time (in seconds) between two states saved while processing reports, None to
+                                save the state only when the formula ends or is asked to
+        :param freshness_budget: maximum lag (in seconds) between the timestamp of a report and the newest timestamp
+                                 received by the formula, older reports are skipped. None to process all the reports
+        """
         self.pushers = pushers
+        self.state_store = state_store
+        self.snapshot_period = snapshot_period
+        self.freshness_budget = freshness_budget
 
 
 class DomainValues:
@@ -49,6 +67,9 @@ class DomainValues:
     def __init__(self, device_id: str, formula_id: Tuple):
         self.device_id = device_id
         self.sensor = formula_id[0]
+        self.formula_id = formula_id
+        #: (Any): state saved by the previous formula with the same id, None to start from scratch
+        self.state = None
 
 
 class FormulaActor(Actor):
@@ -60,20 +81,204 @@ class FormulaActor(Actor):
         self.pushers: Dict[str, ActorAddress] = None
         self.device_id = None
         self.sensor = None
+        self._output_batch = None
+        self._flow_control = False
+        self._ack_tracker = AckTracker()
+        self._pending_ack = None
+        self.formula_id = None
+        self.state_store: FormulaStateStore = None
+        self.snapshot_period = None
+        self._last_snapshot_time = None
+        self.freshness_budget: timedelta = None
+        self.newest_report_timestamp: datetime = None
+        self.stale_report_count = 0
 
     def _initialization(self, start_message: FormulaStartMessage):
         Actor._initialization(self, start_message)
         self.pushers = start_message.values.pushers
         self.device_id = start_message.domain_values.device_id
         self.sensor = start_message.domain_values.sensor
+        self.formula_id = start_message.domain_values.formula_id
+        self.state_store = start_message.values.state_store
+        self.snapshot_period = start_message.values.snapshot_period
+        self._last_snapshot_time = time.monotonic()
+        if start_message.values.freshness_budget is not None:
+            self.freshness_budget = timedelta(seconds=start_message.values.freshness_budget)
+        if start_message.domain_values.state is not None:
+            self.restore_state(start_message.domain_values.state)
+
+    def receiveMessage(self, message, sender: ActorAddress):
+        """
+        Process the received message with the handler of its type
+
+        If the sender asked for it, a report or a report batch is acknowledged once the reports it produced are
+        acknowledged by all the pushers. Reports skipped because they are stale are acknowledged right away
+        """
+        if isinstance(message, (Report, ReportBatch)) and self.freshness_budget is not None and self._output_batch is None:
+            message = self._drop_stale_reports(message)
+            if message is None:
+                if self._pending_ack is None and self._ack_requested(sender):
+                    self._acknowledge([sender])
+                return
+
+        if self._pending_ack is not None or not isinstance(message, (Report, ReportBatch)) or not self._ack_requested(sender):
+            Actor.receiveMessage(self, message, sender)
+        else:
+            pending_ack = PendingAck(sender)
+            self._pending_ack = pending_ack
+            try:
+                Actor.receiveMessage(self, message, sender)
+            finally:
+                self._pending_ack = None
+            if pending_ack.remaining == 0:
+                self._acknowledge([sender])
+
+        # the reports of a batch are processed with this method too, the state is saved once the whole batch is processed
+        if isinstance(message, (Report, ReportBatch)) and self._output_batch is None and self._snapshot_due():
+            self.save_state()
+
+    def _drop_stale_reports(self, message):
+        """
+        Skip the reports whose timestamp lags the newest timestamp received by more than the freshness budget
+        The newest timestamp of a batch is taken into account before filtering it, so that a formula receiving batches
+        of its backlog only processes the end of it
+
+        :return: the message without its stale reports, None if all its reports are stale
+        """
+        reports = message.reports if isinstance(message, ReportBatch) else [message]
+        newest_timestamp = max(report.timestamp for report in reports) if reports else None
+        if newest_timestamp is not None and (self.newest_report_timestamp is None or newest_timestamp > self.newest_report_timestamp):
+            self.newest_report_timestamp = newest_timestamp
+
+        fresh_reports = self._get_fresh_reports(reports)
+        if len(fresh_reports) == len(reports):
+            return message
+        self.log_debug('skip ' + str(len(reports) - len(fresh_reports)) + ' stale reports older than ' +
+                       str(self.newest_report_timestamp - self.freshness_budget))
+        if not fresh_reports:
+            return None
+        return ReportBatch(message.sender_name, fresh_reports)
+
+    def _get_fresh_reports(self, reports: List[Report]) -> List[Report]:
+        fresh_reports = []
+        for report in reports:
+            if self.newest_report_timestamp - report.timestamp > self.freshness_budget:
+                self.stale_report_count += 1
+            else:
+                fresh_reports.append(report)
+        return fresh_reports
+
+    def receiveMsg_FlowControlMessage(self, message: FlowControlMessage, sender: ActorAddress):
+        """
+        When receiving a FlowControlMessage, ask the pushers to acknowledge the reports sent to them too
+        """
+        Actor.receiveMsg_FlowControlMessage(self, message, sender)
+        if not self._flow_control:
+            self._flow_control = True
+            for _, pusher in self.pushers.items():
+                self.send(pusher, FlowControlMessage(self.name))
+
+    def receiveMsg_AckMessage(self, message: AckMessage, sender: ActorAddress):
+        """
+        When receiving an AckMessage from a pusher, acknowledge the reports whose output is now saved by all the pushers
+        """
+        self._acknowledge(self._ack_tracker.acknowledged(str(sender), message.count))
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, sender: ActorAddress):
+        """
+        When receiving a batch of reports, process each report with the handler of its type
+        The reports pushed while processing the batch are sent to the pushers in one ReportBatch
+        """
+        self.log_debug('received message ' + str(message))
+        self._output_batch = []
+        try:
+            for report in message.reports:
+                self.receiveMessage(report, sender)
+            output_batch = self._output_batch
+        finally:
+            self._output_batch = None
+
+        if output_batch:
+            self._send_to_pushers(ReportBatch(self.name, output_batch))
+
+    def _push_report(self, report: Report):
+        """
+        Send a report to all the pushers
+        While processing a ReportBatch, the report is kept to be sent with the other reports of the batch
+        """
+        if self._output_batch is not None:
+            self._output_batch.append(report)
+            return
+        self._send_to_pushers(report)
+
+    def _send_to_pushers(self, message):
+        """
+        Send a report or a report batch to all the pushers and wait for their acknowledgment if flow control is enabled
+        """
+        for _, pusher in self.pushers.items():
+            self.send(pusher, message)
+            if self._flow_control:
+                self._ack_tracker.sent(str(pusher), [] if self._pending_ack is None else [self._pending_ack])
 
     def receiveMsg_EndMessage(self, message: EndMessage, _: ActorAddress):
         """
         when receiving a EndMessage kill itself
         """
         self.log_debug('received message ' + str(message))
+        if self.freshness_budget is not None:
+            self.log_info('skipped ' + str(self.stale_report_count) + ' stale reports')
+        self.save_state()
         self.send(self.myAddress, ActorExitRequest())
 
+    def receiveMsg_GetFormulaStatsMessage(self, message: GetFormulaStatsMessage, sender: ActorAddress):
+        """
+        When receiving a GetFormulaStatsMessage, answer with the report processing statistics of the formula
+        """
+        self.log_debug('received message ' + str(message))
+        self.send(sender, FormulaStatsMessage(self.name, self.stale_report_count))
+
+    def receiveMsg_SaveFormulaStateMessage(self, message: SaveFormulaStateMessage, _: ActorAddress):
+        """
+        When receiving a SaveFormulaStateMessage, save the formula state to the state store
+        """
+        self.log_debug('received message ' + str(message))
+        self.save_state()
+
+    def snapshot_state(self) -> Any:
+        """
+        Formulas that learn from the reports they process override this method to give the state to save
+        The state must be picklable
+
+        :return: the state of the formula, None if there is nothing to save
+        """
+        return None
+
+    def restore_state(self, state: Any):
+        """
+        Formulas that override snapshot_state override this method to initialize themselves from a saved state
+
+        :param state: state returned by snapshot_state
+        """
+
+    def _snapshot_due(self) -> bool:
+        return self.snapshot_period is not None and time.monotonic() - self._last_snapshot_time >= self.snapshot_period
+
+    def save_state(self):
+        """
+        Save the formula state to the state store, if there is one
+        A state that can't be saved is logged and dropped, the formula keeps processing reports
+        """
+        self._last_snapshot_time = time.monotonic()
+        if self.state_store is None:
+            return
+        state = self.snapshot_state()
+        if state is None:
+            return
+        try:
+            self.state_store.save(self.formula_id, state)
+        except FormulaStateStoreException as exn:
+            self.log_error(exn.msg)
+
     @staticmethod
     def gen_domain_values(device_id: str, formula_id: Tuple) -> DomainValues:
         """
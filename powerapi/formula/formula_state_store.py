@@ -0,0 +1,103 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import hashlib
+import os
+import pickle
+from typing import Any, Tuple
+
+from powerapi.exception import PowerAPIExceptionWithMessage
+
+
+class FormulaStateStoreException(PowerAPIExceptionWithMessage):
+    """
+    Exception raised when a formula state can't be saved to or loaded from a state store
+    """
+
+
+class FormulaStateStore:
+    """
+    Store keeping the last state saved by each formula in a local directory, one file per formula id
+
+    A formula created with an id whose state is stored is initialized with this state instead of starting from scratch
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: path of the directory where the states are stored, created if it does not exist
+        """
+        self.directory = directory
+
+    def _get_path(self, formula_id: Tuple) -> str:
+        # formula ids may contain any character, the file name is a digest of the id
+        digest = hashlib.blake2b(repr(tuple(formula_id)).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + '.state')
+
+    def save(self, formula_id: Tuple, state: Any):
+        """
+        save the state of a formula, replacing its previous state
+
+        The state is written in a temporary file first, so that a formula stopped while saving its state doesn't leave
+        a truncated state behind
+        :raise FormulaStateStoreException: if the state can't be written or pickled
+        """
+        path = self._get_path(formula_id)
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as state_file:
+                pickle.dump((tuple(formula_id), state), state_file)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError) as exn:
+            raise FormulaStateStoreException('can\'t save state of formula ' + str(formula_id) + ' : ' + str(exn)) from exn
+
+    def load(self, formula_id: Tuple) -> Any:
+        """
+        :return: the last state saved for the given formula id, None if no state is stored for it
+        :raise FormulaStateStoreException: if the stored state can't be read
+        """
+        path = self._get_path(formula_id)
+        try:
+            with open(path, 'rb') as state_file:
+                stored_id, state = pickle.load(state_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError) as exn:
+            raise FormulaStateStoreException('can\'t load state of formula ' + str(formula_id) + ' : ' + str(exn)) from exn
+        if stored_id != tuple(formula_id):
+            return None
+        return state
+
+    def remove(self, formula_id: Tuple):
+        """
+        remove the state stored for the given formula id, if any
+        """
+        try:
+            os.remove(self._get_path(formula_id))
+        except FileNotFoundError:
+            pass
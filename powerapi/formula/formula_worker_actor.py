@@ -0,0 +1,183 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import traceback
+from collections import deque
+from typing import Dict, Type
+
+from thespian.actors import ActorAddress, ActorExitRequest, ChildActorExited, PoisonMessage
+
+from powerapi.actor import Actor
+from powerapi.formula.formula_actor import FormulaActor
+from powerapi.message import FormulaWorkerStartMessage, FormulaStartMessage, HostedFormulaMessage, HostedFormulaMessageBatch, \
+    FlowControlMessage, AckMessage, ReportBatch
+from powerapi.report import Report
+
+
+class HostedFormulaAddress:
+    """
+    Address of a formula hosted by a formula worker
+
+    A dispatcher wraps the messages sent to this address into a HostedFormulaMessage sent to the worker
+    """
+
+    def __init__(self, worker: ActorAddress, formula_name: str):
+        """
+        :param worker: address of the worker hosting the formula
+        :param formula_name: name of the hosted formula
+        """
+        self.worker = worker
+        self.formula_name = formula_name
+
+    def __str__(self):
+        return str(self.worker) + '/' + self.formula_name
+
+    def __eq__(self, other):
+        return isinstance(other, HostedFormulaAddress) and self.worker == other.worker and \
+            self.formula_name == other.formula_name
+
+    # like actor addresses, hosted formula addresses are not hashable
+    __hash__ = None
+
+
+class _HostedActorRef:
+    """
+    Reference used in place of the actor system reference of a hosted formula, it gives the formula its address
+    """
+
+    def __init__(self, address: HostedFormulaAddress):
+        self.address = address
+        self.globalName = None  # pylint: disable=invalid-name
+
+
+class FormulaWorkerActor(Actor):
+    """
+    Actor hosting several formulas of the same class in one process
+
+    The worker receives the messages of its formulas wrapped into HostedFormulaMessage and processes them with one
+    formula instance per formula name, created when its FormulaStartMessage is received. The messages sent by a formula
+    to the dispatcher are wrapped the same way, the other ones (reports sent to the pushers) are sent directly.
+    Hosted formulas can't create actors or ask to be woken up.
+    """
+
+    def __init__(self):
+        Actor.__init__(self, FormulaWorkerStartMessage)
+        self.formula_class: Type[FormulaActor] = None
+        self.formulas: Dict[str, FormulaActor] = {}
+        self._flow_controlled_destinations = set()
+        #: (dict): name of the formula that sent each message not acknowledged yet, per destination
+        self._unacknowledged = {}
+
+    def _initialization(self, start_message: FormulaWorkerStartMessage):
+        Actor._initialization(self, start_message)
+        self.formula_class = start_message.formula_class
+
+    def receiveMsg_HostedFormulaMessage(self, message: HostedFormulaMessage, sender: ActorAddress):
+        """
+        When receiving a HostedFormulaMessage, process the wrapped message with the formula it is sent to
+        The formula is created if the message is its FormulaStartMessage and stopped if the message is an
+        ActorExitRequest
+        """
+        self._receive_hosted_message(message.formula_name, message.message, sender)
+
+    def receiveMsg_HostedFormulaMessageBatch(self, message: HostedFormulaMessageBatch, sender: ActorAddress):
+        """
+        When receiving a HostedFormulaMessageBatch, process each wrapped message with the formula it is sent to
+        """
+        for formula_name, hosted_message in message.messages:
+            self._receive_hosted_message(formula_name, hosted_message, sender)
+
+    def _receive_hosted_message(self, formula_name: str, hosted_message, sender: ActorAddress):
+        if isinstance(hosted_message, FormulaStartMessage) and formula_name not in self.formulas:
+            self.formulas[formula_name] = self._create_formula(formula_name)
+
+        if formula_name not in self.formulas:
+            self.log_debug('drop ' + str(hosted_message) + ' sent to stopped formula ' + formula_name)
+        elif isinstance(hosted_message, ActorExitRequest):
+            self._remove_formula(formula_name)
+        else:
+            self._process(formula_name, hosted_message, sender)
+
+    def receiveMsg_AckMessage(self, message: AckMessage, sender: ActorAddress):
+        """
+        When receiving an AckMessage from a pusher, forward the acknowledgments to the formulas that sent the messages
+        Messages are acknowledged in the order they were sent
+        """
+        senders = self._unacknowledged.get(str(sender), deque())
+        counts = {}
+        for _ in range(min(message.count, len(senders))):
+            formula_name = senders.popleft()
+            counts[formula_name] = counts.get(formula_name, 0) + 1
+        for formula_name, count in counts.items():
+            if formula_name in self.formulas:
+                self._process(formula_name, AckMessage(message.sender_name, count), sender)
+
+    def _create_formula(self, formula_name: str) -> FormulaActor:
+        formula = self.formula_class()
+        formula._myRef = _HostedActorRef(HostedFormulaAddress(self.myAddress, formula_name))  # pylint: disable=protected-access
+        formula.send = lambda target, message: self._send_from_formula(formula_name, target, message)
+        return formula
+
+    def _remove_formula(self, formula_name: str):
+        """
+        stop a formula and notify the dispatcher, as the actor system does when a child actor exits
+        """
+        formula = self.formulas.pop(formula_name)
+        formula.receiveMessage(ActorExitRequest(), self.myAddress)
+        exited_message = ChildActorExited(HostedFormulaAddress(self.myAddress, formula_name))
+        self.send(self.parent, HostedFormulaMessage(self.name, formula_name, exited_message))
+
+    def _process(self, formula_name: str, message, sender: ActorAddress):
+        """
+        process a message with a hosted formula, the message is sent back to the dispatcher in a PoisonMessage if the
+        formula failed to process it
+        """
+        try:
+            self.formulas[formula_name].receiveMessage(message, sender)
+        except Exception:  # pylint: disable=broad-except
+            details = traceback.format_exc()
+            self.log_error('formula ' + formula_name + ' failed to process ' + str(message) + ' : ' + details)
+            self.send(self.parent, HostedFormulaMessage(self.name, formula_name, PoisonMessage(message, details)))
+
+    def _send_from_formula(self, formula_name: str, target, message):
+        """
+        send a message on behalf of a hosted formula
+        """
+        if isinstance(target, HostedFormulaAddress):
+            # a formula can only send messages to itself, the message is processed after the ones already received
+            self.send(self.myAddress, HostedFormulaMessage(self.name, target.formula_name, message))
+            return
+        if target == self.parent:
+            self.send(self.parent, HostedFormulaMessage(self.name, formula_name, message))
+            return
+
+        if isinstance(message, FlowControlMessage):
+            self._flow_controlled_destinations.add(str(target))
+        elif isinstance(message, (Report, ReportBatch)) and str(target) in self._flow_controlled_destinations:
+            self._unacknowledged.setdefault(str(target), deque()).append(formula_name)
+        self.send(target, message)
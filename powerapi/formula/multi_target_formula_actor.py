@@ -0,0 +1,93 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from datetime import datetime
+from typing import Dict, List, Type
+
+from thespian.actors import ActorAddress
+
+from powerapi.actor import InitializationException
+from powerapi.formula.batch_formula_actor import BatchFormulaActor
+from powerapi.message import FormulaStartMessage, EndMessage, ReportBatch
+from powerapi.report import Report, HWPCReport, PowerReport
+
+
+class MultiTargetFormulaActor(BatchFormulaActor):
+    """
+    Formula that computes the power consumption of all the targets of a socket
+
+    The formula must be dispatched at socket depth (formula id (sensor, socket)) so that it receives the reports of all
+    the targets of its socket. Reports are gathered by timestamp : once a report with a newer timestamp is received, the
+    counters of all the targets of the previous timestamp are gathered in a matrix (one row per target) and their power
+    consumption is computed in one compute_power call. Reports older than the current timestamp are dropped.
+    """
+
+    def __init__(self, start_message_cls: Type[FormulaStartMessage]):
+        BatchFormulaActor.__init__(self, start_message_cls)
+        self.tick_timestamp: datetime = None
+        #: (dict): report of each target for the current timestamp
+        self.tick_reports: Dict[str, HWPCReport] = {}
+        self.late_report_count = 0
+
+    def _initialization(self, start_message: FormulaStartMessage):
+        BatchFormulaActor._initialization(self, start_message)
+        if self.socket is None or self.core is not None:
+            raise InitializationException('multi-target formula must be dispatched at socket depth')
+
+    def _process_reports(self, reports: List[Report]) -> List[PowerReport]:
+        power_reports = []
+        for report in reports:
+            if not isinstance(report, HWPCReport):
+                continue
+            if self.tick_timestamp is not None and report.timestamp < self.tick_timestamp:
+                self.late_report_count += 1
+                self.log_warning('drop late report ' + str(report))
+                continue
+            if self.tick_timestamp is not None and report.timestamp > self.tick_timestamp:
+                power_reports += self._process_tick()
+            self.tick_timestamp = report.timestamp
+            self.tick_reports[report.target] = report
+        return power_reports
+
+    def _process_tick(self) -> List[PowerReport]:
+        """
+        compute the power consumption of the targets of the current timestamp
+        """
+        reports = list(self.tick_reports.values())
+        self.tick_reports = {}
+        return BatchFormulaActor._process_reports(self, reports)
+
+    def receiveMsg_EndMessage(self, message: EndMessage, sender: ActorAddress):
+        """
+        When receiving an EndMessage, compute the power consumption of the targets of the current timestamp then kill
+        itself
+        """
+        power_reports = self._process_tick()
+        if power_reports:
+            self._send_to_pushers(ReportBatch(self.name, power_reports))
+        BatchFormulaActor.receiveMsg_EndMessage(self, message, sender)
@@ -0,0 +1,159 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from typing import Dict
+
+import numpy as np
+
+from powerapi.exception import PowerAPIExceptionWithMessage
+
+
+class RegressionException(PowerAPIExceptionWithMessage):
+    """
+    Exception raised when a regression model is used with data of a wrong shape or restored from an invalid snapshot
+    """
+
+
+class RecursiveLeastSquares:
+    """
+    Linear regression model fitted online with the recursive least squares algorithm
+
+    Each sample updates the coefficients in O(n²) operations for n features, whatever the number of samples already
+    seen, and the model only keeps its coefficients and a n x n covariance matrix. A forgetting factor lower than 1
+    gives more weight to the recent samples, so that the model follows a drifting relation
+    """
+
+    def __init__(self, feature_number: int, forgetting_factor: float = 1.0, initial_covariance: float = 1e3,
+                 fit_intercept: bool = True):
+        """
+        :param feature_number: number of features of a sample
+        :param forgetting_factor: weight of the past samples, between 0 (excluded) and 1 (no forgetting)
+        :param initial_covariance: initial diagonal of the covariance matrix, a high value means little confidence in
+                                   the initial coefficients (0)
+        :param fit_intercept: if True, a constant feature is added to fit an intercept
+        """
+        if feature_number < 1:
+            raise RegressionException('feature number must be greater than 0')
+        if not 0 < forgetting_factor <= 1:
+            raise RegressionException('forgetting factor must be in ]0, 1]')
+        if initial_covariance <= 0:
+            raise RegressionException('initial covariance must be greater than 0')
+        self.feature_number = feature_number
+        self.forgetting_factor = forgetting_factor
+        self.fit_intercept = fit_intercept
+        size = feature_number + 1 if fit_intercept else feature_number
+        self.weights = np.zeros(size)
+        self.covariance = np.eye(size) * initial_covariance
+        self.sample_count = 0
+
+    @property
+    def coefficients(self) -> np.ndarray:
+        """
+        coefficient of each feature
+        """
+        return self.weights[:self.feature_number]
+
+    @property
+    def intercept(self) -> float:
+        """
+        intercept of the model, 0 if the model doesn't fit an intercept
+        """
+        return float(self.weights[-1]) if self.fit_intercept else 0.0
+
+    def _augment(self, features: np.ndarray) -> np.ndarray:
+        features = np.asarray(features, dtype=float)
+        if features.shape[-1] != self.feature_number:
+            raise RegressionException('expected ' + str(self.feature_number) + ' features, got ' + str(features.shape[-1]))
+        if not self.fit_intercept:
+            return features
+        return np.concatenate([features, np.ones(features.shape[:-1] + (1,))], axis=-1)
+
+    def update(self, features: np.ndarray, target: float):
+        """
+        update the model with one sample
+
+        :param features: array with the value of each feature
+        :param target: value observed for these features
+        """
+        x = self._augment(features)
+        covariance_x = self.covariance @ x
+        gain = covariance_x / (self.forgetting_factor + x @ covariance_x)
+        self.weights = self.weights + gain * (target - x @ self.weights)
+        self.covariance = (self.covariance - np.outer(gain, covariance_x)) / self.forgetting_factor
+        self.sample_count += 1
+
+    def update_many(self, features: np.ndarray, targets: np.ndarray):
+        """
+        update the model with several samples, in order
+
+        :param features: matrix with one row per sample
+        :param targets: array with the value observed for each sample
+        """
+        for row, target in zip(np.asarray(features, dtype=float), np.asarray(targets, dtype=float)):
+            self.update(row, target)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        :param features: array with the value of each feature of a sample, or matrix with one row per sample
+        :return: the value predicted for the sample, or an array with the value predicted for each sample
+        """
+        return self._augment(features) @ self.weights
+
+    def snapshot(self) -> Dict:
+        """
+        :return: the state of the model, made of builtin types only so that it can be serialized with json or pickle
+        """
+        return {
+            'feature_number': self.feature_number,
+            'forgetting_factor': self.forgetting_factor,
+            'fit_intercept': self.fit_intercept,
+            'weights': self.weights.tolist(),
+            'covariance': self.covariance.tolist(),
+            'sample_count': self.sample_count,
+        }
+
+    @staticmethod
+    def from_snapshot(snapshot: Dict) -> 'RecursiveLeastSquares':
+        """
+        :return: a model restored from a snapshot returned by the snapshot method
+        :raise RegressionException: if the snapshot is not valid
+        """
+        try:
+            model = RecursiveLeastSquares(snapshot['feature_number'], snapshot['forgetting_factor'],
+                                          fit_intercept=snapshot['fit_intercept'])
+            weights = np.array(snapshot['weights'], dtype=float)
+            covariance = np.array(snapshot['covariance'], dtype=float)
+            sample_count = int(snapshot['sample_count'])
+        except (KeyError, TypeError, ValueError) as exn:
+            raise RegressionException('invalid regression snapshot : ' + str(exn)) from exn
+        if weights.shape != model.weights.shape or covariance.shape != model.covariance.shape:
+            raise RegressionException('invalid regression snapshot : wrong weights or covariance shape')
+        model.weights = weights
+        model.covariance = covariance
+        model.sample_count = sample_count
+        return model
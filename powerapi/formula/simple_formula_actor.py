@@ -54,5 +54,4 @@ class SimpleFormulaActor(FormulaActor):
         """
         self.log_debug('received message ' + str(message))
 
-        for _, pusher in self.pushers.items():
-            self.send(pusher, message)
+        self._push_report(message)
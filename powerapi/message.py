@@ -27,15 +27,16 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from __future__ import annotations
-from typing import Type, List
+from typing import Type, List, Dict
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from powerapi.database import BaseDB
     from powerapi.filter import Filter
-    from powerapi.dispatcher import RouteTable
+    from powerapi.dispatcher import RouteTable, ShardRouter
     from powerapi.formula import FormulaActor, FormulaValues, DomainValues
     from powerapi.report_modifier import ReportModifier
+    from powerapi.report import Report
 
 
 class Message:
@@ -115,13 +116,236 @@ class EndMessage(Message):
         return "EndMessage"
 
 
+class ReportBatch(Message):
+    """
+    Message used to send several reports to an actor at once
+    """
+
+    def __init__(self, sender_name: str, reports: List[Report]):
+        """
+        :param sender_name: name of the actor that send the message
+        :param reports: reports of the batch
+        """
+        Message.__init__(self, sender_name)
+        self.reports = reports
+
+    def __len__(self):
+        return len(self.reports)
+
+    def __str__(self):
+        return "ReportBatch of " + str(len(self.reports)) + " reports from " + self.sender_name
+
+
+class FlowControlMessage(Message):
+    """
+    Message used by an actor to ask its receiver to acknowledge each report or report batch it sends
+    """
+
+    def __init__(self, sender_name: str):
+        Message.__init__(self, sender_name)
+
+    def __str__(self):
+        return "FlowControlMessage from " + self.sender_name
+
+
+class SaveFormulaStateMessage(Message):
+    """
+    Message used to ask formulas to save their state to their state store
+    """
+
+    def __init__(self, sender_name: str):
+        Message.__init__(self, sender_name)
+
+    def __str__(self):
+        return "SaveFormulaStateMessage from " + self.sender_name
+
+
+class AckMessage(Message):
+    """
+    Message used to acknowledge reports or report batches, it gives back credits to the actor that sent them
+    """
+
+    def __init__(self, sender_name: str, count: int = 1):
+        """
+        :param sender_name: name of the actor that send the message
+        :param count: number of acknowledged messages
+        """
+        Message.__init__(self, sender_name)
+        self.count = count
+
+    def __str__(self):
+        return "AckMessage of " + str(self.count) + " messages from " + self.sender_name
+
+
+class HostedFormulaMessage(Message):
+    """
+    Message exchanged between a dispatcher and a formula worker, it wraps a message sent to or by one of the formulas
+    hosted by the worker
+    """
+
+    def __init__(self, sender_name: str, formula_name: str, message):
+        """
+        :param sender_name: name of the actor that send the message
+        :param formula_name: name of the hosted formula that receive or send the wrapped message
+        :param message: wrapped message
+        """
+        Message.__init__(self, sender_name)
+        self.formula_name = formula_name
+        self.message = message
+
+    def __str__(self):
+        return "HostedFormulaMessage for " + self.formula_name + " : " + str(self.message)
+
+
+class HostedFormulaMessageBatch(Message):
+    """
+    Message used by a dispatcher to send several messages to the formulas hosted by a formula worker at once
+    A report sent to several formulas of the worker is then serialized once
+    """
+
+    def __init__(self, sender_name: str, messages: List):
+        """
+        :param sender_name: name of the actor that send the message
+        :param messages: list of tuple (formula name, message), in sending order
+        """
+        Message.__init__(self, sender_name)
+        self.messages = messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __str__(self):
+        return "HostedFormulaMessageBatch of " + str(len(self.messages)) + " messages from " + self.sender_name
+
+
+class GetWakeupStatsMessage(Message):
+    """
+    Message used to ask a timed actor for its wakeup statistics
+    """
+
+    def __init__(self, sender_name: str):
+        Message.__init__(self, sender_name)
+
+    def __str__(self):
+        return "GetWakeupStatsMessage : " + self.sender_name
+
+
+class WakeupStatsMessage(Message):
+    """
+    Message used to send the wakeup statistics of a timed actor
+    """
+
+    def __init__(self, sender_name: str, time_interval: float, hit_count: int, miss_count: int):
+        """
+        :param sender_name: name of the actor that send the message
+        :param time_interval: time (in seconds) the actor currently waits between two tasks
+        :param hit_count: number of tasks that found data to process
+        :param miss_count: number of tasks that found nothing to process
+        """
+        Message.__init__(self, sender_name)
+        self.time_interval = time_interval
+        self.hit_count = hit_count
+        self.miss_count = miss_count
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        :return: ratio of tasks that found data to process, 0 if no task was launched yet
+        """
+        task_count = self.hit_count + self.miss_count
+        return 0.0 if task_count == 0 else self.hit_count / task_count
+
+    def __str__(self):
+        return "WakeupStatsMessage : interval " + str(self.time_interval) + "s, hit ratio " + str(self.hit_ratio)
+
+
+class GetPusherStatsMessage(Message):
+    """
+    Message used to ask a pusher for its write statistics
+    """
+
+    def __init__(self, sender_name: str):
+        Message.__init__(self, sender_name)
+
+    def __str__(self):
+        return "GetPusherStatsMessage : " + self.sender_name
+
+
+class PusherStatsMessage(Message):
+    """
+    Message used to send the write statistics of a pusher
+    """
+
+    def __init__(self, sender_name: str, queue_depth: int, write_count: int, written_report_count: int,
+                 write_error_count: int, mean_write_latency: float, spilled_report_count: int = 0, spill_size: int = 0,
+                 replayed_report_count: int = 0, replay_rate: float = 0.0):
+        """
+        :param sender_name: name of the actor that send the message
+        :param queue_depth: number of writes waiting for the writer thread
+        :param write_count: number of writes to the database
+        :param written_report_count: number of reports saved to the database
+        :param write_error_count: number of writes that failed
+        :param mean_write_latency: mean duration (in seconds) of a write
+        :param spilled_report_count: number of reports spilled to disk
+        :param spill_size: size (in bytes) of the spilled reports waiting to be saved to the database
+        :param replayed_report_count: number of spilled reports saved to the database
+        :param replay_rate: number of spilled reports saved to the database per second of replay
+        """
+        Message.__init__(self, sender_name)
+        self.queue_depth = queue_depth
+        self.write_count = write_count
+        self.written_report_count = written_report_count
+        self.write_error_count = write_error_count
+        self.mean_write_latency = mean_write_latency
+        self.spilled_report_count = spilled_report_count
+        self.spill_size = spill_size
+        self.replayed_report_count = replayed_report_count
+        self.replay_rate = replay_rate
+
+    def __str__(self):
+        return "PusherStatsMessage : " + str(self.written_report_count) + " reports saved, " + \
+            str(self.write_error_count) + " errors, " + str(self.queue_depth) + " writes waiting"
+
+
+class GetFormulaStatsMessage(Message):
+    """
+    Message used to ask a formula for its report processing statistics
+    """
+
+    def __init__(self, sender_name: str):
+        Message.__init__(self, sender_name)
+
+    def __str__(self):
+        return "GetFormulaStatsMessage : " + self.sender_name
+
+
+class FormulaStatsMessage(Message):
+    """
+    Message used to send the report processing statistics of a formula
+    """
+
+    def __init__(self, sender_name: str, stale_report_count: int):
+        """
+        :param sender_name: name of the actor that send the message
+        :param stale_report_count: number of reports skipped because they lagged the newest report by more than the
+                                   freshness budget
+        """
+        Message.__init__(self, sender_name)
+        self.stale_report_count = stale_report_count
+
+    def __str__(self):
+        return "FormulaStatsMessage : " + str(self.stale_report_count) + " stale reports skipped"
+
+
 class PullerStartMessage(StartMessage):
     """
     Message used to start a Puller actor
     """
 
     def __init__(self, sender_name: str, name: str, database: BaseDB, report_filter: Filter, stream_mode: bool,
-                 report_modifiers: List[ReportModifier] = []):
+                 report_modifiers: List[ReportModifier] = [], batch_size: int = 10, time_budget: float = None,
+                 report_batch_size: int = 1, linger_time: float = 0.1, credits: int = None,
+                 overflow_policy: str = 'pause'):
         """
         :param sender_name: name of the actor that send the message
         :param name: puller actor name
@@ -129,12 +353,28 @@ class PullerStartMessage(StartMessage):
         :param report_filter: report filter used to filter reports
         :param stream_mode: True if stream mode is enabled
         :param report_modifier_list: list of ReportModifier used to modify report before sending them to dispatcher
+        :param batch_size: maximum number of reports pulled from the database each time the puller wakes up
+        :param time_budget: maximum time (in seconds) spent pulling reports each time the puller wakes up, None for
+                            no limit
+        :param report_batch_size: maximum number of reports sent to a dispatcher in one ReportBatch, 1 to send reports
+                                  one by one
+        :param linger_time: maximum time (in seconds) a report can wait in a ReportBatch before being sent
+        :param credits: maximum number of messages sent to a dispatcher that are not fully processed by the pipeline,
+                        None to disable flow control
+        :param overflow_policy: what to do when a dispatcher has no credit left : 'pause' to stop pulling reports or
+                                'drop' to drop the reports sent to this dispatcher
         """
         StartMessage.__init__(self, sender_name, name)
         self.database = database
         self.report_filter = report_filter
         self.stream_mode = stream_mode
         self.report_modifier_list = report_modifiers
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.report_batch_size = report_batch_size
+        self.linger_time = linger_time
+        self.credits = credits
+        self.overflow_policy = overflow_policy
 
 
 class SimplePullerStartMessage(StartMessage):
@@ -163,7 +403,11 @@ class DispatcherStartMessage(StartMessage):
     """
 
     def __init__(self, sender_name: str, name: str, formula_class: Type[FormulaActor], formula_values: FormulaValues,
-                 route_table: RouteTable, device_id: str):
+                 route_table: RouteTable, device_id: str, report_batch_size: int = 1, linger_time: float = 0.1,
+                 formula_idle_ttl: float = None, max_formula_number: int = None, formula_worker_number: int = None,
+                 prewarmed_formula_number: int = 0, max_waiting_reports: int = None, max_total_waiting_reports: int = None,
+                 waiting_overflow_policy: str = 'drop-oldest', coalescing_window: float = None,
+                 shard_router: ShardRouter = None, shard: int = None):
         """
         :param sender_name: name of the actor that send the message
         :param name: puller actor name
@@ -171,12 +415,46 @@ class DispatcherStartMessage(StartMessage):
         :param formula_values: Values that will be always passed to formula for initialization
         :param route_table: Dispatcher's Route table
         :param device_id: name of the device the dispatcher handle
+        :param report_batch_size: maximum number of reports sent to a formula in one ReportBatch, 1 to send reports
+                                  one by one
+        :param linger_time: maximum time (in seconds) a report can wait in a ReportBatch before being sent
+        :param formula_idle_ttl: time (in seconds) after which a formula that received no report is stopped, None to
+                                 keep idle formulas
+        :param max_formula_number: maximum number of live formulas, the least recently used formula is stopped when a
+                                   new one is created beyond this limit. None for no limit
+        :param formula_worker_number: number of formula workers hosting the formulas, None to create one actor per
+                                      formula
+        :param prewarmed_formula_number: number of formula actors created in advance, a new formula is started on one of
+                                         them instead of waiting for a new actor to be created
+        :param max_waiting_reports: maximum number of reports waiting for one formula to start, None for no limit
+        :param max_total_waiting_reports: maximum number of reports waiting for all the formulas to start, None for no
+                                          limit
+        :param waiting_overflow_policy: what to do with a report received when too many reports wait for formulas to
+                                        start : drop-oldest, drop-newest or coalesce-latest
+        :param coalescing_window: time (in seconds) during which the reports sent to a formula are grouped in one
+                                  ReportBatch, it replaces the linger time and the batch size is unlimited unless
+                                  report_batch_size is greater than 1. None to disable it
+        :param shard_router: router that split the formula ids between several dispatcher shards, None if the
+                             dispatcher handles every formula id
+        :param shard: index of the shard handled by the dispatcher, required with a shard router
         """
         StartMessage.__init__(self, sender_name, name)
         self.formula_class = formula_class
         self.formula_values = formula_values
         self.route_table = route_table
         self.device_id = device_id
+        self.report_batch_size = report_batch_size
+        self.linger_time = linger_time
+        self.formula_idle_ttl = formula_idle_ttl
+        self.max_formula_number = max_formula_number
+        self.formula_worker_number = formula_worker_number
+        self.prewarmed_formula_number = prewarmed_formula_number
+        self.max_waiting_reports = max_waiting_reports
+        self.max_total_waiting_reports = max_total_waiting_reports
+        self.waiting_overflow_policy = waiting_overflow_policy
+        self.coalescing_window = coalescing_window
+        self.shard_router = shard_router
+        self.shard = shard
 
 
 class FormulaStartMessage(StartMessage):
@@ -196,19 +474,88 @@ class FormulaStartMessage(StartMessage):
         self.domain_values = domain_values
 
 
+class FormulaWorkerStartMessage(StartMessage):
+    """
+    Message used to start a formula worker actor
+    """
+
+    def __init__(self, sender_name: str, name: str, formula_class: Type[FormulaActor]):
+        """
+        :param sender_name: name of the actor that send the message
+        :param name: formula worker actor name
+        :param formula_class: class of the formulas hosted by the worker
+        """
+        StartMessage.__init__(self, sender_name, name)
+        self.formula_class = formula_class
+
+
 class PusherStartMessage(StartMessage):
     """
     Message used to start a Pusher actor
     """
 
-    def __init__(self, sender_name: str, name: str, database: BaseDB):
+    def __init__(self, sender_name: str, name: str, database: BaseDB, batch_size: int = 1, linger_time: float = 0.1,
+                 async_writes: bool = False, write_queue_size: int = 100, spill_directory: str = None,
+                 spill_retry_period: float = 1.0, max_spill_retry_period: float = 60.0):
         """
         :param sender_name: name of the actor that send the message
         :param name: puller actor name
         :param BaseDB database: Database use for saving data.
+        :param batch_size: maximum number of reports saved to the database in one call, 1 to save the received
+                           messages as they come
+        :param linger_time: maximum time (in seconds) a report can wait in the buffer before being saved
+        :param async_writes: if True, reports are saved by a writer thread instead of the pusher itself
+        :param write_queue_size: maximum number of writes queued for the writer thread, the following writes wait in the
+                                 pusher. 0 for no limit
+        :param spill_directory: directory where the reports that can't be saved are spilled, None to drop them
+        :param spill_retry_period: time (in seconds) to wait before saving spilled reports back to the database
+        :param max_spill_retry_period: maximum time (in seconds) to wait before saving spilled reports back to the
+                                       database, the time to wait is doubled after each failure
         """
         StartMessage.__init__(self, sender_name, name)
         self.database = database
+        self.batch_size = batch_size
+        self.linger_time = linger_time
+        self.async_writes = async_writes
+        self.write_queue_size = write_queue_size
+        self.spill_directory = spill_directory
+        self.spill_retry_period = spill_retry_period
+        self.max_spill_retry_period = max_spill_retry_period
+
+
+class FanOutPusherStartMessage(StartMessage):
+    """
+    Message used to start a FanOutPusher actor
+    """
+
+    def __init__(self, sender_name: str, name: str, outputs: Dict[str, PusherStartMessage]):
+        """
+        :param sender_name: name of the actor that send the message
+        :param name: fan-out pusher actor name
+        :param outputs: for each output name, the start message of the pusher that would save reports to this output.
+                        Its database, batch size, linger time and write queue size are used by the fan-out pusher
+        """
+        StartMessage.__init__(self, sender_name, name)
+        self.outputs = outputs
+
+
+class AggregatorStartMessage(StartMessage):
+    """
+    Message used to start an Aggregator actor
+    """
+
+    def __init__(self, sender_name: str, name: str, pushers: Dict, window_length: float, tags: List[str] = []):
+        """
+        :param sender_name: name of the actor that send the message
+        :param name: aggregator actor name
+        :param pushers: pushers the aggregated power reports are sent to
+        :param window_length: length (in seconds) of the windows the power reports are aggregated over
+        :param tags: metadata that, with the sensor and the target, identify the power reports aggregated together
+        """
+        StartMessage.__init__(self, sender_name, name)
+        self.pushers = pushers
+        self.window_length = window_length
+        self.tags = tags
 
 
 class SimplePusherStartMessage(StartMessage):
@@ -29,13 +29,17 @@
 
 import logging
 import asyncio
+import time
 
-from thespian.actors import ActorExitRequest
+from thespian.actors import ActorExitRequest, ActorAddress
 
 from powerapi.actor import TimedActor, InitializationException
 from powerapi.report import BadInputData
 from powerapi.database import DBError
-from powerapi.message import PullerStartMessage, EndMessage
+from powerapi.message import PullerStartMessage, EndMessage, ReportBatch, FlowControlMessage, AckMessage
+from powerapi.utils import ReportBatcher, CreditWindow
+
+OVERFLOW_POLICIES = ('pause', 'drop')
 
 
 class PullerActor(TimedActor):
@@ -45,7 +49,7 @@ class PullerActor(TimedActor):
     A puller Actor is configured to pull data from one type of sources
     """
     def __init__(self):
-        TimedActor.__init__(self, PullerStartMessage, 0.05)
+        TimedActor.__init__(self, PullerStartMessage, 0.05, min_time_interval=0.005, max_time_interval=0.5)
 
         self.database = None
         self.report_filter = None
@@ -55,6 +59,12 @@ class PullerActor(TimedActor):
         self.loop = None
 
         self._number_of_message_before_sleeping = 10
+        self._time_budget = None
+        self._report_batcher = None
+        self._batch_dispatchers = {}
+        self._credit_window = None
+        self._overflow_policy = 'pause'
+        self.dropped_report_count = 0
 
     def _initialization(self, start_message: PullerStartMessage):
         TimedActor._initialization(self, start_message)
@@ -63,10 +73,46 @@ class PullerActor(TimedActor):
         self.report_filter = start_message.report_filter
         self.stream_mode = start_message.stream_mode
         self.report_modifier_list = start_message.report_modifier_list
-
+        self._number_of_message_before_sleeping = start_message.batch_size
+        self._time_budget = start_message.time_budget
+
+        if self._number_of_message_before_sleeping < 1:
+            raise InitializationException('batch size must be greater than 0')
+        if self._time_budget is not None and self._time_budget <= 0:
+            raise InitializationException('time budget must be greater than 0')
+        if start_message.report_batch_size < 1:
+            raise InitializationException('report batch size must be greater than 0')
+        if start_message.report_batch_size > 1:
+            self._report_batcher = ReportBatcher(start_message.report_batch_size, start_message.linger_time)
+        if start_message.credits is not None and start_message.credits < 1:
+            raise InitializationException('credits must be greater than 0')
+        if start_message.overflow_policy not in OVERFLOW_POLICIES:
+            raise InitializationException('overflow policy must be one of ' + ', '.join(OVERFLOW_POLICIES))
+        self._overflow_policy = start_message.overflow_policy
         self._database_connection()
         if not self.report_filter.filters:
             raise InitializationException('filter without rules')
+        if start_message.credits is not None:
+            self._enable_flow_control(start_message.credits)
+
+    def _enable_flow_control(self, credits: int):
+        """
+        ask the dispatchers to acknowledge the reports once they are processed by the whole pipeline, the puller never
+        has more than `credits` messages waiting for their acknowledgment for one dispatcher
+        """
+        self._credit_window = CreditWindow(credits)
+        asked = set()
+        for _, dispatcher in self.report_filter.filters:
+            if str(dispatcher) not in asked:
+                asked.add(str(dispatcher))
+                self.send(dispatcher, FlowControlMessage(self.name))
+
+    def receiveMsg_AckMessage(self, message: AckMessage, sender: ActorAddress):
+        """
+        When receiving an AckMessage from a dispatcher, give back the credits of the acknowledged messages
+        """
+        if self._credit_window is not None:
+            self._credit_window.release(str(sender), message.count)
 
     def _database_connection(self):
         try:
@@ -89,22 +135,32 @@ class PullerActor(TimedActor):
 
     def _launch_task(self):
         """
-        Initialize the database and connect all dispatcher to the
-        socket_interface
+        Pull a batch of reports from the database and send them to the dispatchers
+
+        The batch ends when _number_of_message_before_sleeping reports were pulled or when the time budget runs out. In
+        both cases the database may still contain reports, so the puller wakes up immediately to pull the next batch.
+        Otherwise the puller sleeps for its time interval, which shrinks while reports keep coming and grows while the
+        database stays empty
+
+        With the pause overflow policy, the puller stops pulling while a dispatcher has no credit left and sleeps as if
+        the database was empty
         """
-        for _ in range(self._number_of_message_before_sleeping):
+        deadline = None if self._time_budget is None else time.monotonic() + self._time_budget
+        for pulled_count in range(self._number_of_message_before_sleeping):
+            if self._overflow_policy == 'pause' and self._credit_window is not None and self._credit_window.is_exhausted():
+                self.log_debug('no credit left, pause pulling')
+                self._schedule_next_task(False)
+                return
             try:
                 raw_report = self._pull_database()
                 report = self._modify_report(raw_report)
                 dispatchers = self.report_filter.route(report)
                 for dispatcher in dispatchers:
-                    self.log_debug('send report ' + str(report) + 'to ' + str(dispatcher))
-                    self.send(dispatcher, report)
-                self.wakeupAfter(self._time_interval)
-                return
+                    self._send_report(dispatcher, report)
             except StopIteration:
                 if self.stream_mode:
-                    self.wakeupAfter(self._time_interval)
+                    self._flush_report_batches()
+                    self._schedule_next_task(pulled_count > 0)
                     return
                 self.log_info('input source empty, stop system')
                 self._terminate()
@@ -114,7 +170,58 @@ class PullerActor(TimedActor):
                 log_line += ' with message : ' + exn.msg
                 self.log_warning(log_line)
 
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self._flush_report_batches(expired_only=True)
+        self._schedule_next_task(True, backlog=True)
+
+    def _send_to_dispatcher(self, dispatcher, message, report_count: int):
+        """
+        send a report or a report batch to a dispatcher, using one of its credits if flow control is enabled
+        With the drop overflow policy, the message is dropped if the dispatcher has no credit left
+        """
+        if self._credit_window is not None:
+            key = str(dispatcher)
+            if self._overflow_policy == 'drop' and not self._credit_window.has_credit(key):
+                self.dropped_report_count += report_count
+                self.log_debug('no credit left for ' + key + ', drop ' + str(report_count) + ' reports')
+                return
+            self._credit_window.consume(key)
+        self.send(dispatcher, message)
+
+    def _send_report(self, dispatcher, report):
+        if self._report_batcher is None:
+            self.log_debug('send report ' + str(report) + 'to ' + str(dispatcher))
+            self._send_to_dispatcher(dispatcher, report, 1)
+            return
+
+        # actor addresses are not hashable, batches are indexed by the address string
+        key = str(dispatcher)
+        self._batch_dispatchers[key] = dispatcher
+        batch = self._report_batcher.add(key, report)
+        if batch is not None:
+            self._send_report_batch(key, batch)
+
+    def _send_report_batch(self, key, reports):
+        self.log_debug('send batch of ' + str(len(reports)) + ' reports to ' + key)
+        self._send_to_dispatcher(self._batch_dispatchers[key], ReportBatch(self.name, reports), len(reports))
+
+    def _flush_report_batches(self, expired_only: bool = False):
+        """
+        send the waiting report batches
+
+        :param expired_only: if True, only send the batches that waited for more than the linger time
+        """
+        if self._report_batcher is None:
+            return
+        batches = self._report_batcher.pop_expired() if expired_only else self._report_batcher.pop_all()
+        for key, reports in batches:
+            self._send_report_batch(key, reports)
+
     def _terminate(self):
+        self._flush_report_batches()
+        if self.dropped_report_count > 0:
+            self.log_warning(str(self.dropped_report_count) + ' reports dropped because dispatchers had no credit left')
         self.send(self.parent, EndMessage(self.name))
         for _, dispatcher in self.report_filter.filters:
             self.send(dispatcher, EndMessage(self.name))
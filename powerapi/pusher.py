@@ -26,58 +26,463 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from thespian.actors import ActorAddress, ActorExitRequest
+import time
+from datetime import timedelta
+from functools import partial
+from typing import List
+
+from thespian.actors import ActorAddress, ActorExitRequest, WakeupMessage
 
 from powerapi.actor import Actor, InitializationException
-from powerapi.message import PusherStartMessage, EndMessage
+from powerapi.message import PusherStartMessage, EndMessage, ReportBatch, GetPusherStatsMessage, PusherStatsMessage
 from powerapi.database import DBError
-from powerapi.report import PowerReport, BadInputData
+from powerapi.report import Report, PowerReport, BadInputData
 from powerapi.exception import PowerAPIExceptionWithMessage, PowerAPIException
+from powerapi.utils import ReportBatcher, AsyncWriter, SpillQueue, PendingAck, hold_pending_acks, release_pending_acks
 
+#: key of the database buffer in the report batcher
+DATABASE_BUFFER = 'database'
 
-class PusherActor(Actor):
-    """
-    PusherActor class
+LINGER_WAKEUP = 'linger'
+WRITE_WAKEUP = 'write'
+SPILL_WAKEUP = 'spill'
 
-    The Pusher allow to save Report sent by Formula.
+#: time (in seconds) between two checks of the writes done by the writer thread
+WRITE_POLL_PERIOD = 0.05
+
+#: maximum number of spilled reports saved to the database in one call
+REPLAY_BATCH_SIZE = 1000
+
+
+class PusherOutput:
     """
+    Database a pusher saves reports to, with its report buffer, its writer thread and its spill queue
 
-    def __init__(self):
-        Actor.__init__(self, PusherStartMessage)
-        self.database = None
+    With a batch size greater than 1, received reports are buffered and saved with one save_many call once the buffer
+    is full or its oldest report waited for the linger time. With asynchronous writes, reports are saved by a writer
+    thread so that the pusher keeps receiving reports while the database is slow. In both cases, the methods saving
+    reports return the upstream actors whose message is acknowledged once its reports are saved, so when the writes lag
+    behind, the formulas using flow control slow down instead of the pusher waiting for the writer thread.
 
-    def _initialization(self, start_message: PusherStartMessage):
-        Actor._initialization(self, start_message)
+    With a spill directory, reports that can't be saved because the database failed, or because too many writes wait
+    for the writer thread, are appended to a SpillQueue on disk and acknowledged. While spilled reports remain, new
+    reports are spilled too and the spilled reports are saved back in bulk, retrying with an exponential backoff until
+    the database recovers. With asynchronous writes, the spill queue and the write statistics are only used by the
+    writer thread, so that reports are spilled and replayed in the order they were received.
+
+    The output asks its pusher to wake it up when buffered reports, writes or spilled reports are due, the pusher gives
+    the payload of these WakeupMessage to on_wakeup
+    """
+
+    def __init__(self, actor: Actor, start_message: PusherStartMessage, name: str = None, async_writes: bool = None):
+        """
+        :param actor: pusher using the output
+        :param start_message: parameters of the output
+        :param name: name of the output, used in the messages and in the wakeup payloads when a pusher uses several
+                     outputs. None if the pusher has only one output
+        :param async_writes: True to save reports from a writer thread, None to use the start message value
+        :raise InitializationException: if a parameter is wrong
+        """
+        self.actor = actor
+        self.name = name
         self.database = start_message.database
+        self.async_writes = start_message.async_writes if async_writes is None else async_writes
+        self.write_queue_size = start_message.write_queue_size
+        self.report_batcher: ReportBatcher = None
+        self.writer: AsyncWriter = None
+        self._linger_wakeup_pending = False
+        self._write_wakeup_pending = False
+        self.write_count = 0
+        self.written_report_count = 0
+        self.write_error_count = 0
+        self.total_write_time = 0.0
+        self.spill_queue: SpillQueue = None
+        self.spill_retry_period = None
+        self.max_spill_retry_period = None
+        #: (float): time (in seconds) to wait before the next replay after a failed one
+        self.spill_retry_delay = None
+        self._replay_delay = None
+        self._spill_wakeup_pending = False
+        self._replay_pending = False
+        self.spilled_report_count = 0
+        self.replayed_report_count = 0
+        self.total_replay_time = 0.0
+
+        if start_message.batch_size < 1:
+            raise InitializationException(self._describe('batch size must be greater than 0'))
+        if start_message.batch_size > 1:
+            if start_message.linger_time <= 0:
+                raise InitializationException(self._describe('linger time must be greater than 0'))
+            self.report_batcher = ReportBatcher(start_message.batch_size, start_message.linger_time)
+        if start_message.write_queue_size < 0:
+            raise InitializationException(self._describe('write queue size must be positive'))
+        if start_message.spill_directory is not None:
+            if not 0 < start_message.spill_retry_period <= start_message.max_spill_retry_period:
+                raise InitializationException(self._describe('spill retry period must be greater than 0 and lower than the max spill '
+                                                             'retry period'))
+            try:
+                self.spill_queue = SpillQueue(start_message.spill_directory)
+            except OSError as exn:
+                raise InitializationException(self._describe('can\'t open spill directory : ' + str(exn))) from exn
+            self.spill_retry_period = start_message.spill_retry_period
+            self.max_spill_retry_period = start_message.max_spill_retry_period
+            self.spill_retry_delay = self.spill_retry_period
+            self._replay_delay = self.spill_retry_period
+
+    def _describe(self, message: str) -> str:
+        return message if self.name is None else 'output ' + self.name + ' : ' + message
+
+    def _wakeup_payload(self, wakeup: str):
+        return wakeup if self.name is None else (wakeup, self.name)
+
+    def start(self):
+        """
+        connect to the database and start the writer thread
 
+        :raise InitializationException: if the database can't be reached
+        """
         try:
             self.database.connect()
         except DBError as error:
-            raise InitializationException(error.msg) from error
+            raise InitializationException(self._describe(error.msg)) from error
+
+        if self.async_writes:
+            self.writer = AsyncWriter(lambda job: job(), self.write_queue_size)
+            self.writer.start()
+        # reports spilled by a previous pusher are replayed
+        self._wait_for_replay()
 
-    def receiveMsg_PowerReport(self, message: PowerReport, _: ActorAddress):
+    def save(self, report: Report):
         """
-        When receiving a PowerReport save it to database
+        save one report to the database right away, only used without buffer and writer thread
+        """
+        self._write(self.database.save, report, 1)
+        self._wait_for_replay()
+
+    def hold(self, reports: List[Report], pending_ack: PendingAck):
+        """
+        register that the message of the given pending ack waits for its reports to be saved to this output
+        a message sent to several outputs holds its reports for all of them before any of them is saved, so that it is
+        not acknowledged too early
+        """
+        hold_pending_acks([pending_ack] * (1 if self.report_batcher is None else len(reports)))
+
+    def push(self, reports: List[Report], pending_ack: PendingAck) -> List[ActorAddress]:
+        """
+        save reports, or add them to the buffer and save the buffered reports if the buffer is full
+        the reports must be held with the given pending ack (see hold), it is released once they are saved
+
+        :return: address of the upstream actors whose message is now acknowledged
+        """
+        if self.report_batcher is None:
+            return self._save_reports(reports, [pending_ack])
+        upstreams = []
+        for report in reports:
+            batch = self.report_batcher.add(DATABASE_BUFFER, (report, pending_ack))
+            if batch is not None:
+                upstreams += self._save_reports([report for report, _ in batch], [pending_ack for _, pending_ack in batch])
+        self._wait_for_linger_time()
+        return upstreams
+
+    def _save_reports(self, reports: List[Report], pending_acks: List[PendingAck]) -> List[ActorAddress]:
+        """
+        save reports with one save_many call, or submit them to the writer thread
+        the given pending acks, that already hold the reports, are released once the reports are saved
+
+        :return: address of the upstream actors whose message is now acknowledged
+        """
+        if self.writer is None:
+            self._write(self.database.save_many, reports, len(reports))
+            self._wait_for_replay()
+            return release_pending_acks(pending_acks)
+        write = partial(self._write, self.database.save_many, reports, len(reports))
+        if self.spill_queue is None:
+            self.writer.submit(write, pending_acks)
+        elif not self.writer.try_submit(write, pending_acks):
+            # the writer thread spills the reports once the writes submitted before them are done or spilled
+            self.writer.submit(partial(self._spill, reports), pending_acks)
+        self._wait_for_writes()
+        return []
+
+    def flush(self, expired_only: bool = False) -> List[ActorAddress]:
+        """
+        save the buffered reports
+
+        :param expired_only: if True, only save the buffer if its oldest report waited for the linger time
+        :return: address of the upstream actors whose message is now acknowledged
+        """
+        if self.report_batcher is None:
+            return []
+        batches = self.report_batcher.pop_expired() if expired_only else self.report_batcher.pop_all()
+        upstreams = []
+        for _, batch in batches:
+            upstreams += self._save_reports([report for report, _ in batch], [pending_ack for _, pending_ack in batch])
+        return upstreams
+
+    def _collect_writes(self) -> List[ActorAddress]:
+        """
+        :return: address of the upstream actors whose message is acknowledged by the writes done by the writer thread
+        """
+        upstreams = []
+        for pending_acks in self.writer.pop_completed():
+            # replays submitted to the writer thread have no pending ack
+            if pending_acks is not None:
+                upstreams += release_pending_acks(pending_acks)
+        self._wait_for_replay()
+        return upstreams
+
+    def close(self) -> List[ActorAddress]:
+        """
+        save the buffered reports, wait for the writer thread to save the submitted reports then stop it
+
+        :return: address of the upstream actors whose message is now acknowledged
+        """
+        upstreams = self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            upstreams += self._collect_writes()
+        return upstreams
+
+    def on_wakeup(self, wakeup: str) -> List[ActorAddress]:
+        """
+        When woken up :
+            - save the buffered reports that waited for more than the linger time
+            - or collect the writes done by the writer thread
+            - or save spilled reports back to the database
+
+        :param wakeup: kind of the wakeup, the payload of the WakeupMessage without the output name
+        :return: address of the upstream actors whose message is now acknowledged
+        """
+        if wakeup == SPILL_WAKEUP:
+            self._spill_wakeup_pending = False
+            self._replay_pending = True
+            if self.writer is None:
+                self._replay_spilled_reports()
+                self._wait_for_replay()
+            else:
+                # the replay is run after the writes already submitted, once they spilled their reports behind the
+                # reports it reads
+                self.writer.submit(self._replay_spilled_reports)
+                self._wait_for_writes()
+            return []
+        if wakeup == WRITE_WAKEUP:
+            self._write_wakeup_pending = False
+            upstreams = self._collect_writes()
+            self._wait_for_writes()
+            return upstreams
+        self._linger_wakeup_pending = False
+        upstreams = self.flush(expired_only=True)
+        self._wait_for_linger_time()
+        return upstreams
+
+    def _wait_for_linger_time(self):
+        """
+        ask to be woken up after the linger time to save the buffered reports
+        """
+        if self.report_batcher is None or self.report_batcher.is_empty() or self._linger_wakeup_pending:
+            return
+        self._linger_wakeup_pending = True
+        self.actor.wakeupAfter(timedelta(seconds=self.report_batcher.linger_time), self._wakeup_payload(LINGER_WAKEUP))
+
+    def _wait_for_writes(self):
+        """
+        ask to be woken up to collect the writes done by the writer thread
+        """
+        if self.writer.pending_count == 0 or self._write_wakeup_pending:
+            return
+        self._write_wakeup_pending = True
+        self.actor.wakeupAfter(timedelta(seconds=WRITE_POLL_PERIOD), self._wakeup_payload(WRITE_WAKEUP))
+
+    def _wait_for_replay(self):
+        """
+        ask to be woken up to save the spilled reports back to the database
+        """
+        if self.spill_queue is None or self.spill_queue.is_empty() or self._spill_wakeup_pending or self._replay_pending:
+            return
+        self._spill_wakeup_pending = True
+        self.actor.wakeupAfter(timedelta(seconds=self._replay_delay), self._wakeup_payload(SPILL_WAKEUP))
+
+    def _spill(self, reports: List[Report]):
+        """
+        append reports to the spill queue, they are acknowledged as if they were saved
+        with asynchronous writes, this method is called from the writer thread
         """
-        self.log_debug('received message ' + str(message))
         try:
-            self.database.save(message)
-            self.log_debug(str(message) + 'saved to database')
+            self.spill_queue.append(reports)
+        except OSError as exn:
+            self.actor.log_error(self._describe('can\'t spill ' + str(len(reports)) + ' reports, they are lost : ' + str(exn)))
+            return
+        self.spilled_report_count += len(reports)
+
+    def _replay_spilled_reports(self):
+        """
+        save the oldest spilled reports to the database with one call
+        after a failure, the time before the next replay is doubled, up to the max spill retry period
+        with asynchronous writes, this method is called from the writer thread
+        """
+        try:
+            reports, batch_count = self.spill_queue.peek(REPLAY_BATCH_SIZE)
+            start_time = time.monotonic()
+            try:
+                self.database.save_many(reports)
+            except BadInputData as exn:
+                self.actor.log_warning(self._describe('drop ' + str(len(reports)) + ' spilled reports rejected by the database : ' +
+                                                      exn.msg))
+            except PowerAPIException as exn:
+                self.spill_retry_delay = min(self.spill_retry_delay * 2, self.max_spill_retry_period)
+                self._replay_delay = self.spill_retry_delay
+                self.actor.log_warning(self._describe('can\'t save spilled reports (' + str(exn) + '), next try in ' +
+                                                      str(self._replay_delay) + 's'))
+                return
+            else:
+                self.replayed_report_count += len(reports)
+                self.total_replay_time += time.monotonic() - start_time
+            self.spill_queue.commit(batch_count)
+            self.spill_retry_delay = self.spill_retry_period
+            # the database is up, the remaining spilled reports are replayed right away
+            self._replay_delay = 0
+        finally:
+            self._replay_pending = False
+
+    def _write(self, save_function, data, report_count: int):
+        """
+        save data with the given database function and update the write statistics
+        data that the database failed to save is spilled, if a spill queue is used
+        with asynchronous writes, this method is called from the writer thread
+        """
+        if self.spill_queue is not None and not self.spill_queue.is_empty():
+            # the database failed recently, the data waits behind the spilled reports
+            self._spill(data if isinstance(data, list) else [data])
+            return
+        start_time = time.monotonic()
+        if self._save(save_function, data):
+            self.written_report_count += report_count
+        else:
+            self.write_error_count += 1
+            if self.spill_queue is not None:
+                self._spill(data if isinstance(data, list) else [data])
+        self.total_write_time += time.monotonic() - start_time
+        self.write_count += 1
+
+    def _save(self, save_function, data) -> bool:
+        """
+        save data with the given database function and log the errors that occurred
+
+        :return: False if the database failed to save the data, True if it was saved or rejected as bad input data
+        """
+        try:
+            save_function(data)
+            self.actor.log_debug(self._describe(str(data) + 'saved to database'))
+            return True
         except BadInputData as exn:
             log_line = 'BadinputData exception raised for report' + str(exn.input_data)
             log_line += ' with message : ' + exn.msg
-            self.log_warning(log_line)
+            self.actor.log_warning(self._describe(log_line))
+            return True
         except PowerAPIExceptionWithMessage as exn:
-            log_line = 'exception ' + str(exn) + 'was raised while trying to save ' + str(message)
+            log_line = 'exception ' + str(exn) + 'was raised while trying to save ' + str(data)
             log_line += 'with message : ' + str(exn.msg)
-            self.log_warning(log_line)
+            self.actor.log_warning(self._describe(log_line))
         except PowerAPIException as exn:
-            self.log_warning('exception ' + str(exn) + 'was raised while trying to save ' + str(message))
+            self.actor.log_warning(self._describe('exception ' + str(exn) + 'was raised while trying to save ' + str(data)))
+        return False
+
+    @staticmethod
+    def gen_stats_message(sender_name: str, outputs: List['PusherOutput']) -> PusherStatsMessage:
+        """
+        :return: the write statistics of the given outputs, summed over all of them
+        """
+        queue_depth = sum(output.writer.queue_depth for output in outputs if output.writer is not None)
+        write_count = sum(output.write_count for output in outputs)
+        total_write_time = sum(output.total_write_time for output in outputs)
+        mean_write_latency = 0.0 if write_count == 0 else total_write_time / write_count
+        spill_size = sum(output.spill_queue.size for output in outputs if output.spill_queue is not None)
+        replayed_report_count = sum(output.replayed_report_count for output in outputs)
+        total_replay_time = sum(output.total_replay_time for output in outputs)
+        replay_rate = 0.0 if total_replay_time == 0 else replayed_report_count / total_replay_time
+        return PusherStatsMessage(sender_name, queue_depth, write_count, sum(output.written_report_count for output in outputs),
+                                  sum(output.write_error_count for output in outputs), mean_write_latency,
+                                  sum(output.spilled_report_count for output in outputs), spill_size, replayed_report_count,
+                                  replay_rate)
+
+
+class PusherActor(Actor):
+    """
+    PusherActor class
+
+    The Pusher allow to save Report sent by Formula.
+
+    Reports are saved to the database through a PusherOutput, that buffers them, saves them from a writer thread or
+    spills them to disk depending on the start message. A report is acknowledged once it is saved.
+    """
+
+    def __init__(self):
+        Actor.__init__(self, PusherStartMessage)
+        self.output: PusherOutput = None
+
+    def _initialization(self, start_message: PusherStartMessage):
+        Actor._initialization(self, start_message)
+        self.output = PusherOutput(self, start_message)
+        self.output.start()
+
+    def receiveMsg_PowerReport(self, message: PowerReport, sender: ActorAddress):
+        """
+        When receiving a PowerReport save it to database, or buffer it if batching is enabled
+        """
+        self.log_debug('received message ' + str(message))
+        if self.output.report_batcher is None and self.output.writer is None:
+            self.output.save(message)
+            self._acknowledge([sender])
+            return
+        self._push([message], sender)
+
+    def receiveMsg_ReportBatch(self, message: ReportBatch, sender: ActorAddress):
+        """
+        When receiving a ReportBatch save all its reports to database at once, or buffer them if batching is enabled
+        """
+        self.log_debug('received message ' + str(message))
+        self._push(message.reports, sender)
+
+    def _push(self, reports: List[Report], sender: ActorAddress):
+        """
+        save reports, or add them to the buffer and save the buffered reports if the buffer is full
+        the message that contained the reports is acknowledged once all of them are saved
+        """
+        if not reports:
+            self._acknowledge([sender])
+            return
+        pending_ack = PendingAck(sender)
+        self.output.hold(reports, pending_ack)
+        self._acknowledge(self.output.push(reports, pending_ack))
+
+    def receiveMsg_WakeupMessage(self, message: WakeupMessage, __: ActorAddress):
+        """
+        When receiving a WakeupMessage, save the buffered reports, acknowledge the reports saved by the writer thread or
+        save spilled reports back to the database, depending on the payload
+        """
+        self._acknowledge(self.output.on_wakeup(message.payload))
+
+    def receiveMsg_GetPusherStatsMessage(self, message: GetPusherStatsMessage, sender: ActorAddress):
+        """
+        When receiving a GetPusherStatsMessage, answer with the write statistics of the pusher
+        """
+        self.log_debug('received message ' + str(message))
+        self.send(sender, PusherOutput.gen_stats_message(self.name, [self.output]))
 
     def receiveMsg_EndMessage(self, message: EndMessage, _: ActorAddress):
         """
         When receiving an EndMessage notify the ActorSystem and Kill itself
         """
         self.log_debug('received message ' + str(message))
+        self._acknowledge(self.output.close())
         self.send(self.parent, EndMessage(self.name))
         self.send(self.myAddress, ActorExitRequest())
+
+    def receiveMsg_ActorExitRequest(self, message: ActorExitRequest, sender: ActorAddress):
+        """
+        When receiving ActorExitRequest, save the buffered reports before exiting
+        """
+        # the output is not created if the pusher is stopped because of a wrong start message
+        if self.output is not None:
+            self._acknowledge(self.output.close())
+        Actor.receiveMsg_ActorExitRequest(self, message, sender)
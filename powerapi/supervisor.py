@@ -37,6 +37,7 @@ from powerapi.message import OKMessage, ErrorMessage, StartMessage, EndMessage
 from powerapi.actor import InitializationException, Actor
 from powerapi.exception import PowerAPIExceptionWithMessage
 from powerapi.pusher import PusherActor
+from powerapi.fan_out_pusher import FanOutPusherActor
 from powerapi.puller import PullerActor
 from powerapi.dispatcher import DispatcherActor
 
@@ -136,7 +137,7 @@ class Supervisor:
         raise InitializationException("Unknow message type : " + str(type(answer)))
 
     def _add_actor(self, address, name, actor_cls):
-        if issubclass(actor_cls, PusherActor):
+        if issubclass(actor_cls, (PusherActor, FanOutPusherActor)):
             self.pushers[name] = address
         elif issubclass(actor_cls, PullerActor):
             self.pullers[name] = address
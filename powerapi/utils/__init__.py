@@ -29,5 +29,11 @@
 
 from powerapi.utils.utils import timestamp_to_datetime, datetime_to_timestamp, dict_merge
 from powerapi.utils.tree import Tree
+from powerapi.utils.prefix_index import PrefixIndex
 from powerapi.utils.stat_buffer import StatBuffer
+from powerapi.utils.report_batcher import ReportBatcher
+from powerapi.utils.async_writer import AsyncWriter
+from powerapi.utils.spill_queue import SpillQueue
+from powerapi.utils.window_aggregator import TumblingWindowAggregator, AggregationWindow
+from powerapi.utils.flow_control import CreditWindow, AckTracker, PendingAck, hold_pending_acks, release_pending_acks
 from .json_stream import JsonStream
@@ -0,0 +1,150 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import logging
+from collections import deque
+from queue import Queue, Full
+from threading import Thread
+from typing import Any, Callable, List
+
+#: item put in the queue to stop the writer thread
+_STOP = object()
+
+
+class AsyncWriter:
+    """
+    Run writes on a background thread so that the actor submitting them does not wait for them
+
+    Writes wait in a bounded queue and are run in the order they were submitted. Submitting a write never blocks : while
+    the queue is full, writes wait in a backlog and are moved to the queue each time the actor collects the done writes.
+    Once a write is done, the token given with it can be collected by the actor with pop_completed, from its own thread,
+    so an actor that acknowledges its messages with these tokens slows its senders down when the writes lag behind
+    """
+
+    def __init__(self, write_function: Callable[[Any], None], max_queue_size: int):
+        """
+        :param write_function: function called on the background thread with the data of each write
+        :param max_queue_size: maximum number of writes waiting in the queue, the following writes wait in the backlog.
+                               0 for no limit
+        """
+        self.write_function = write_function
+        self.queue = Queue(max_queue_size)
+        #: (deque): writes submitted while the queue was full, only used by the submitting thread
+        self.backlog = deque()
+        self.completed = deque()
+        self.thread = None
+        #: (int): number of writes submitted whose token was not collected yet
+        self.pending_count = 0
+
+    def start(self):
+        """
+        start the background thread
+        """
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            data, token = item
+            try:
+                self.write_function(data)
+            except Exception:  # pylint: disable=broad-except
+                # the thread must keep running, otherwise the following writes would never be done
+                logging.exception('unexpected error while writing ' + str(data))
+            self.completed.append(token)
+
+    def submit(self, data: Any, token: Any = None):
+        """
+        add a write to the queue, or to the backlog if the queue is full
+
+        :param data: data given to the write function
+        :param token: value returned by pop_completed once the write is done
+        """
+        self.pending_count += 1
+        self.backlog.append((data, token))
+        self._fill_queue()
+
+    def _fill_queue(self):
+        """
+        move the oldest writes of the backlog to the queue while it is not full
+        """
+        while self.backlog:
+            try:
+                self.queue.put_nowait(self.backlog[0])
+            except Full:
+                return
+            self.backlog.popleft()
+
+    def try_submit(self, data: Any, token: Any = None) -> bool:
+        """
+        add a write to the queue if it is not full and no write waits in the backlog
+
+        :return: False if the queue is full, the write is then not submitted
+        """
+        if self.backlog:
+            return False
+        self.pending_count += 1
+        try:
+            self.queue.put_nowait((data, token))
+        except Full:
+            self.pending_count -= 1
+            return False
+        return True
+
+    def pop_completed(self) -> List:
+        """
+        :return: the tokens of the writes done since the last call, in the order they were submitted
+        """
+        tokens = []
+        while self.completed:
+            tokens.append(self.completed.popleft())
+        self.pending_count -= len(tokens)
+        self._fill_queue()
+        return tokens
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        number of writes waiting to be run, in the queue or in the backlog
+        """
+        return self.queue.qsize() + len(self.backlog)
+
+    def close(self):
+        """
+        run the writes still in the queue then stop the background thread
+        """
+        if self.thread is None:
+            return
+        while self.backlog:
+            self.queue.put(self.backlog.popleft())
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
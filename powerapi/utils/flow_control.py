@@ -0,0 +1,152 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import deque
+from typing import Hashable, List
+
+
+class CreditWindow:
+    """
+    Count, for each destination, the messages that were sent but not acknowledged yet
+
+    A destination has credit while less than `credits` messages sent to it are waiting for their acknowledgment
+    """
+
+    def __init__(self, credits: int):
+        """
+        :param credits: maximum number of messages waiting for their acknowledgment for one destination
+        """
+        self.credits = credits
+        self.in_flight = {}
+
+    def has_credit(self, key: Hashable) -> bool:
+        """
+        :return: True if a message can be sent to the given destination
+        """
+        return self.in_flight.get(key, 0) < self.credits
+
+    def is_exhausted(self) -> bool:
+        """
+        :return: True if a destination has no credit left
+        """
+        return any(count >= self.credits for count in self.in_flight.values())
+
+    def consume(self, key: Hashable):
+        """
+        use a credit to send a message to the given destination
+        """
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def release(self, key: Hashable, count: int):
+        """
+        give back the credits of the messages acknowledged by the given destination
+        """
+        self.in_flight[key] = max(0, self.in_flight.get(key, 0) - count)
+
+
+class PendingAck:
+    """
+    A message received from an upstream actor that waits for the acknowledgment of the messages it produced
+    """
+    __slots__ = ('upstream', 'remaining')
+
+    def __init__(self, upstream):
+        """
+        :param upstream: address of the actor that sent the message
+        """
+        self.upstream = upstream
+        self.remaining = 0
+
+
+def hold_pending_acks(pending_acks: List[PendingAck]):
+    """
+    register that each given upstream message produced one more message that must be acknowledged
+    """
+    for pending_ack in pending_acks:
+        pending_ack.remaining += 1
+
+
+def release_pending_acks(pending_acks: List[PendingAck]) -> List:
+    """
+    register that one of the messages produced by each given upstream message will never be acknowledged, because it
+    was processed or discarded
+
+    :return: address of the upstream actors whose message is now acknowledged, once per message
+    """
+    upstreams = []
+    for pending_ack in pending_acks:
+        pending_ack.remaining -= 1
+        if pending_ack.remaining == 0:
+            upstreams.append(pending_ack.upstream)
+    return upstreams
+
+
+class AckTracker:
+    """
+    Link the messages sent to downstream actors with the upstream messages that produced them
+
+    An upstream message is acknowledged once all the downstream messages it produced are acknowledged. Downstream actors
+    acknowledge messages in the order they received them
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def sent(self, key: Hashable, pending_acks: List[PendingAck], held: bool = False):
+        """
+        register a message sent to the given downstream actor
+
+        :param pending_acks: upstream messages that produced the sent message, can be empty
+        :param held: True if the upstream messages already count the sent message (see hold_pending_acks)
+        """
+        if not held:
+            hold_pending_acks(pending_acks)
+        self.pending.setdefault(key, deque()).append(pending_acks)
+
+    def acknowledged(self, key: Hashable, count: int) -> List:
+        """
+        register the acknowledgment of the `count` oldest messages sent to the given downstream actor
+
+        :return: address of the upstream actors whose message is now acknowledged, once per message
+        """
+        messages = self.pending.get(key, deque())
+        upstreams = []
+        for _ in range(min(count, len(messages))):
+            upstreams += release_pending_acks(messages.popleft())
+        return upstreams
+
+    def forget(self, key: Hashable) -> List:
+        """
+        consider all the messages sent to the given downstream actor as acknowledged, used when this actor is dead
+
+        :return: address of the upstream actors whose message is now acknowledged, once per message
+        """
+        upstreams = self.acknowledged(key, len(self.pending.get(key, ())))
+        self.pending.pop(key, None)
+        return upstreams
@@ -0,0 +1,121 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from typing import Any, Hashable, List, Sequence
+
+
+class _PrefixNode:
+    """
+    Node of a PrefixIndex, its children are indexed by their label
+    """
+    __slots__ = ('children', 'value', 'has_value', 'insertion_rank')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+        self.has_value = False
+        self.insertion_rank = None
+
+
+class PrefixIndex:
+    """
+    Index that store values by path (sequence of labels) and retrieve all the values whose path starts with a prefix
+
+    Adding or removing a value costs O(len(path)). Retrieving values visits only the nodes that lead to a retrieved
+    value because nodes without value under them are removed, then sorts the k retrieved values in O(k log k)
+    """
+
+    def __init__(self):
+        self.root = _PrefixNode()
+        self.size = 0
+        self._insertion_count = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, path: Sequence[Hashable], value: Any):
+        """
+        store a value at the given path, replace the value already stored at this path without changing its rank in
+        the insertion order
+        """
+        node = self.root
+        for label in path:
+            child = node.children.get(label)
+            if child is None:
+                child = _PrefixNode()
+                node.children[label] = child
+            node = child
+        if not node.has_value:
+            self.size += 1
+            node.insertion_rank = self._insertion_count
+            self._insertion_count += 1
+        node.value = value
+        node.has_value = True
+
+    def remove(self, path: Sequence[Hashable]):
+        """
+        remove the value stored at the given path and the nodes that no longer lead to a value
+
+        :raise KeyError: if no value is stored at this path
+        """
+        nodes = [self.root]
+        for label in path:
+            nodes.append(nodes[-1].children[label])
+        if not nodes[-1].has_value:
+            raise KeyError(path)
+
+        nodes[-1].value = None
+        nodes[-1].has_value = False
+        nodes[-1].insertion_rank = None
+        self.size -= 1
+        for depth in range(len(path), 0, -1):
+            node = nodes[depth]
+            if node.has_value or node.children:
+                break
+            del nodes[depth - 1].children[path[depth - 1]]
+
+    def get(self, prefix: Sequence[Hashable]) -> List:
+        """
+        :return: all the values whose path starts with the given prefix, in insertion order
+        """
+        node = self.root
+        for label in prefix:
+            node = node.children.get(label)
+            if node is None:
+                return []
+
+        ranked_values = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.has_value:
+                ranked_values.append((node.insertion_rank, node.value))
+            stack.extend(node.children.values())
+        ranked_values.sort(key=lambda ranked_value: ranked_value[0])
+        return [value for _, value in ranked_values]
@@ -0,0 +1,100 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time
+from typing import Hashable, List, Tuple
+
+
+class ReportBatcher:
+    """
+    Buffer that group reports by destination into batches
+
+    A batch is released when it contains batch_size reports or when its first report waited for more than linger_time
+    seconds
+    """
+
+    def __init__(self, batch_size: int, linger_time: float):
+        """
+        :param batch_size: maximum number of reports in a batch
+        :param linger_time: maximum time (in seconds) a report can wait in a batch
+        """
+        self.batch_size = batch_size
+        self.linger_time = linger_time
+        self.batches = {}
+
+    def add(self, key: Hashable, report) -> List:
+        """
+        add a report to the batch of the given destination
+
+        :return: the batch if it is full (it is then removed from the buffer), None otherwise
+        """
+        if key not in self.batches:
+            self.batches[key] = (time.monotonic(), [])
+        _, reports = self.batches[key]
+        reports.append(report)
+        if len(reports) >= self.batch_size:
+            del self.batches[key]
+            return reports
+        return None
+
+    def pop_expired(self) -> List[Tuple[Hashable, List]]:
+        """
+        remove from the buffer and return the batches whose first report waited for more than linger_time seconds
+
+        :return: list of tuple (destination key, batch)
+        """
+        deadline = time.monotonic() - self.linger_time
+        expired = [key for key, (creation_time, _) in self.batches.items() if creation_time <= deadline]
+        return [(key, self.batches.pop(key)[1]) for key in expired]
+
+    def pop(self, key: Hashable) -> List:
+        """
+        remove from the buffer and return the batch of the given destination
+
+        :return: the batch, None if no report wait for this destination
+        """
+        if key not in self.batches:
+            return None
+        return self.batches.pop(key)[1]
+
+    def pop_all(self) -> List[Tuple[Hashable, List]]:
+        """
+        remove all the batches from the buffer and return them
+
+        :return: list of tuple (destination key, batch)
+        """
+        batches = [(key, reports) for key, (_, reports) in self.batches.items()]
+        self.batches = {}
+        return batches
+
+    def is_empty(self) -> bool:
+        """
+        :return: True if no report wait in the buffer
+        """
+        return not self.batches
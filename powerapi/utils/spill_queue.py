@@ -0,0 +1,187 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import pickle
+import struct
+from collections import deque
+from threading import Lock
+from typing import List, Tuple
+
+#: header of a record : size of the pickled batch and number of reports in the batch
+_RECORD_HEADER = struct.Struct('>II')
+_SEGMENT_SUFFIX = '.spill'
+#: name of the file storing the position of the oldest batch not committed yet
+_HEAD_FILE_NAME = 'head'
+
+
+class SpillQueue:
+    """
+    Durable queue of report batches stored in append-only segment files of a local directory
+
+    Batches are appended to the newest segment and read back from the oldest one, in the order they were appended. A
+    segment file is deleted once all its batches are committed. Batches left in the directory by a previous process are
+    read first, the position of the oldest batch not committed yet is stored in a head file. The queue can be used
+    from several threads
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024):
+        """
+        :param directory: directory where the segment files are stored, created if it does not exist
+        :param segment_size: size (in bytes) above which a new segment file is started
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+        #: (deque): (segment index, offset, size, report count) of each record not committed yet, from the oldest
+        self._records = deque()
+        self._segments = sorted(int(file_name[:-len(_SEGMENT_SUFFIX)]) for file_name in os.listdir(directory)
+                                if file_name.endswith(_SEGMENT_SUFFIX))
+        head = self._read_head()
+        for index in self._segments:
+            self._records += [record for record in self._scan(index) if record[:2] >= head]
+        #: (int): index of the segment batches are appended to, segments of a previous process are never appended to
+        self._write_index = self._segments[-1] + 1 if self._segments else 0
+        self._write_offset = 0
+        #: (int): number of bytes of the records not committed yet
+        self.size = sum(_RECORD_HEADER.size + size for _, _, size, _ in self._records)
+        #: (int): number of reports not committed yet
+        self.report_count = sum(report_count for _, _, _, report_count in self._records)
+        # segments without any complete record are removed
+        for index in set(self._segments) - {index for index, _, _, _ in self._records}:
+            os.remove(self._get_path(index))
+
+    def _read_head(self) -> Tuple[int, int]:
+        """
+        :return: segment index and offset of the oldest batch not committed by a previous process
+        """
+        try:
+            with open(os.path.join(self.directory, _HEAD_FILE_NAME), 'r', encoding='utf-8') as head_file:
+                index, offset = head_file.read().split()
+                return int(index), int(offset)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _write_head(self):
+        """
+        store the position of the oldest batch not committed yet, in a temporary file first so that a crash doesn't
+        leave a truncated head file
+        """
+        index, offset = self._records[0][:2] if self._records else (self._write_index, self._write_offset)
+        head_path = os.path.join(self.directory, _HEAD_FILE_NAME)
+        with open(head_path + '.tmp', 'w', encoding='utf-8') as head_file:
+            head_file.write(str(index) + ' ' + str(offset))
+        os.replace(head_path + '.tmp', head_path)
+
+    def _get_path(self, index: int) -> str:
+        return os.path.join(self.directory, '%012d' % index + _SEGMENT_SUFFIX)
+
+    def _scan(self, index: int) -> List[Tuple[int, int, int, int]]:
+        """
+        :return: the records of a segment, a record truncated by a crash is ignored
+        """
+        records = []
+        offset = 0
+        with open(self._get_path(index), 'rb') as segment:
+            while True:
+                header = segment.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return records
+                size, report_count = _RECORD_HEADER.unpack(header)
+                if len(segment.read(size)) < size:
+                    return records
+                records.append((index, offset, size, report_count))
+                offset += _RECORD_HEADER.size + size
+
+    def append(self, reports: List):
+        """
+        append a batch of reports to the queue, the batch is on disk when the method returns
+        """
+        payload = pickle.dumps(reports, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._write_offset >= self.segment_size:
+                # the full segment is deleted now if all its batches were already committed
+                if not self._records or self._records[-1][0] != self._write_index:
+                    os.remove(self._get_path(self._write_index))
+                self._write_index += 1
+                self._write_offset = 0
+            with open(self._get_path(self._write_index), 'ab') as segment:
+                segment.write(_RECORD_HEADER.pack(len(payload), len(reports)) + payload)
+                segment.flush()
+                os.fsync(segment.fileno())
+            self._records.append((self._write_index, self._write_offset, len(payload), len(reports)))
+            self._write_offset += _RECORD_HEADER.size + len(payload)
+            self.size += _RECORD_HEADER.size + len(payload)
+            self.report_count += len(reports)
+
+    def peek(self, max_reports: int) -> Tuple[List, int]:
+        """
+        read the oldest batches of the queue without removing them, at least one batch is read if the queue is not
+        empty
+
+        :param max_reports: maximum number of reports to read, unless the oldest batch is bigger
+        :return: the reports of the read batches and the number of read batches, to give to commit once the reports
+                 are processed
+        """
+        with self._lock:
+            records = []
+            report_total = 0
+            for record in self._records:
+                if records and report_total + record[3] > max_reports:
+                    break
+                records.append(record)
+                report_total += record[3]
+
+        reports = []
+        for index, offset, size, _ in records:
+            with open(self._get_path(index), 'rb') as segment:
+                segment.seek(offset + _RECORD_HEADER.size)
+                reports += pickle.loads(segment.read(size))
+        return reports, len(records)
+
+    def commit(self, batch_count: int):
+        """
+        remove the given number of batches from the head of the queue, the segment files whose batches are all removed
+        are deleted
+        """
+        with self._lock:
+            for _ in range(min(batch_count, len(self._records))):
+                index, _, size, report_count = self._records.popleft()
+                self.size -= _RECORD_HEADER.size + size
+                self.report_count -= report_count
+                next_index = self._records[0][0] if self._records else None
+                if next_index != index and index != self._write_index:
+                    os.remove(self._get_path(index))
+            self._write_head()
+
+    def is_empty(self) -> bool:
+        """
+        :return: True if no batch waits in the queue
+        """
+        return not self._records
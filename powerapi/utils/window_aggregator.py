@@ -0,0 +1,170 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from typing import Hashable, List, Tuple
+
+
+class AggregationWindow:
+    """
+    Statistics of the values received during one tumbling window
+
+    The energy is the integral of the values over the window, each value being held until the next one, the last one
+    until the end of the window
+    """
+    __slots__ = ('start', 'end', 'count', 'total', 'min', 'max', 'energy', 'last_time', 'last_value')
+
+    def __init__(self, start: float, end: float):
+        """
+        :param start: timestamp (in seconds) of the beginning of the window
+        :param end: timestamp (in seconds) of the end of the window
+        """
+        self.start = start
+        self.end = end
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.energy = 0.0
+        self.last_time = None
+        self.last_value = None
+
+    def add(self, timestamp: float, value: float):
+        """
+        add a value received at the given timestamp, values must be added in the order of their timestamp
+        """
+        if self.last_time is not None:
+            self.energy += self.last_value * (timestamp - self.last_time)
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last_time = timestamp
+        self.last_value = value
+
+    def close(self):
+        """
+        hold the last value until the end of the window
+        """
+        self.energy += self.last_value * (self.end - self.last_time)
+        self.last_time = self.end
+
+    @property
+    def mean(self) -> float:
+        """
+        mean of the values received during the window
+        """
+        return self.total / self.count
+
+
+class TumblingWindowAggregator:
+    """
+    Aggregate timeseries values by key over tumbling windows of a fixed length, aligned on the epoch
+
+    The window of a key is closed when a value of a later window is received for this key. Each key belongs to a stream
+    (e.g. the sensor that produced its values) that has its own watermark, the timestamp of the newest value received
+    from this stream. The windows of the keys that stopped receiving values are closed once the watermark of their
+    stream is one window length past their end. Values of an already closed window are late, they are dropped. As each
+    stream has its own watermark, a stream lagging behind the others doesn't get its values dropped
+    """
+
+    def __init__(self, window_length: float):
+        """
+        :param window_length: length (in seconds) of a window
+        """
+        self.window_length = window_length
+        self.windows = {}
+        #: (dict): timestamp of the newest value received from each stream
+        self.watermarks = {}
+        #: (int): number of values dropped because their window was already closed
+        self.late_count = 0
+        self._streams = {}
+
+    def add(self, key: Hashable, timestamp: float, value: float, stream: Hashable = None) -> List[Tuple[Hashable, AggregationWindow]]:
+        """
+        add a value to the window of the given key that contains the given timestamp (in seconds)
+
+        :param stream: stream the key belongs to, a key must always be added with the same stream
+        :return: list of tuple (key, window) of the windows closed by the new value
+        """
+        closed = []
+        start = timestamp - timestamp % self.window_length
+        window = self.windows.get(key)
+        if window is not None and start > window.start:
+            closed.append((key, self._close(key)))
+            window = None
+
+        watermark = self.watermarks.get(stream)
+        if (window is not None and start < window.start) or \
+                (watermark is not None and start + self.window_length <= watermark - self.window_length):
+            self.late_count += 1
+            return closed
+
+        if window is None:
+            window = AggregationWindow(start, start + self.window_length)
+            self.windows[key] = window
+            self._streams[key] = stream
+        window.add(timestamp, value)
+
+        self.watermarks[stream] = timestamp if watermark is None else max(watermark, timestamp)
+        if watermark is not None and self.watermarks[stream] // self.window_length > watermark // self.window_length:
+            closed += self.pop_expired(stream)
+        return closed
+
+    def _close(self, key: Hashable) -> AggregationWindow:
+        window = self.windows.pop(key)
+        del self._streams[key]
+        window.close()
+        return window
+
+    def pop_expired(self, stream: Hashable = None) -> List[Tuple[Hashable, AggregationWindow]]:
+        """
+        close and return the windows of the given stream that ended at least one window length before the newest value
+        received from this stream
+
+        :return: list of tuple (key, window)
+        """
+        if stream not in self.watermarks:
+            return []
+        deadline = self.watermarks[stream] - self.window_length
+        expired = [key for key, window in self.windows.items() if self._streams[key] == stream and window.end <= deadline]
+        return [(key, self._close(key)) for key in expired]
+
+    def pop_all(self) -> List[Tuple[Hashable, AggregationWindow]]:
+        """
+        close and return all the windows
+
+        :return: list of tuple (key, window)
+        """
+        return [(key, self._close(key)) for key in list(self.windows)]
+
+    def is_empty(self) -> bool:
+        """
+        :return: True if no window is open
+        """
+        return not self.windows
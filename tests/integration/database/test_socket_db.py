@@ -27,6 +27,7 @@ import json
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import time
 from datetime import datetime
 from socket import socket
 from threading import Thread
@@ -34,7 +35,7 @@ from threading import Thread
 import pytest
 import pytest_asyncio
 
-from powerapi.database import SocketDB
+from powerapi.database import SocketDB, ThreadedSocketDB, DBError
 from powerapi.report import HWPCReport
 from powerapi.test_utils.report.hwpc import extract_rapl_reports_with_2_sockets
 
@@ -98,3 +99,107 @@ async def test_read_two_json_object_received_from_the_socket(socket_db, unused_t
 
     report = await iterator.__anext__()
     assert_report_equals(report, json_reports[1])
+
+
+@pytest.fixture
+def threaded_socket_db(unused_tcp_port):
+    socket_db = ThreadedSocketDB(HWPCReport, unused_tcp_port)
+    socket_db.connect()
+    yield socket_db
+    socket_db.close()
+
+
+def pull_reports(iterator, report_number, timeout=2):
+    """
+    pull report_number reports from a non blocking iterator, retrying while the timeout is not reached
+    """
+    reports = []
+    deadline = time.monotonic() + timeout
+    while len(reports) < report_number and time.monotonic() < deadline:
+        try:
+            reports.append(next(iterator))
+        except StopIteration:
+            time.sleep(0.01)
+    return reports
+
+
+def test_iterate_on_threaded_socket_db_without_received_report_raise_StopIteration_without_blocking(threaded_socket_db):
+    iterator = threaded_socket_db.iter(True)
+
+    begin = time.monotonic()
+    with pytest.raises(StopIteration):
+        next(iterator)
+    assert time.monotonic() - begin < 0.5
+
+
+def test_read_two_json_object_received_from_the_socket_with_threaded_socket_db(threaded_socket_db, unused_tcp_port):
+    json_reports = extract_rapl_reports_with_2_sockets(2)
+    client = ClientThread(json_reports, unused_tcp_port)
+    client.start()
+
+    reports = pull_reports(threaded_socket_db.iter(True), 2)
+
+    assert len(reports) == 2
+    assert_report_equals(reports[0], json_reports[0])
+    assert_report_equals(reports[1], json_reports[1])
+
+
+def test_reports_are_received_by_threaded_socket_db_without_pulling_them(threaded_socket_db, unused_tcp_port):
+    json_reports = extract_rapl_reports_with_2_sockets(2)
+    client = ClientThread(json_reports, unused_tcp_port)
+    client.start()
+    client.join()
+    time.sleep(0.5)
+
+    assert threaded_socket_db.queue.qsize() == 2
+
+
+def test_connect_threaded_socket_db_on_already_used_port_raise_DBError(threaded_socket_db, unused_tcp_port):
+    socket_db = ThreadedSocketDB(HWPCReport, unused_tcp_port)
+    with pytest.raises(DBError):
+        socket_db.connect()
+
+
+def test_threaded_socket_db_with_max_queue_size_wait_for_the_puller_when_its_queue_is_full(unused_tcp_port):
+    socket_db = ThreadedSocketDB(HWPCReport, unused_tcp_port, max_queue_size=2)
+    socket_db.connect()
+    try:
+        json_reports = extract_rapl_reports_with_2_sockets(4)
+        client = ClientThread(json_reports, unused_tcp_port)
+        client.start()
+        client.join()
+        time.sleep(0.5)
+        assert socket_db.queue.qsize() == 2
+
+        reports = pull_reports(socket_db.iter(True), 4)
+        assert len(reports) == 4
+        for report, json_report in zip(reports, json_reports):
+            assert_report_equals(report, json_report)
+    finally:
+        socket_db.close()
+
+
+def test_iterate_on_threaded_socket_db_in_non_stream_mode_wait_for_the_first_report(threaded_socket_db, unused_tcp_port):
+    json_reports = extract_rapl_reports_with_2_sockets(1)
+    client = ClientThread(json_reports, unused_tcp_port)
+    iterator = threaded_socket_db.iter(False)
+
+    # the sensor connects after the puller started pulling
+    Thread(target=lambda: (time.sleep(0.3), client.start())).start()
+
+    assert_report_equals(next(iterator), json_reports[0])
+
+
+def test_malformed_json_object_received_by_threaded_socket_db_is_dropped_without_closing_the_connection(threaded_socket_db,
+                                                                                                         unused_tcp_port):
+    json_reports = extract_rapl_reports_with_2_sockets(1)
+    client_socket = socket()
+    client_socket.connect(('localhost', unused_tcp_port))
+    client_socket.send(bytes('{"sensor": }', 'utf-8'))
+    client_socket.send(bytes(json.dumps(json_reports[0]), 'utf-8'))
+    client_socket.close()
+
+    reports = pull_reports(threaded_socket_db.iter(True), 1)
+
+    assert len(reports) == 1
+    assert_report_equals(reports[0], json_reports[0])
@@ -0,0 +1,94 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from multiprocessing import Pipe
+
+import pytest
+
+from powerapi.formula.dummy import DummyFormulaActor, DummyFormulaValues
+from powerapi.dispatcher import RouteTable
+from powerapi.filter import Filter
+from powerapi.report import HWPCReport, PowerReport
+from powerapi.dispatch_rule import HWPCDispatchRule, HWPCDepthLevel
+from powerapi.message import PullerStartMessage
+from powerapi.puller import PullerActor
+from powerapi.test_utils.actor import system, dispatcher, dispatcher_start_message, started_dispatcher, pusher, \
+    pusher_start_message, started_pusher
+from powerapi.test_utils.db import FakeDB
+from powerapi.test_utils.report.hwpc import gen_HWPCReports
+from powerapi.test_utils.abstract_test import recv_from_pipe
+
+REPORT_NUMBER = 5
+
+
+def filter_rule(_):
+    """
+    send all reports to the dispatcher
+    """
+    return True
+
+
+@pytest.fixture
+def pipe():
+    return Pipe()
+
+
+@pytest.fixture
+def database(pipe):
+    return FakeDB(pipe=pipe[0])
+
+
+@pytest.fixture
+def formula_class():
+    return DummyFormulaActor
+
+
+@pytest.fixture
+def formula_values(started_pusher):
+    return DummyFormulaValues({'pusher': started_pusher}, 0)
+
+
+@pytest.fixture
+def route_table():
+    route_table = RouteTable()
+    route_table.dispatch_rule(HWPCReport, HWPCDispatchRule(getattr(HWPCDepthLevel, 'ROOT'), primary=True))
+    return route_table
+
+
+def test_puller_with_one_credit_send_all_its_reports_through_the_pipeline(system, started_dispatcher, pipe):
+    pipe_out = pipe[1]
+    assert recv_from_pipe(pipe_out, 1) == 'connected'
+
+    report_filter = Filter()
+    report_filter.filter(filter_rule, started_dispatcher)
+    puller_db = FakeDB(content=gen_HWPCReports(REPORT_NUMBER))
+    puller = system.createActor(PullerActor)
+    system.ask(puller, PullerStartMessage('system', 'test_puller', puller_db, report_filter, True, credits=1))
+
+    for _ in range(REPORT_NUMBER):
+        assert isinstance(recv_from_pipe(pipe_out, 2), PowerReport)
@@ -0,0 +1,86 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from multiprocessing import Pipe
+
+import pytest
+
+from powerapi.formula.dummy import DummyFormulaActor, DummyFormulaValues
+from powerapi.dispatcher import RouteTable
+from powerapi.filter import Filter
+from powerapi.report import HWPCReport, PowerReport
+from powerapi.dispatch_rule import HWPCDispatchRule, HWPCDepthLevel
+from powerapi.message import PullerStartMessage, DispatcherStartMessage
+from powerapi.puller import PullerActor
+from powerapi.test_utils.actor import system, dispatcher, started_dispatcher, pusher, pusher_start_message, started_pusher
+from powerapi.test_utils.db import FakeDB
+from powerapi.test_utils.report.hwpc import gen_HWPCReports
+from powerapi.test_utils.abstract_test import recv_from_pipe
+
+REPORT_NUMBER = 3
+CORE_NUMBER = 8
+
+
+def filter_rule(_):
+    """
+    send all reports to the dispatcher
+    """
+    return True
+
+
+@pytest.fixture
+def pipe():
+    return Pipe()
+
+
+@pytest.fixture
+def database(pipe):
+    return FakeDB(pipe=pipe[0])
+
+
+@pytest.fixture
+def dispatcher_start_message(started_pusher):
+    route_table = RouteTable()
+    route_table.dispatch_rule(HWPCReport, HWPCDispatchRule(getattr(HWPCDepthLevel, 'CORE'), primary=True))
+    return DispatcherStartMessage('system', 'dispatcher', DummyFormulaActor, DummyFormulaValues({'pusher': started_pusher}, 0),
+                                  route_table, 'test_device', formula_worker_number=2)
+
+
+@pytest.mark.parametrize('credits', [None, 1])
+def test_dispatcher_with_formula_workers_send_reports_of_all_formulas_to_the_pusher(system, started_dispatcher, pipe, credits):
+    pipe_out = pipe[1]
+    assert recv_from_pipe(pipe_out, 1) == 'connected'
+
+    report_filter = Filter()
+    report_filter.filter(filter_rule, started_dispatcher)
+    puller_db = FakeDB(content=gen_HWPCReports(REPORT_NUMBER))
+    puller = system.createActor(PullerActor)
+    system.ask(puller, PullerStartMessage('system', 'test_puller', puller_db, report_filter, True, credits=credits))
+
+    for _ in range(REPORT_NUMBER * CORE_NUMBER):
+        assert isinstance(recv_from_pipe(pipe_out, 2), PowerReport)
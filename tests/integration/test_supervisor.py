@@ -31,9 +31,11 @@ import pytest
 from thespian.actors import ActorAddress
 
 from powerapi.supervisor import Supervisor
-from powerapi.message import PullerStartMessage, PusherStartMessage, DispatcherStartMessage, StartMessage, PingMessage, OKMessage
+from powerapi.message import PullerStartMessage, PusherStartMessage, DispatcherStartMessage, StartMessage, PingMessage, OKMessage, \
+    FanOutPusherStartMessage
 from powerapi.puller import PullerActor
 from powerapi.pusher import PusherActor
+from powerapi.fan_out_pusher import FanOutPusherActor
 from powerapi.dispatcher import DispatcherActor, RouteTable
 from powerapi.filter import Filter
 from powerapi.actor import InitializationException
@@ -112,6 +114,19 @@ class TestSupervisorWithPusher(BaseSupervisorTest):
         return pusher_start_message
 
 
+class TestSupervisorWithFanOutPusher(BaseSupervisorTest):
+    @pytest.fixture
+    def actor_cls(self):
+        return FanOutPusherActor
+    @pytest.fixture
+    def start_message(self, pusher_start_message):
+        return FanOutPusherStartMessage('system', 'test_fan_out_pusher', {'test_pusher': pusher_start_message})
+
+    def test_launch_a_fan_out_pusher_with_supervisor_register_it_as_a_pusher(self, supervisor, actor_cls, start_message):
+        actor = supervisor.launch(actor_cls, start_message)
+        assert supervisor.pushers == {'test_fan_out_pusher': actor}
+
+
 class TestSupervisorWithDispatcher(BaseSupervisorTest):
     @pytest.fixture
     def actor_cls(self):
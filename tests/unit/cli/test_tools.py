@@ -31,11 +31,13 @@ import sys
 
 from mock import Mock, patch
 
-from powerapi.cli.generator import PullerGenerator, PusherGenerator, DBActorGenerator
+from powerapi.cli.generator import PullerGenerator, PusherGenerator, DBActorGenerator, AggregatorGenerator
 from powerapi.cli.generator import ModelNameDoesNotExist, DatabaseNameDoesNotExist
 from powerapi.puller import PullerActor
-from powerapi.database import MongoDB
-from powerapi.message import PullerStartMessage, PusherStartMessage
+from powerapi.fan_out_pusher import FanOutPusherActor
+from powerapi.aggregator import AggregatorActor
+from powerapi.database import MongoDB, SocketDB, ThreadedSocketDB
+from powerapi.message import PullerStartMessage, PusherStartMessage, FanOutPusherStartMessage
 from powerapi.exception import PowerAPIException
 ####################
 # PULLER GENERATOR #
@@ -141,6 +143,125 @@ def test_generate_two_pusher():
     assert db.collection_name == 'huhu'
 
 
+def test_generate_puller_with_batch_size_and_time_budget_set_them_in_start_message():
+    args = {'verbose': True, 'stream': True, 'input': {'toto': {'model': 'HWPCReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                'db': 'tata', 'collection': 'tutu', 'batch_size': 100,
+                                                                'time_budget': 0.5}}}
+    generator = PullerGenerator(None, [])
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert start_message.batch_size == 100
+    assert start_message.time_budget == 0.5
+
+
+def test_generate_puller_with_report_batch_size_and_linger_time_set_them_in_start_message():
+    args = {'verbose': True, 'stream': True, 'input': {'toto': {'model': 'HWPCReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                'db': 'tata', 'collection': 'tutu',
+                                                                'report_batch_size': 50, 'linger_time': 0.2}}}
+    generator = PullerGenerator(None, [])
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert start_message.report_batch_size == 50
+    assert start_message.linger_time == 0.2
+
+
+def test_generate_puller_with_credits_and_overflow_policy_set_them_in_start_message():
+    args = {'verbose': True, 'stream': True, 'input': {'toto': {'model': 'HWPCReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                'db': 'tata', 'collection': 'tutu', 'credits': 20,
+                                                                'overflow_policy': 'drop'}}}
+    generator = PullerGenerator(None, [])
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert start_message.credits == 20
+    assert start_message.overflow_policy == 'drop'
+
+
+def test_generate_socket_puller_in_threaded_mode_use_a_threaded_socket_db():
+    args = {'verbose': True, 'stream': True, 'input': {'toto': {'model': 'HWPCReport', 'type': 'socket', 'port': 10,
+                                                                'threaded': True},
+                                                       'titi': {'model': 'HWPCReport', 'type': 'socket', 'port': 11}}}
+    generator = PullerGenerator(None, [])
+    result = generator.generate(args)
+
+    assert isinstance(result['toto'][1].database, ThreadedSocketDB)
+    assert result['toto'][1].database.max_queue_size == 0
+    db = result['titi'][1].database
+    assert isinstance(db, SocketDB) and not isinstance(db, ThreadedSocketDB)
+
+
+def test_generate_pusher_with_batch_size_and_linger_time_set_them_in_start_message():
+    args = {'verbose': True, 'stream': True, 'output': {'toto': {'model': 'PowerReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                 'db': 'tata', 'collection': 'tutu', 'batch_size': 500,
+                                                                 'linger_time': 2.0}}}
+    generator = PusherGenerator()
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert isinstance(start_message, PusherStartMessage)
+    assert start_message.batch_size == 500
+    assert start_message.linger_time == 2.0
+
+
+def test_generate_pusher_with_async_writes_set_them_in_start_message():
+    args = {'verbose': True, 'stream': True, 'output': {'toto': {'model': 'PowerReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                 'db': 'tata', 'collection': 'tutu', 'async_writes': True,
+                                                                 'write_queue_size': 10}}}
+    generator = PusherGenerator()
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert start_message.async_writes
+    assert start_message.write_queue_size == 10
+
+
+def test_generate_pusher_with_spill_directory_set_it_in_start_message():
+    args = {'verbose': True, 'stream': True, 'output': {'toto': {'model': 'PowerReport', 'type': 'mongodb', 'uri': 'titi',
+                                                                 'db': 'tata', 'collection': 'tutu', 'spill_directory': '/tmp/spill',
+                                                                 'spill_retry_period': 2.0, 'max_spill_retry_period': 30.0}}}
+    generator = PusherGenerator()
+    result = generator.generate(args)
+
+    _, start_message = result['toto']
+    assert start_message.spill_directory == '/tmp/spill'
+    assert start_message.spill_retry_period == 2.0
+    assert start_message.max_spill_retry_period == 30.0
+
+
+def test_generate_pusher_in_fan_out_mode_generate_one_fan_out_pusher_for_all_the_outputs():
+    args = {'verbose': True, 'stream': True, 'fan_out': True,
+            'output': {'toto': {'model': 'PowerReport', 'type': 'mongodb', 'uri': 'titi', 'db': 'tata', 'collection': 'tutu',
+                                'batch_size': 500},
+                       'titi': {'model': 'PowerReport', 'type': 'csv', 'directory': '/tmp'}}}
+    generator = PusherGenerator()
+    result = generator.generate(args)
+
+    assert list(result) == ['fan_out_pusher']
+    actor, start_message = result['fan_out_pusher']
+    assert actor is FanOutPusherActor
+    assert isinstance(start_message, FanOutPusherStartMessage)
+    assert set(start_message.outputs) == {'toto', 'titi'}
+    assert isinstance(start_message.outputs['toto'].database, MongoDB)
+    assert start_message.outputs['toto'].batch_size == 500
+
+
+def test_generate_aggregator_from_config_with_aggregation_window_send_aggregated_reports_to_the_given_pushers():
+    args = {'verbose': True, 'stream': True, 'aggregation_window': 60.0, 'aggregation_tags': 'socket,scope'}
+    result = AggregatorGenerator().generate(args, {'toto': 'toto_address'})
+
+    actor, start_message = result['aggregator']
+    assert actor is AggregatorActor
+    assert start_message.pushers == {'toto': 'toto_address'}
+    assert start_message.window_length == 60.0
+    assert start_message.tags == ['socket', 'scope']
+
+
+def test_generate_aggregator_from_config_without_aggregation_window_generate_nothing():
+    assert AggregatorGenerator().generate({'verbose': True, 'stream': True}, {'toto': 'toto_address'}) == {}
+
+
 #########################
 # DBActorGenerator Test #
 #########################
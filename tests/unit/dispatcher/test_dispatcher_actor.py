@@ -26,19 +26,25 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import time
+from datetime import timedelta
+
 import pytest
 
-from thespian.actors import ActorExitRequest
+from mock import Mock, patch
+from thespian.actors import ActorExitRequest, ChildActorExited, WakeupMessage
 
+from powerapi.actor import Actor, InitializationException
 from powerapi.test_utils.actor import is_actor_alive, system
 from powerapi.test_utils.dummy_actor import DummyActor, DummyFormulaActor, CrashInitFormulaActor, CrashFormulaActor, DummyStartMessage, logger, LOGGER_NAME
 from powerapi.test_utils.abstract_test import AbstractTestActor, recv_from_pipe
-from powerapi.dispatcher import DispatcherActor, RouteTable
-from powerapi.dispatcher.dispatcher_actor import _extract_formula_id
+from powerapi.dispatcher import DispatcherActor, RouteTable, ShardRouter
+from powerapi.dispatcher.dispatcher_actor import _extract_formula_id, FormulaNameService, EVICTION_WAKEUP, LINGER_WAKEUP
 from powerapi.dispatch_rule import HWPCDispatchRule, HWPCDepthLevel, DispatchRule
 from powerapi.dispatch_rule import PowerDispatchRule, PowerDepthLevel
-from powerapi.message import OKMessage, ErrorMessage, DispatcherStartMessage, StartMessage, FormulaStartMessage, EndMessage
-from powerapi.formula import FormulaValues
+from powerapi.message import OKMessage, ErrorMessage, DispatcherStartMessage, StartMessage, FormulaStartMessage, EndMessage, ReportBatch, \
+    FlowControlMessage, AckMessage, FormulaWorkerStartMessage, HostedFormulaMessage, HostedFormulaMessageBatch, SaveFormulaStateMessage
+from powerapi.formula import FormulaValues, FormulaWorkerActor, HostedFormulaAddress, FormulaStateStore, FormulaStateStoreException
 from powerapi.dispatch_rule import DispatchRule
 from powerapi.report import Report, HWPCReport, PowerReport
 from powerapi.database import MongoDB
@@ -417,6 +423,58 @@ class TestDispatcher(AbstractTestActor):
         system.tell(actor, REPORT_1)
         assert recv_from_pipe(dummy_pipe_out, 0.5)  == (None,None)
 
+    @define_dispatch_rules([(Report1, DispatchRule1AB(primary=True))])
+    def test_send_ReportBatch_to_dispatcher_with_one_formula_forward_a_ReportBatch_to_formula(self, system, dispatcher_with_formula, dummy_pipe_out):
+        system.tell(dispatcher_with_formula, ReportBatch('system', [REPORT_1, REPORT_1]))
+        _, msg = recv_from_pipe(dummy_pipe_out, 0.5)
+        assert isinstance(msg, ReportBatch)
+        assert msg.reports == [REPORT_1, REPORT_1]
+        assert recv_from_pipe(dummy_pipe_out, 0.5) == (None, None)
+
+    @define_dispatch_rules([(Report1, DispatchRule1AB(primary=True))])
+    def test_starting_dispatcher_with_report_batch_size_of_0_must_answer_error_message(self, system, actor, dispatch_rules, logger):
+        route_table = RouteTable()
+        route_table.dispatch_rule(Report1, DispatchRule1AB(primary=True))
+        values = FormulaValues({'fake_pusher': LOGGER_NAME})
+        start_message = DispatcherStartMessage('system', 'dispatcher', DummyFormulaActor, values, route_table, 'test_device',
+                                               report_batch_size=0)
+        answer = system.ask(actor, start_message)
+        assert isinstance(answer, ErrorMessage)
+        assert answer.error_message == 'report batch size must be greater than 0'
+
+    @define_dispatch_rules([(Report1, DispatchRule1AB(primary=True))])
+    def test_dispatcher_with_report_batch_size_send_reports_to_formula_in_batches(self, system, actor, dispatch_rules, logger, dummy_pipe_out):
+        route_table = RouteTable()
+        route_table.dispatch_rule(Report1, DispatchRule1AB(primary=True))
+        values = FormulaValues({'fake_pusher': LOGGER_NAME})
+        start_message = DispatcherStartMessage('system', 'dispatcher', DummyFormulaActor, values, route_table, 'test_device',
+                                               report_batch_size=2, linger_time=10)
+        system.ask(actor, start_message)
+        system.tell(actor, REPORT_1)
+        system.tell(actor, REPORT_1)
+
+        _, start_msg = recv_from_pipe(dummy_pipe_out, 0.5)
+        assert isinstance(start_msg, StartMessage)
+        _, msg = recv_from_pipe(dummy_pipe_out, 0.5)
+        assert isinstance(msg, ReportBatch)
+        assert msg.reports == [REPORT_1, REPORT_1]
+
+    @define_dispatch_rules([(Report1, DispatchRule1AB(primary=True))])
+    def test_dispatcher_with_report_batch_size_send_partial_batch_after_linger_time(self, system, actor, dispatch_rules, logger, dummy_pipe_out):
+        route_table = RouteTable()
+        route_table.dispatch_rule(Report1, DispatchRule1AB(primary=True))
+        values = FormulaValues({'fake_pusher': LOGGER_NAME})
+        start_message = DispatcherStartMessage('system', 'dispatcher', DummyFormulaActor, values, route_table, 'test_device',
+                                               report_batch_size=10, linger_time=0.1)
+        system.ask(actor, start_message)
+        system.tell(actor, REPORT_1)
+
+        _, start_msg = recv_from_pipe(dummy_pipe_out, 0.5)
+        assert isinstance(start_msg, StartMessage)
+        _, msg = recv_from_pipe(dummy_pipe_out, 1)
+        assert isinstance(msg, ReportBatch)
+        assert msg.reports == [REPORT_1]
+
 
 #############################################
 # TEST METIER DE L'EXTRACTION DU FORMULA ID #
@@ -470,3 +528,521 @@ def test_extract_formula_id_with_pgb_DispatchRule1AB_gb_DispatchRule2AC_on_REPOR
     pgb = DispatchRule1AB(primary=True)
     gen_test_extract_formula_id(pgb, DispatchRule2AC(), REPORT_2, [('a',)])
     gen_test_extract_formula_id(pgb, DispatchRule2AC(), REPORT_2_C2, [('a',)])
+
+
+##########################
+# TEST OF FLOW CONTROL   #
+##########################
+def gen_dispatcher_with_formula():
+    """
+    return a DispatcherActor, not bound to any actor system, with one started formula for the formula id ('a', 'b')
+    its send method is mocked
+    """
+    dispatcher = DispatcherActor()
+    dispatcher.name = 'dispatcher'
+    dispatcher.route_table = RouteTable()
+    dispatcher.route_table.dispatch_rule(Report1, DispatchRule1AB(primary=True))
+    dispatcher.route_table.dispatch_rule(Report2, DispatchRule2A())
+    dispatcher.formula_name_service = FormulaNameService()
+    dispatcher.formula_name_service.add(('a', 'b'), 'formula0__a__b')
+    dispatcher._add_to_formula_pool('formula0__a__b', 'formula_address')
+    dispatcher.send = Mock()
+    return dispatcher
+
+
+def gen_route_table():
+    """
+    return a route table that create formulas with the Report1 formula ids and send Report2 to the formulas matching its
+    formula id prefix
+    """
+    route_table = RouteTable()
+    route_table.dispatch_rule(Report1, DispatchRule1AB(primary=True))
+    route_table.dispatch_rule(Report2, DispatchRule2A())
+    return route_table
+
+
+def gen_dispatcher(mock_send=True, formula_values=None, **start_kwargs):
+    """
+    return a DispatcherActor, not bound to any actor system, started with a route table that create formulas with the
+    Report1 and Report2 formula ids and with the given DispatcherStartMessage parameters
+    its createActor and wakeupAfter methods are mocked, created actors are named 'actor_address<i>' in creation order
+    its send method is mocked unless mock_send is False, formula workers tests patch Actor.send instead to see the
+    messages wrapped for the workers
+    """
+    dispatcher = DispatcherActor()
+    dispatcher.name = 'dispatcher'
+    if mock_send:
+        dispatcher.send = Mock()
+    dispatcher.wakeupAfter = Mock()
+    dispatcher.createActor = Mock(side_effect=lambda _: 'actor_address' + str(dispatcher.createActor.call_count - 1))
+    formula_values = FormulaValues({}) if formula_values is None else formula_values
+    dispatcher._initialization(DispatcherStartMessage('system', 'dispatcher', DummyFormulaActor, formula_values, gen_route_table(),
+                                                      'test_device', **start_kwargs))
+    return dispatcher
+
+
+@pytest.mark.parametrize('start_kwargs', [
+    {'formula_idle_ttl': 0},
+    {'max_formula_number': 0},
+    {'coalescing_window': 0},
+    {'prewarmed_formula_number': -1},
+    {'max_waiting_reports': 1, 'waiting_overflow_policy': 'drop-all'},
+])
+def test_initialize_dispatcher_with_wrong_parameters_raise_InitializationException(start_kwargs):
+    with pytest.raises(InitializationException):
+        gen_dispatcher(**start_kwargs)
+
+
+def test_initialize_dispatcher_with_unknown_shard_raise_InitializationException():
+    with pytest.raises(InitializationException):
+        gen_dispatcher(shard_router=ShardRouter(gen_route_table(), 2), shard=2)
+
+
+def test_send_FlowControlMessage_to_dispatcher_make_it_forward_FlowControlMessage_to_formulas():
+    dispatcher = gen_dispatcher_with_formula()
+    dispatcher.receiveMessage(FlowControlMessage('puller'), 'puller_address')
+
+    address, message = dispatcher.send.call_args.args
+    assert address == 'formula_address'
+    assert isinstance(message, FlowControlMessage)
+
+
+def test_dispatcher_with_flow_control_acknowledge_report_when_formula_acknowledge_it():
+    dispatcher = gen_dispatcher_with_formula()
+    dispatcher.receiveMessage(FlowControlMessage('puller'), 'puller_address')
+    dispatcher.receiveMessage(REPORT_1, 'puller_address')
+    dispatcher.send.assert_called_with('formula_address', REPORT_1)
+
+    dispatcher.receiveMessage(AckMessage('formula0__a__b', 1), 'formula_address')
+    address, message = dispatcher.send.call_args.args
+    assert address == 'puller_address'
+    assert isinstance(message, AckMessage)
+    assert message.count == 1
+
+
+def test_dispatcher_with_flow_control_acknowledge_immediately_report_that_match_no_formula():
+    dispatcher = gen_dispatcher_with_formula()
+    dispatcher.receiveMessage(FlowControlMessage('puller'), 'puller_address')
+    dispatcher.receiveMessage(Report2('z', 'c'), 'puller_address')
+
+    address, message = dispatcher.send.call_args.args
+    assert address == 'puller_address'
+    assert isinstance(message, AckMessage)
+
+
+##########################
+# TEST OF SHARDS           #
+##########################
+def get_created_formula_ids(dispatcher):
+    return [tuple(name.split('__')[1:]) for name, _ in dispatcher.formula_waiting_service.get_all_formula()]
+
+
+def test_dispatcher_shards_only_create_the_formulas_of_the_formula_ids_they_own():
+    router = ShardRouter(gen_route_table(), 2)
+    shards = [gen_dispatcher(shard_router=router, shard=shard) for shard in range(2)]
+    reports = [Report1('a', b, b2) for b in 'bcdefgh' for b2 in 'ijklmno']
+    assert any(len(router.get_shards(report)) == 2 for report in reports)
+
+    for report in reports:
+        for shard in router.get_shards(report):
+            shards[shard].receiveMessage(report, 'puller_address')
+
+    created_ids = [get_created_formula_ids(dispatcher) for dispatcher in shards]
+    assert not set(created_ids[0]) & set(created_ids[1])
+    for shard, formula_ids in enumerate(created_ids):
+        assert all(router.get_shard(formula_id) == shard for formula_id in formula_ids)
+    assert len(created_ids[0]) + len(created_ids[1]) == 7 + 7
+
+
+##########################
+# TEST OF FORMULA EVICTION #
+##########################
+def get_end_message_destinations(dispatcher):
+    return [address for address, message in (call.args for call in dispatcher.send.call_args_list) if isinstance(message, EndMessage)]
+
+
+def start_formulas(dispatcher):
+    for formula_name, address in list(dispatcher.formula_waiting_service.get_all_formula()):
+        dispatcher.receiveMessage(OKMessage(formula_name), address)
+
+
+def test_dispatcher_with_max_formula_number_evict_least_recently_used_formula_when_creating_a_formula_beyond_the_limit():
+    dispatcher = gen_dispatcher(max_formula_number=2)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    assert not get_end_message_destinations(dispatcher)
+
+    dispatcher.receiveMessage(Report1('a', 'd'), 'puller_address')
+
+    assert get_end_message_destinations(dispatcher) == ['actor_address1']
+    assert dispatcher.formula_name_service.get_formula_id('formula1__a__c') is None
+    assert dispatcher.created_formula_count == 3
+    assert dispatcher.evicted_formula_count == 1
+
+
+def test_dispatcher_with_max_formula_number_never_evict_a_formula_of_the_report_that_create_a_formula():
+    dispatcher = gen_dispatcher(max_formula_number=2)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher.send.reset_mock()
+
+    report = Report1('a', 'b', 'd')
+    dispatcher.receiveMessage(report, 'puller_address')
+
+    assert get_end_message_destinations(dispatcher) == ['actor_address1']
+    dispatcher.send.assert_any_call('actor_address0', report)
+    assert list(dispatcher.formula_last_activity) == ['formula0__a__b', 'formula2__a__d']
+    assert dispatcher.formula_waiting_service.get_waiting_messages('formula2__a__d')
+    assert not dispatcher._evicted_formulas & {'formula0__a__b', 'formula2__a__d'}
+
+
+def test_evicting_an_evicted_formula_does_nothing():
+    dispatcher = gen_dispatcher(max_formula_number=2)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher._evict_formula('formula0__a__b')
+    dispatcher._evict_formula('formula0__a__b')
+
+    assert get_end_message_destinations(dispatcher) == ['actor_address0']
+    assert dispatcher.evicted_formula_count == 1
+
+
+def test_dispatcher_evict_formulas_that_received_no_report_since_idle_ttl():
+    dispatcher = gen_dispatcher(formula_idle_ttl=5)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher.formula_last_activity['formula0__a__b'] = time.monotonic() - 10
+    dispatcher.formula_last_activity.move_to_end('formula0__a__b', last=False)
+
+    dispatcher.receiveMessage(WakeupMessage(5, EVICTION_WAKEUP), 'dispatcher_address')
+
+    assert get_end_message_destinations(dispatcher) == ['actor_address0']
+    assert list(dispatcher.formula_last_activity) == ['formula1__a__c']
+    assert dispatcher.evicted_formula_count == 1
+    dispatcher.wakeupAfter.assert_called_with(timedelta(seconds=5), EVICTION_WAKEUP)
+
+
+def test_evicting_a_not_started_formula_send_it_EndMessage_once_started():
+    dispatcher = gen_dispatcher(max_formula_number=1)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    assert not get_end_message_destinations(dispatcher)
+
+    start_formulas(dispatcher)
+    assert get_end_message_destinations(dispatcher) == ['actor_address0']
+
+
+def test_report_for_an_evicted_formula_id_create_a_new_formula():
+    dispatcher = gen_dispatcher(max_formula_number=1)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+
+    assert dispatcher.formula_name_service.get_direct_formula_name(('a', 'b')) == 'formula2__a__b'
+    assert dispatcher.created_formula_count == 3
+    assert dispatcher.evicted_formula_count == 2
+
+
+def test_evicted_formula_exit_remove_it_from_formula_pool():
+    dispatcher = gen_dispatcher(max_formula_number=1)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    start_formulas(dispatcher)
+
+    dispatcher.receiveMessage(ChildActorExited('actor_address0'), 'system_address')
+
+    assert list(dispatcher.formula_pool) == ['formula1__a__c']
+    assert dispatcher.formula_name_service.get_direct_formula_name(('a', 'c')) == 'formula1__a__c'
+
+
+############################
+# TEST OF FORMULA WORKERS  #
+############################
+def test_initialize_dispatcher_with_formula_workers_create_and_start_the_workers():
+    with patch.object(Actor, 'send') as send:
+        dispatcher = gen_dispatcher(mock_send=False, formula_worker_number=2)
+
+    dispatcher.createActor.assert_called_with(FormulaWorkerActor)
+    assert dispatcher.formula_workers == ['actor_address0', 'actor_address1']
+    messages = [call.args[2] for call in send.call_args_list]
+    assert all(isinstance(message, FormulaWorkerStartMessage) for message in messages)
+    assert [message.name for message in messages] == ['dispatcher_worker0', 'dispatcher_worker1']
+
+
+def test_dispatcher_with_formula_workers_host_new_formulas_on_the_workers_in_turn():
+    with patch.object(Actor, 'send') as send:
+        dispatcher = gen_dispatcher(mock_send=False, formula_worker_number=2)
+        send.reset_mock()
+        for b in ['b', 'c', 'd']:
+            dispatcher.receiveMessage(Report1('a', b), 'puller_address')
+
+    start_messages = [call.args[1:] for call in send.call_args_list if isinstance(call.args[2].message, FormulaStartMessage)]
+    assert [(address, message.formula_name) for address, message in start_messages] == [
+        ('actor_address0', 'formula0__a__b'), ('actor_address1', 'formula1__a__c'), ('actor_address0', 'formula2__a__d')]
+    assert dispatcher.createActor.call_count == 2
+
+
+def test_dispatcher_with_formula_workers_send_reports_to_hosted_formula_once_started():
+    report = Report1('a', 'b')
+    with patch.object(Actor, 'send') as send:
+        dispatcher = gen_dispatcher(mock_send=False, formula_worker_number=1)
+        dispatcher.receiveMessage(report, 'puller_address')
+        dispatcher.receiveMessage(OKMessage('dispatcher_worker0'), 'actor_address0')
+        send.reset_mock()
+        dispatcher.receiveMessage(HostedFormulaMessage('dispatcher_worker0', 'formula0__a__b', OKMessage('formula0__a__b')),
+                                  'actor_address0')
+
+    assert list(dispatcher.formula_pool) == ['formula0__a__b']
+    _, address, message = send.call_args.args
+    assert address == 'actor_address0'
+    assert message.formula_name == 'formula0__a__b'
+    assert message.message == report
+
+
+def test_exit_of_hosted_formula_remove_it_from_formula_pool():
+    with patch.object(Actor, 'send'):
+        dispatcher = gen_dispatcher(mock_send=False, formula_worker_number=1)
+        dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+        dispatcher.receiveMessage(HostedFormulaMessage('dispatcher_worker0', 'formula0__a__b', OKMessage('formula0__a__b')),
+                                  'actor_address0')
+        exited = ChildActorExited(HostedFormulaAddress('actor_address0', 'formula0__a__b'))
+        dispatcher.receiveMessage(HostedFormulaMessage('dispatcher_worker0', 'formula0__a__b', exited), 'actor_address0')
+
+    assert not dispatcher.formula_pool
+    assert dispatcher.formula_name_service.get_formula_id('formula0__a__b') is None
+
+
+def test_report_sent_to_several_formulas_of_a_worker_is_sent_once_to_the_worker():
+    with patch.object(Actor, 'send') as send:
+        dispatcher = gen_dispatcher(mock_send=False, formula_worker_number=2)
+        for b in ['b', 'c', 'd']:
+            dispatcher.receiveMessage(Report1('a', b), 'puller_address')
+            formula_name = 'formula' + str(dispatcher.formula_number_id - 1) + '__a__' + b
+            dispatcher.receiveMessage(HostedFormulaMessage('dispatcher_worker', formula_name, OKMessage(formula_name)),
+                                      dispatcher.formula_waiting_service.formulas[formula_name].worker)
+        send.reset_mock()
+        report = Report2('a', 'c')
+        dispatcher.receiveMessage(report, 'puller_address')
+
+    messages = {address: message for _, address, message in (call.args for call in send.call_args_list)}
+    assert isinstance(messages['actor_address0'], HostedFormulaMessageBatch)
+    assert messages['actor_address0'].messages == [('formula0__a__b', report), ('formula2__a__d', report)]
+    assert isinstance(messages['actor_address1'], HostedFormulaMessage)
+    assert messages['actor_address1'].message == report
+
+
+################################
+# TEST OF COALESCING WINDOW    #
+################################
+def start_formula_a_b(dispatcher):
+    """
+    start a formula for the formula id ('a', 'b') on the dispatcher and forget the messages sent to start it
+    """
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(OKMessage('formula0__a__b'), 'actor_address0')
+    dispatcher._flush_report_batches()
+    dispatcher.send.reset_mock()
+
+
+def test_dispatcher_with_coalescing_window_send_all_reports_of_the_window_in_one_batch():
+    dispatcher = gen_dispatcher(coalescing_window=0.5)
+    start_formula_a_b(dispatcher)
+    reports = [Report1('a', 'b') for _ in range(20)]
+    for report in reports:
+        dispatcher.receiveMessage(report, 'puller_address')
+    assert not dispatcher.send.called
+    dispatcher.wakeupAfter.assert_called_with(timedelta(seconds=0.5), LINGER_WAKEUP)
+
+    with patch('powerapi.utils.report_batcher.time.monotonic', return_value=time.monotonic() + 1):
+        dispatcher.receiveMessage(WakeupMessage(0.5, LINGER_WAKEUP), 'dispatcher_address')
+
+    dispatcher.send.assert_called_once()
+    address, message = dispatcher.send.call_args.args
+    assert address == 'actor_address0'
+    assert isinstance(message, ReportBatch)
+    assert message.reports == reports
+
+
+def test_dispatcher_with_coalescing_window_and_report_batch_size_send_full_batches_before_the_window_end():
+    dispatcher = gen_dispatcher(coalescing_window=0.5, report_batch_size=3)
+    start_formula_a_b(dispatcher)
+    for _ in range(3):
+        dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    address, message = dispatcher.send.call_args.args
+    assert len(message.reports) == 3
+
+
+def test_dispatcher_with_coalescing_window_group_the_reports_of_received_batches_with_the_window_reports():
+    dispatcher = gen_dispatcher(coalescing_window=0.5)
+    start_formula_a_b(dispatcher)
+    reports = [Report1('a', 'b') for _ in range(4)]
+    dispatcher.receiveMessage(reports[0], 'puller_address')
+    dispatcher.receiveMessage(ReportBatch('puller', reports[1:3]), 'puller_address')
+    dispatcher.receiveMessage(reports[3], 'puller_address')
+    assert not dispatcher.send.called
+
+    with patch('powerapi.utils.report_batcher.time.monotonic', return_value=time.monotonic() + 1):
+        dispatcher.receiveMessage(WakeupMessage(0.5, LINGER_WAKEUP), 'dispatcher_address')
+
+    dispatcher.send.assert_called_once()
+    address, message = dispatcher.send.call_args.args
+    assert address == 'actor_address0'
+    assert message.reports == reports
+
+
+def test_dispatcher_with_coalescing_window_acknowledge_received_batch_once_its_reports_are_acknowledged():
+    dispatcher = gen_flow_controlled_dispatcher(coalescing_window=0.5, report_batch_size=2)
+    start_formula_a_b(dispatcher)
+    dispatcher.receiveMessage(AckMessage('formula0__a__b', 1), 'actor_address0')
+    dispatcher.send.reset_mock()
+
+    dispatcher.receiveMessage(ReportBatch('puller', [Report1('a', 'b') for _ in range(4)]), 'puller_address')
+    sent_batches = [message for address, message in (call.args for call in dispatcher.send.call_args_list) if address == 'actor_address0']
+    assert [len(batch.reports) for batch in sent_batches] == [2, 2]
+
+    dispatcher.receiveMessage(AckMessage('formula0__a__b', 1), 'actor_address0')
+    assert get_acknowledged_count(dispatcher) == 0
+    dispatcher.receiveMessage(AckMessage('formula0__a__b', 1), 'actor_address0')
+    assert get_acknowledged_count(dispatcher) == 1
+
+
+################################
+# TEST OF PREWARMED FORMULAS   #
+################################
+def test_initialize_dispatcher_with_prewarmed_formula_number_create_formula_actors():
+    dispatcher = gen_dispatcher(prewarmed_formula_number=2)
+    assert dispatcher.prewarmed_formulas == ['actor_address0', 'actor_address1']
+    assert not dispatcher.send.called
+
+
+def test_new_formula_is_started_on_a_prewarmed_actor_that_is_replaced():
+    dispatcher = gen_dispatcher(prewarmed_formula_number=2)
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+
+    start_messages = [call.args for call in dispatcher.send.call_args_list if isinstance(call.args[1], FormulaStartMessage)]
+    assert [(address, message.name) for address, message in start_messages] == [('actor_address0', 'formula0__a__b')]
+    assert dispatcher.prewarmed_formulas == ['actor_address1', 'actor_address2']
+
+
+def test_ActorExitRequest_is_forwarded_to_prewarmed_formulas():
+    dispatcher = gen_dispatcher(prewarmed_formula_number=2)
+    dispatcher.receiveMessage(ActorExitRequest(), 'system_address')
+
+    destinations = [address for address, message in (call.args for call in dispatcher.send.call_args_list)
+                    if isinstance(message, ActorExitRequest)]
+    assert destinations == ['actor_address0', 'actor_address1']
+
+
+def test_exit_of_prewarmed_formula_remove_it_from_prewarmed_formulas():
+    dispatcher = gen_dispatcher(prewarmed_formula_number=2)
+    dispatcher.receiveMessage(ChildActorExited('actor_address0'), 'system_address')
+    assert dispatcher.prewarmed_formulas == ['actor_address1']
+
+
+##################################
+# TEST OF BOUNDED WAITING REPORTS #
+##################################
+def gen_flow_controlled_dispatcher(**start_kwargs):
+    """
+    return a dispatcher created by gen_dispatcher whose reports must be acknowledged to 'puller_address'
+    """
+    dispatcher = gen_dispatcher(**start_kwargs)
+    dispatcher.receiveMessage(FlowControlMessage('puller'), 'puller_address')
+    return dispatcher
+
+
+def get_acknowledged_count(dispatcher):
+    return sum(message.count for address, message in (call.args for call in dispatcher.send.call_args_list)
+               if address == 'puller_address' and isinstance(message, AckMessage))
+
+
+def test_report_dropped_while_waiting_for_formula_start_is_acknowledged():
+    dispatcher = gen_flow_controlled_dispatcher(max_waiting_reports=2)
+    # the first report is also sent to the formula ('a', 'c'), dropping it for the formula ('a', 'b') doesn't acknowledge it
+    dispatcher.receiveMessage(Report1('a', 'b', 'c'), 'puller_address')
+    for _ in range(2):
+        dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    assert get_acknowledged_count(dispatcher) == 0
+
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    assert get_acknowledged_count(dispatcher) == 1
+    assert dispatcher.formula_waiting_service.dropped_report_count == 2
+
+
+def test_waiting_reports_are_acknowledged_when_formula_start_fail():
+    dispatcher = gen_flow_controlled_dispatcher(max_waiting_reports=2)
+    for _ in range(2):
+        dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(ErrorMessage('formula0__a__b', 'error'), 'actor_address0')
+    assert get_acknowledged_count(dispatcher) == 2
+
+
+def test_waiting_reports_are_acknowledged_when_started_formula_acknowledge_them():
+    dispatcher = gen_flow_controlled_dispatcher(max_waiting_reports=2)
+    for _ in range(2):
+        dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(OKMessage('formula0__a__b'), 'actor_address0')
+    assert get_acknowledged_count(dispatcher) == 0
+
+    dispatcher.receiveMessage(AckMessage('formula0__a__b', 2), 'actor_address0')
+    assert get_acknowledged_count(dispatcher) == 2
+
+
+#############################
+# TEST OF FORMULA STATE     #
+#############################
+def get_formula_start_messages(dispatcher):
+    return [message for _, message in (call.args for call in dispatcher.send.call_args_list) if isinstance(message, FormulaStartMessage)]
+
+
+def test_dispatcher_start_formula_with_the_state_saved_for_its_formula_id(tmp_path):
+    state_store = FormulaStateStore(str(tmp_path))
+    state_store.save(('a', 'b'), {'model': [1, 2]})
+    dispatcher = gen_dispatcher(formula_values=FormulaValues({}, state_store))
+
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+
+    assert [message.domain_values.state for message in get_formula_start_messages(dispatcher)] == [{'model': [1, 2]}, None]
+
+
+def test_dispatcher_restart_crashed_formula_with_the_state_saved_for_its_formula_id(tmp_path):
+    state_store = FormulaStateStore(str(tmp_path))
+    dispatcher = gen_dispatcher(formula_values=FormulaValues({}, state_store))
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    start_formulas(dispatcher)
+    state_store.save(('a', 'b'), {'model': [1, 2]})
+
+    dispatcher._restart_formula('formula0__a__b')
+
+    restart_message = get_formula_start_messages(dispatcher)[-1]
+    assert restart_message.name == 'formula1__a__b'
+    assert restart_message.domain_values.state == {'model': [1, 2]}
+
+
+def test_dispatcher_start_formula_without_state_when_its_state_can_not_be_loaded(tmp_path):
+    state_store = FormulaStateStore(str(tmp_path))
+    state_store.load = Mock(side_effect=FormulaStateStoreException('corrupted state'))
+    dispatcher = gen_dispatcher(formula_values=FormulaValues({}, state_store))
+
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+
+    assert get_formula_start_messages(dispatcher)[0].domain_values.state is None
+
+
+def test_dispatcher_forward_SaveFormulaStateMessage_to_started_formulas(tmp_path):
+    dispatcher = gen_dispatcher(formula_values=FormulaValues({}, FormulaStateStore(str(tmp_path))))
+    dispatcher.receiveMessage(Report1('a', 'b'), 'puller_address')
+    dispatcher.receiveMessage(Report1('a', 'c'), 'puller_address')
+    start_formulas(dispatcher)
+    dispatcher.send.reset_mock()
+
+    dispatcher.receiveMessage(SaveFormulaStateMessage('system'), 'system_address')
+
+    assert sorted(address for address, message in (call.args for call in dispatcher.send.call_args_list)
+                  if isinstance(message, SaveFormulaStateMessage)) == ['actor_address0', 'actor_address1']
@@ -0,0 +1,221 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+
+from powerapi.dispatcher.dispatcher_actor import FormulaNameService, FormulaWaitingService
+from powerapi.message import EndMessage
+from powerapi.report import Report
+
+FORMULA_NUMBER = 5000
+
+
+def gen_formula_name(formula_id):
+    return 'formula__' + '__'.join(formula_id)
+
+
+def test_get_formula_id_from_formula_name_service_return_the_id_of_the_formula():
+    service = FormulaNameService()
+    service.add(('a', 'b'), 'f1')
+    service.add(('a', 'c'), 'f2')
+    assert service.get_formula_id('f2') == ('a', 'c')
+    assert service.get_formula_id('f3') is None
+
+
+def test_remove_formula_from_formula_name_service_remove_its_name_and_its_id():
+    service = FormulaNameService()
+    service.add(('a', 'b'), 'f1')
+    service.remove_formula('f1')
+    assert service.get_formula_id('f1') is None
+    with pytest.raises(KeyError):
+        service.get_direct_formula_name(('a', 'b'))
+
+
+def test_remove_unknown_formula_from_formula_name_service_raise_AttributeError():
+    service = FormulaNameService()
+    with pytest.raises(AttributeError):
+        service.remove_formula('f1')
+
+
+def test_get_formula_by_address_from_formula_waiting_service_return_formula_name():
+    service = FormulaWaitingService()
+    service.add('f1', 'address1')
+    service.add('f2', 'address2')
+    assert service.get_formula_by_address('address2') == 'f2'
+
+
+def test_get_formula_by_address_of_removed_formula_from_formula_waiting_service_raise_AttributeError():
+    service = FormulaWaitingService()
+    service.add('f1', 'address1')
+    service.remove_formula('f1')
+    with pytest.raises(AttributeError):
+        service.get_formula_by_address('address1')
+
+
+def gen_reports(number):
+    return [Report(timestamp, 'sensor', 'target') for timestamp in range(number)]
+
+
+def get_waiting_reports(service, formula_name):
+    return [message for message, _ in service.get_waiting_messages(formula_name)]
+
+
+def test_add_message_to_unbounded_formula_waiting_service_keep_all_messages():
+    service = FormulaWaitingService()
+    service.add('f1', 'address1')
+    reports = gen_reports(3)
+    for report in reports:
+        assert service.add_message('f1', report) == []
+    assert get_waiting_reports(service, 'f1') == reports
+
+
+@pytest.mark.parametrize('policy, expected_indexes', [('drop-oldest', [1, 2, 3]), ('drop-newest', [0, 1, 2]),
+                                                      ('coalesce-latest', [0, 1, 3])])
+def test_formula_waiting_service_apply_overflow_policy_when_formula_bound_is_reached(policy, expected_indexes):
+    service = FormulaWaitingService(max_formula_reports=3, overflow_policy=policy)
+    service.add('f1', 'address1')
+    reports = gen_reports(4)
+    for report in reports[:3]:
+        service.add_message('f1', report, ['ack' + str(report.timestamp)])
+
+    discarded = service.add_message('f1', reports[3], ['ack3'])
+
+    assert get_waiting_reports(service, 'f1') == [reports[index] for index in expected_indexes]
+    discarded_index = ({0, 1, 2, 3} - set(expected_indexes)).pop()
+    assert discarded == [(reports[discarded_index], ['ack' + str(discarded_index)])]
+
+
+@pytest.mark.parametrize('policy, dropped, coalesced', [('drop-oldest', 1, 0), ('drop-newest', 1, 0), ('coalesce-latest', 0, 1)])
+def test_formula_waiting_service_count_dropped_and_coalesced_reports(policy, dropped, coalesced):
+    service = FormulaWaitingService(max_formula_reports=1, overflow_policy=policy)
+    service.add('f1', 'address1')
+    for report in gen_reports(2):
+        service.add_message('f1', report)
+    assert service.dropped_report_count == dropped
+    assert service.coalesced_report_count == coalesced
+
+
+def test_formula_waiting_service_never_drop_other_messages_than_reports():
+    service = FormulaWaitingService(max_formula_reports=1)
+    service.add('f1', 'address1')
+    end_message = EndMessage('dispatcher')
+    report1, report2 = gen_reports(2)
+    service.add_message('f1', report1)
+    service.add_message('f1', end_message)
+    service.add_message('f1', report2)
+    assert get_waiting_reports(service, 'f1') == [end_message, report2]
+
+
+def test_formula_waiting_service_drop_report_of_formula_without_waiting_report_when_global_bound_is_reached():
+    service = FormulaWaitingService(max_reports=2, overflow_policy='drop-oldest')
+    service.add('f1', 'address1')
+    service.add('f2', 'address2')
+    report1, report2, report3, report4 = gen_reports(4)
+    service.add_message('f1', report1)
+    service.add_message('f1', report2)
+
+    assert service.add_message('f2', report3) == [(report3, None)]
+    assert service.add_message('f1', report4) == [(report1, None)]
+    assert get_waiting_reports(service, 'f1') == [report2, report4]
+    assert service.dropped_report_count == 2
+
+
+def test_remove_formula_from_formula_waiting_service_free_its_place_in_the_global_bound():
+    service = FormulaWaitingService(max_reports=1)
+    service.add('f1', 'address1')
+    service.add('f2', 'address2')
+    report1, report2 = gen_reports(2)
+    service.add_message('f1', report1)
+    service.remove_formula('f1')
+    assert service.add_message('f2', report2) == []
+    assert service.waiting_report_count == 1
+
+
+class ComparisonCounter(str):
+    """
+    string that counts how many times it is compared for equality, a linear scan over n formulas compares the searched
+    value with each of them
+    """
+    comparison_count = 0
+    __hash__ = str.__hash__
+
+    def __eq__(self, other):
+        ComparisonCounter.comparison_count += 1
+        return str.__eq__(self, other)
+
+
+@pytest.fixture
+def counted_formula_ids():
+    ComparisonCounter.comparison_count = 0
+    return [(ComparisonCounter('sensor'), ComparisonCounter('target' + str(i))) for i in range(FORMULA_NUMBER)]
+
+
+def test_lookup_and_remove_all_formulas_of_a_formula_name_service_never_scan_all_the_formulas(counted_formula_ids):
+    service = FormulaNameService()
+    for formula_id in counted_formula_ids:
+        service.add(formula_id, gen_formula_name(formula_id))
+
+    ComparisonCounter.comparison_count = 0
+    for formula_id in counted_formula_ids:
+        formula_name = gen_formula_name(formula_id)
+        assert service.get_formula_id(formula_name) == formula_id
+        service.remove_formula(formula_name)
+
+    # indexed operations compare each id with a few others, a linear scan would compare it with all the formulas
+    assert ComparisonCounter.comparison_count <= 10 * FORMULA_NUMBER
+
+
+def test_lookup_and_remove_all_formulas_of_a_formula_waiting_service_never_scan_all_the_formulas(counted_formula_ids):
+    service = FormulaWaitingService()
+    formula_names = [gen_formula_name(formula_id) for formula_id in counted_formula_ids]
+    for formula_name in formula_names:
+        service.add(formula_name, ComparisonCounter('address_' + formula_name))
+
+    ComparisonCounter.comparison_count = 0
+    for formula_name in formula_names:
+        assert service.get_formula_by_address(ComparisonCounter('address_' + formula_name)) == formula_name
+        service.remove_formula(formula_name)
+
+    assert ComparisonCounter.comparison_count <= 10 * FORMULA_NUMBER
+
+
+def test_get_corresponding_formula_return_formulas_whose_id_starts_with_the_given_id():
+    service = FormulaNameService()
+    service.add(('a', 'b'), 'f1')
+    service.add(('a', 'c'), 'f2')
+    service.add(('d', 'b'), 'f3')
+    assert service.get_corresponding_formula(['a']) == ['f1', 'f2']
+    assert service.get_corresponding_formula(['d']) == ['f3']
+
+
+def test_get_corresponding_formula_does_not_return_removed_formula():
+    service = FormulaNameService()
+    service.add(('a', 'b'), 'f1')
+    service.add(('a', 'c'), 'f2')
+    service.remove_formula('f1')
+    assert service.get_corresponding_formula(['a']) == ['f2']
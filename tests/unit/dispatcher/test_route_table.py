@@ -0,0 +1,111 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+
+from powerapi.dispatch_rule import DispatchRule
+from powerapi.dispatcher import RouteTable
+from powerapi.dispatcher.route_table import PrimaryDispatchRuleRuleAlreadyDefinedException
+from powerapi.report import Report
+
+
+class Report1(Report):
+    """ fake report """
+
+
+class Report1Child(Report1):
+    """ fake report that inherit from Report1 """
+
+
+class Report2(Report):
+    """ other fake report """
+
+
+class FakeDispatchRule(DispatchRule):
+    """ dispatch rule with configurable fields """
+    def __init__(self, fields, primary=False):
+        DispatchRule.__init__(self, primary)
+        self.fields = fields
+
+    def get_formula_id(self, report):
+        return []
+
+
+def gen_report(report_class):
+    return report_class(0, 'sensor', 'target')
+
+
+def test_get_dispatch_rule_of_report_without_rule_return_None():
+    route_table = RouteTable()
+    route_table.dispatch_rule(Report1, FakeDispatchRule(['A'], primary=True))
+    assert route_table.get_dispatch_rule(gen_report(Report2)) is None
+
+
+def test_get_dispatch_rule_of_report_subclass_return_rule_of_parent_class():
+    route_table = RouteTable()
+    rule = FakeDispatchRule(['A'], primary=True)
+    route_table.dispatch_rule(Report1, rule)
+    assert route_table.get_dispatch_rule(gen_report(Report1Child)) is rule
+    assert route_table.get_dispatch_rule(gen_report(Report1Child)) is rule
+
+
+def test_get_dispatch_rule_return_first_defined_matching_rule():
+    route_table = RouteTable()
+    parent_rule = FakeDispatchRule(['A'], primary=True)
+    child_rule = FakeDispatchRule(['A'])
+    route_table.dispatch_rule(Report1, parent_rule)
+    route_table.dispatch_rule(Report1Child, child_rule)
+    assert route_table.get_dispatch_rule(gen_report(Report1Child)) is parent_rule
+
+
+def test_define_dispatch_rule_after_a_lookup_is_used_by_next_lookups():
+    route_table = RouteTable()
+    route_table.dispatch_rule(Report1, FakeDispatchRule(['A'], primary=True))
+    assert route_table.get_dispatch_rule(gen_report(Report2)) is None
+
+    rule = FakeDispatchRule(['A'])
+    route_table.dispatch_rule(Report2, rule)
+    assert route_table.get_dispatch_rule(gen_report(Report2)) is rule
+
+
+def test_define_two_primary_dispatch_rules_raise_exception():
+    route_table = RouteTable()
+    route_table.dispatch_rule(Report1, FakeDispatchRule(['A'], primary=True))
+    with pytest.raises(PrimaryDispatchRuleRuleAlreadyDefinedException):
+        route_table.dispatch_rule(Report2, FakeDispatchRule(['A'], primary=True))
+
+
+@pytest.mark.parametrize('fields, expected_length', [(['A', 'B', 'C'], 3), (['A', 'B'], 2), (['A', 'D', 'C'], 1),
+                                                     (['D'], 0)])
+def test_get_formula_id_prefix_length_return_number_of_leading_fields_equal_to_primary_rule_fields(fields,
+                                                                                                  expected_length):
+    route_table = RouteTable()
+    route_table.dispatch_rule(Report1, FakeDispatchRule(['A', 'B', 'C'], primary=True))
+    rule = FakeDispatchRule(fields)
+    route_table.dispatch_rule(Report2, rule)
+    assert route_table.get_formula_id_prefix_length(rule) == expected_length
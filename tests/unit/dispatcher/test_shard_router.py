@@ -0,0 +1,167 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pickle
+from unittest.mock import patch
+
+import pytest
+
+from powerapi.dispatch_rule import DispatchRule
+from powerapi.dispatcher import RouteTable, ShardRouter
+from powerapi.dispatcher.shard_router import ShardRouterException
+from powerapi.filter import Filter
+from powerapi.report import Report
+
+
+class CoreReport(Report):
+    """ fake report with a formula id per core """
+    def __init__(self, sensor, cores):
+        Report.__init__(self, 0, sensor, 'target')
+        self.cores = cores
+
+
+class SocketReport(Report):
+    """ fake report with a formula id per socket """
+    def __init__(self, sensor, socket):
+        Report.__init__(self, 0, sensor, 'target')
+        self.socket = socket
+
+
+class OtherReport(Report):
+    """ fake report without dispatch rule """
+
+
+class CoreDispatchRule(DispatchRule):
+    """ primary rule : (sensor, socket, core) """
+    def __init__(self):
+        DispatchRule.__init__(self, primary=True)
+        self.fields = ['SENSOR', 'SOCKET', 'CORE']
+
+    def get_formula_id(self, report):
+        return [(report.sensor, socket, core) for socket, core in report.cores]
+
+
+class SocketDispatchRule(DispatchRule):
+    """ secondary rule : (sensor, socket) """
+    def __init__(self):
+        DispatchRule.__init__(self, primary=False)
+        self.fields = ['SENSOR', 'SOCKET']
+
+    def get_formula_id(self, report):
+        return [(report.sensor, report.socket)]
+
+
+@pytest.fixture
+def route_table():
+    table = RouteTable()
+    table.dispatch_rule(CoreReport, CoreDispatchRule())
+    table.dispatch_rule(SocketReport, SocketDispatchRule())
+    return table
+
+
+def test_create_router_with_zero_shard_raise_ShardRouterException(route_table):
+    with pytest.raises(ShardRouterException):
+        ShardRouter(route_table, 0)
+
+
+def test_create_router_without_primary_dispatch_rule_raise_ShardRouterException():
+    with pytest.raises(ShardRouterException):
+        ShardRouter(RouteTable(), 2)
+
+
+def test_get_filter_rule_of_unknown_shard_raise_ShardRouterException(route_table):
+    with pytest.raises(ShardRouterException):
+        ShardRouter(route_table, 2).filter_rule(2)
+
+
+def test_report_with_primary_formula_id_is_routed_to_the_shard_owning_its_id(route_table):
+    router = ShardRouter(route_table, 4)
+    report = CoreReport('sensor', [(0, 1)])
+    assert router.get_shards(report) == {router.get_shard(('sensor', 0, 1))}
+
+
+def test_report_with_several_formula_ids_is_routed_to_the_shards_owning_its_ids(route_table):
+    router = ShardRouter(route_table, 4)
+    cores = [(socket, core) for socket in range(2) for core in range(8)]
+    expected = {router.get_shard(('sensor', socket, core)) for socket, core in cores}
+    assert router.get_shards(CoreReport('sensor', cores)) == expected
+
+
+def test_report_with_partial_formula_id_is_routed_to_every_shard(route_table):
+    router = ShardRouter(route_table, 4)
+    assert router.get_shards(SocketReport('sensor', 0)) == {0, 1, 2, 3}
+
+
+def test_report_without_dispatch_rule_is_routed_to_every_shard(route_table):
+    router = ShardRouter(route_table, 3)
+    assert router.get_shards(OtherReport(0, 'sensor', 'target')) == {0, 1, 2}
+
+
+def test_formula_ids_are_spread_over_every_shard(route_table):
+    router = ShardRouter(route_table, 4)
+    owners = [router.get_shard(('sensor' + str(i), 0, 0)) for i in range(1000)]
+    for shard in range(4):
+        assert owners.count(shard) > 100
+
+
+def test_adding_a_shard_only_move_formula_ids_to_the_new_shard(route_table):
+    ids = [('sensor' + str(i), 0, 0) for i in range(1000)]
+    router = ShardRouter(route_table, 4)
+    bigger_router = ShardRouter(route_table, 5)
+    moved = [formula_id for formula_id in ids if router.get_shard(formula_id) != bigger_router.get_shard(formula_id)]
+    assert all(bigger_router.get_shard(formula_id) == 4 for formula_id in moved)
+    assert len(moved) < 400
+
+
+def test_unpickled_router_route_formula_ids_to_the_same_shards(route_table):
+    router = ShardRouter(route_table, 4)
+    router.get_shards(CoreReport('sensor', [(0, 0)]))
+    copy = pickle.loads(pickle.dumps(router))
+    for i in range(100):
+        formula_id = ('sensor', 0, i)
+        assert copy.get_shard(formula_id) == router.get_shard(formula_id)
+
+
+def test_filter_with_shard_rules_route_report_to_its_shard_dispatchers(route_table):
+    router = ShardRouter(route_table, 3)
+    report_filter = Filter()
+    for shard in range(3):
+        report_filter.filter(router.filter_rule(shard), 'dispatcher' + str(shard))
+
+    report = CoreReport('sensor', [(0, 2)])
+    assert report_filter.route(report) == ['dispatcher' + str(router.get_shard(('sensor', 0, 2)))]
+    assert report_filter.route(SocketReport('sensor', 0)) == ['dispatcher0', 'dispatcher1', 'dispatcher2']
+
+
+def test_shard_rules_extract_formula_ids_once_per_report(route_table):
+    router = ShardRouter(route_table, 3)
+    report = CoreReport('sensor', [(0, 2)])
+    with patch.object(route_table, 'get_dispatch_rule', wraps=route_table.get_dispatch_rule) as get_dispatch_rule:
+        for shard in range(3):
+            router.filter_rule(shard)(report)
+    assert get_dispatch_rule.call_count == 1
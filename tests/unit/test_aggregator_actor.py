@@ -0,0 +1,134 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from datetime import datetime
+
+import pytest
+from mock import Mock
+
+from thespian.actors import ActorExitRequest
+
+from powerapi.actor import InitializationException
+from powerapi.aggregator import AggregatorActor
+from powerapi.message import AggregatorStartMessage, EndMessage, ReportBatch, FlowControlMessage, AckMessage
+from powerapi.report import PowerReport
+
+
+def gen_aggregator(window_length=10, tags=[], pushers=None):
+    """
+    return a started AggregatorActor, not bound to any actor system, its send method is mocked
+    """
+    aggregator = AggregatorActor()
+    aggregator.send = Mock()
+    aggregator._myRef = Mock(address='aggregator_address')
+    aggregator._initialization(AggregatorStartMessage('system', 'aggregator', {'pusher': 'pusher_address'} if pushers is None else pushers,
+                                                      window_length, tags))
+    return aggregator
+
+
+def gen_power_report(timestamp, power, target='target', socket=0, sensor='sensor'):
+    return PowerReport(datetime.fromtimestamp(timestamp), sensor, target, power, {'socket': socket, 'ratio': power / 100})
+
+
+def get_sent_reports(aggregator, address='pusher_address'):
+    return [report for pusher, message in (call.args for call in aggregator.send.call_args_list)
+            if pusher == address and isinstance(message, ReportBatch) for report in message.reports]
+
+
+@pytest.mark.parametrize('window_length, pushers', [(0, None), (10, {})])
+def test_initialize_aggregator_with_wrong_parameters_raise_InitializationException(window_length, pushers):
+    with pytest.raises(InitializationException):
+        gen_aggregator(window_length, pushers=pushers)
+
+
+def test_aggregator_send_one_aggregated_report_per_window_to_all_the_pushers():
+    aggregator = gen_aggregator(pushers={'a': 'pusher_a', 'b': 'pusher_b'})
+    aggregator.receiveMessage(ReportBatch('formula', [gen_power_report(100, 10), gen_power_report(105, 30)]), 'formula_address')
+    assert not get_sent_reports(aggregator, 'pusher_a')
+
+    aggregator.receiveMessage(gen_power_report(110, 50), 'formula_address')
+
+    for address in ('pusher_a', 'pusher_b'):
+        [report] = get_sent_reports(aggregator, address)
+        assert (report.timestamp, report.sensor, report.target, report.power) == (datetime.fromtimestamp(100), 'sensor', 'target', 20)
+        assert report.metadata == {'min_power': 10, 'max_power': 30, 'energy': 10 * 5 + 30 * 5, 'sample_count': 2}
+
+
+def test_aggregator_aggregate_reports_separately_for_each_target_and_tag_values():
+    aggregator = gen_aggregator(tags=['socket'])
+    for target, socket, power in [('t1', 0, 10), ('t1', 1, 20), ('t2', 0, 30), ('t1', 0, 50)]:
+        aggregator.receiveMessage(gen_power_report(100, power, target, socket), 'formula_address')
+    aggregator.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+
+    reports = get_sent_reports(aggregator)
+    assert sorted((report.target, report.metadata['socket'], report.power) for report in reports) == \
+        [('t1', 0, 30), ('t1', 1, 20), ('t2', 0, 30)]
+
+
+def test_aggregator_aggregate_reports_with_unhashable_tag_values():
+    aggregator = gen_aggregator(tags=['socket'])
+    for socket, power in [([0, 1], 10), ({'id': 2}, 20), ([0, 1], 30)]:
+        aggregator.receiveMessage(gen_power_report(100, power, socket=socket), 'formula_address')
+    aggregator.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+
+    reports = get_sent_reports(aggregator)
+    assert sorted((str(report.metadata['socket']), report.power) for report in reports) == [('[0, 1]', 20), ("{'id': 2}", 20)]
+
+
+def test_aggregator_does_not_drop_reports_of_a_sensor_lagging_behind_another_one():
+    aggregator = gen_aggregator()
+    aggregator.receiveMessage(gen_power_report(100, 10, sensor='sensor_a'), 'formula_address')
+    aggregator.receiveMessage(gen_power_report(150, 10, sensor='sensor_b'), 'formula_address')
+    aggregator.receiveMessage(gen_power_report(105, 30, sensor='sensor_a'), 'formula_address')
+    aggregator.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+
+    reports = get_sent_reports(aggregator)
+    assert sorted((report.sensor, report.power) for report in reports) == [('sensor_a', 20), ('sensor_b', 10)]
+    assert aggregator.window_aggregator.late_count == 0
+
+
+def test_aggregator_acknowledge_reports_once_aggregated():
+    aggregator = gen_aggregator()
+    aggregator.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+    aggregator.receiveMessage(gen_power_report(100, 10), 'formula_address')
+
+    address, message = aggregator.send.call_args.args
+    assert address == 'formula_address'
+    assert isinstance(message, AckMessage)
+
+
+def test_aggregator_send_open_windows_and_forward_EndMessage_to_pushers_before_exiting():
+    aggregator = gen_aggregator()
+    aggregator.receiveMessage(gen_power_report(100, 10), 'formula_address')
+
+    aggregator.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+
+    messages = [call.args for call in aggregator.send.call_args_list]
+    assert isinstance(messages[0][1], ReportBatch) and messages[0][1].reports[0].power == 10
+    assert messages[1][0] == 'pusher_address' and isinstance(messages[1][1], EndMessage)
+    assert isinstance(messages[2][1], ActorExitRequest)
@@ -0,0 +1,128 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import datetime
+
+import numpy as np
+import pytest
+from mock import Mock
+
+from powerapi.formula import BatchFormulaActor, CpuDramDomainValues, FormulaValues
+from powerapi.message import FormulaStartMessage, ReportBatch
+from powerapi.report import HWPCReport, PowerReport
+
+
+class EnergyBatchFormula(BatchFormulaActor):
+    """
+    formula that estimates the power as the value of the RAPL_ENERGY_PKG event, it records the matrices it receives
+    """
+    def __init__(self):
+        BatchFormulaActor.__init__(self, FormulaStartMessage)
+        self.calls = []
+
+    def compute_power(self, counters, events):
+        self.calls.append((counters, events))
+        return counters[:, events.index(('rapl', 'RAPL_ENERGY_PKG'))]
+
+
+def gen_report(target, groups):
+    return HWPCReport(datetime.datetime.fromtimestamp(0), 'sensor', target, groups)
+
+
+def gen_formula(formula_id=('sensor', '0')):
+    """
+    return a started EnergyBatchFormula, not bound to any actor system, its send method is mocked
+    """
+    formula = EnergyBatchFormula()
+    formula.send = Mock()
+    formula.receiveMessage(FormulaStartMessage('dispatcher', 'formula', FormulaValues({'pusher': 'pusher_address'}),
+                                               CpuDramDomainValues('device', formula_id)), 'dispatcher_address')
+    formula.send.reset_mock()
+    return formula
+
+
+REPORT_A = gen_report('a', {'rapl': {'0': {'0': {'RAPL_ENERGY_PKG': 10}}, '1': {'0': {'RAPL_ENERGY_PKG': 100}}},
+                            'msr': {'0': {'0': {'APERF': 1}, '1': {'APERF': 2}}}})
+REPORT_B = gen_report('b', {'rapl': {'0': {'0': {'RAPL_ENERGY_PKG': 20}}}})
+
+
+def test_build_counter_matrix_sum_counters_of_the_formula_socket():
+    formula = gen_formula()
+    events, counters = formula.build_counter_matrix([REPORT_A, REPORT_B])
+    assert events == [('msr', 'APERF'), ('rapl', 'RAPL_ENERGY_PKG')]
+    assert np.array_equal(counters, np.array([[3, 10], [0, 20]]))
+
+
+def test_build_counter_matrix_of_core_formula_only_keep_counters_of_its_core():
+    formula = gen_formula(('sensor', '0', '1'))
+    events, counters = formula.build_counter_matrix([REPORT_A])
+    assert events == [('msr', 'APERF')]
+    assert np.array_equal(counters, np.array([[2]]))
+
+
+def test_send_ReportBatch_to_batch_formula_compute_all_powers_in_one_call_and_push_one_ReportBatch():
+    formula = gen_formula()
+    formula.receiveMessage(ReportBatch('dispatcher', [REPORT_A, REPORT_B]), 'dispatcher_address')
+
+    assert len(formula.calls) == 1
+    formula.send.assert_called_once()
+    address, message = formula.send.call_args.args
+    assert address == 'pusher_address'
+    assert isinstance(message, ReportBatch)
+    assert [(report.target, report.power) for report in message.reports] == [('a', 10), ('b', 20)]
+    assert all(isinstance(report, PowerReport) and report.metadata['socket'] == 0 for report in message.reports)
+
+
+def test_send_Report_to_batch_formula_push_one_PowerReport():
+    formula = gen_formula()
+    formula.receiveMessage(REPORT_B, 'dispatcher_address')
+
+    address, message = formula.send.call_args.args
+    assert address == 'pusher_address'
+    assert isinstance(message, PowerReport)
+    assert message.power == 20
+
+
+def test_compute_power_of_BatchFormulaActor_is_abstract():
+    with pytest.raises(NotImplementedError):
+        BatchFormulaActor(FormulaStartMessage).compute_power(np.zeros((1, 1)), [('rapl', 'RAPL_ENERGY_PKG')])
+
+
+def test_batch_formula_with_freshness_budget_compute_power_of_fresh_reports_only():
+    formula = EnergyBatchFormula()
+    formula.send = Mock()
+    formula.receiveMessage(FormulaStartMessage('dispatcher', 'formula', FormulaValues({'pusher': 'pusher_address'}, freshness_budget=1),
+                                               CpuDramDomainValues('device', ('sensor', '0'))), 'dispatcher_address')
+    stale_report = HWPCReport(datetime.datetime.fromtimestamp(0), 'sensor', 'a', REPORT_A.groups)
+    fresh_report = HWPCReport(datetime.datetime.fromtimestamp(10), 'sensor', 'b', REPORT_B.groups)
+
+    formula.receiveMessage(ReportBatch('dispatcher', [stale_report, fresh_report]), 'dispatcher_address')
+
+    assert len(formula.calls) == 1
+    assert formula.calls[0][0].shape[0] == 1
+    assert formula.stale_report_count == 1
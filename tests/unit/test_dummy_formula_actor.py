@@ -26,13 +26,17 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import datetime
+
 import pytest
+from mock import Mock
 
 from thespian.actors import ActorExitRequest
 
 from powerapi.formula.dummy import DummyFormulaActor, DummyFormulaValues
 from powerapi.formula import CpuDramDomainValues
-from powerapi.message import StartMessage, FormulaStartMessage, ErrorMessage, EndMessage, OKMessage
+from powerapi.message import StartMessage, FormulaStartMessage, ErrorMessage, EndMessage, OKMessage, ReportBatch, FlowControlMessage, \
+    AckMessage, GetFormulaStatsMessage, FormulaStatsMessage
 from powerapi.report import Report, PowerReport
 from powerapi.test_utils.abstract_test import AbstractTestActor, recv_from_pipe
 from powerapi.test_utils.actor import system
@@ -63,3 +67,80 @@ class TestDummyFormula(AbstractTestActor):
         _, msg = recv_from_pipe(dummy_pipe_out, 2)
         assert isinstance(msg, PowerReport)
         assert msg.power == 42
+
+
+def gen_report(second):
+    return Report(datetime.datetime.fromtimestamp(second), 'sensor', 'target')
+
+
+def gen_formula_with_freshness_budget(freshness_budget):
+    """
+    return a started DummyFormulaActor that does not sleep, not bound to any actor system, its send method is mocked
+    """
+    formula = DummyFormulaActor()
+    formula.send = Mock()
+    formula.receiveMessage(FormulaStartMessage('dispatcher', 'formula', DummyFormulaValues({'pusher': 'pusher_address'}, 0, freshness_budget),
+                                               CpuDramDomainValues('device', ('sensor', 0))), 'dispatcher_address')
+    formula.send.reset_mock()
+    return formula
+
+
+def get_pushed_timestamps(formula):
+    timestamps = []
+    for _, message in (call.args for call in formula.send.call_args_list):
+        reports = message.reports if isinstance(message, ReportBatch) else [message]
+        timestamps += [report.timestamp.timestamp() for report in reports if isinstance(report, PowerReport)]
+    return timestamps
+
+
+def test_formula_with_freshness_budget_skip_reports_of_a_batch_lagging_its_newest_report():
+    formula = gen_formula_with_freshness_budget(2)
+    formula.receiveMessage(ReportBatch('dispatcher', [gen_report(second) for second in range(10)]), 'dispatcher_address')
+
+    assert get_pushed_timestamps(formula) == [7, 8, 9]
+    assert formula.stale_report_count == 7
+
+
+def test_formula_with_freshness_budget_skip_report_older_than_the_newest_received_one():
+    formula = gen_formula_with_freshness_budget(2)
+    for second in (10, 5, 9, 12):
+        formula.receiveMessage(gen_report(second), 'dispatcher_address')
+
+    assert get_pushed_timestamps(formula) == [10, 9, 12]
+    assert formula.stale_report_count == 1
+
+
+def test_formula_without_freshness_budget_process_all_reports():
+    formula = gen_formula_with_freshness_budget(None)
+    formula.receiveMessage(ReportBatch('dispatcher', [gen_report(0), gen_report(100)]), 'dispatcher_address')
+    formula.receiveMessage(gen_report(1), 'dispatcher_address')
+
+    assert get_pushed_timestamps(formula) == [0, 100, 1]
+    assert formula.stale_report_count == 0
+
+
+def test_send_GetFormulaStatsMessage_to_formula_make_it_answer_its_stale_report_count():
+    formula = gen_formula_with_freshness_budget(2)
+    formula.receiveMessage(ReportBatch('dispatcher', [gen_report(second) for second in range(10)]), 'dispatcher_address')
+    formula.send.reset_mock()
+
+    formula.receiveMessage(GetFormulaStatsMessage('system'), 'system_address')
+
+    address, answer = formula.send.call_args.args
+    assert address == 'system_address'
+    assert isinstance(answer, FormulaStatsMessage)
+    assert answer.stale_report_count == 7
+
+
+def test_formula_acknowledge_skipped_stale_report_to_sender_that_asked_for_it():
+    formula = gen_formula_with_freshness_budget(2)
+    formula.receiveMessage(FlowControlMessage('dispatcher'), 'dispatcher_address')
+    formula.receiveMessage(gen_report(10), 'dispatcher_address')
+    formula.send.reset_mock()
+
+    formula.receiveMessage(gen_report(1), 'dispatcher_address')
+
+    formula.send.assert_called_once()
+    address, message = formula.send.call_args.args
+    assert address == 'dispatcher_address'
+    assert isinstance(message, AckMessage) and message.count == 1
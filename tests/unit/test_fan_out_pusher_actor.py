@@ -0,0 +1,175 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from threading import Event
+
+import pytest
+from mock import Mock
+
+from thespian.actors import WakeupMessage
+
+from powerapi.actor import InitializationException
+from powerapi.database import DBError
+from powerapi.fan_out_pusher import FanOutPusherActor
+from powerapi.message import FanOutPusherStartMessage, PusherStartMessage, EndMessage, ReportBatch, FlowControlMessage, \
+    AckMessage, GetPusherStatsMessage, PusherStatsMessage
+from powerapi.pusher import WRITE_WAKEUP, LINGER_WAKEUP, SPILL_WAKEUP
+from powerapi.test_utils.report.power import POWER_REPORT_1
+
+
+def gen_fan_out_pusher(outputs):
+    """
+    return a started FanOutPusherActor, not bound to any actor system, that saves reports to the given outputs
+    its send and wakeupAfter methods are mocked
+
+    :param outputs: dict {output name: PusherStartMessage}
+    """
+    pusher = FanOutPusherActor()
+    pusher.send = Mock()
+    pusher.wakeupAfter = Mock()
+    pusher._myRef = Mock(address='pusher_address')
+    pusher._initialization(FanOutPusherStartMessage('system', 'fan_out_pusher', outputs))
+    pusher.parent = 'supervisor_address'
+    return pusher
+
+
+def gen_output(name, batch_size=1, database=None, spill_directory=None):
+    return PusherStartMessage('system', name, Mock() if database is None else database, batch_size, 0.1,
+                              spill_directory=spill_directory)
+
+
+def get_saved_batches(pusher, output_name):
+    return [call.args[0] for call in pusher.outputs[output_name].database.save_many.call_args_list]
+
+
+def get_acknowledgments(pusher):
+    return [(address, message.count) for address, message in (call.args for call in pusher.send.call_args_list)
+            if isinstance(message, AckMessage)]
+
+
+@pytest.mark.parametrize('batch_size, shared_spill_directory', [(0, False), (1, True)])
+def test_initialize_fan_out_pusher_with_wrong_output_parameters_raise_InitializationException(tmp_path, batch_size, shared_spill_directory):
+    spill_directory = str(tmp_path)
+    with pytest.raises(InitializationException):
+        gen_fan_out_pusher({'a': gen_output('a', spill_directory=spill_directory),
+                            'b': gen_output('b', batch_size, spill_directory=spill_directory if shared_spill_directory else None)})
+
+
+def test_initialize_fan_out_pusher_with_a_database_that_crash_when_connected_raise_InitializationException():
+    database = Mock()
+    database.connect.side_effect = DBError('connection refused')
+    with pytest.raises(InitializationException):
+        gen_fan_out_pusher({'a': gen_output('a'), 'b': gen_output('b', database=database)})
+
+
+def test_fan_out_pusher_save_each_received_report_to_all_the_databases():
+    pusher = gen_fan_out_pusher({'a': gen_output('a'), 'b': gen_output('b')})
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+
+    for output_name in ('a', 'b'):
+        assert get_saved_batches(pusher, output_name) == [[POWER_REPORT_1], [POWER_REPORT_1, POWER_REPORT_1]]
+    assert isinstance(pusher.send.call_args_list[0].args[1], EndMessage)
+
+
+def test_fan_out_pusher_buffer_reports_independently_for_each_database():
+    pusher = gen_fan_out_pusher({'a': gen_output('a', batch_size=3), 'b': gen_output('b', batch_size=2)})
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    pusher.outputs['b'].writer.close()
+
+    assert not get_saved_batches(pusher, 'a')
+    assert get_saved_batches(pusher, 'b') == [[POWER_REPORT_1, POWER_REPORT_1]]
+    assert pusher.wakeupAfter.call_args_list[0].args[1] == (LINGER_WAKEUP, 'a')
+
+    # the buffer of database a waited for the linger time when the pusher is woken up
+    pusher.outputs['a'].report_batcher.linger_time = 0
+    pusher.receiveMessage(WakeupMessage(None, (LINGER_WAKEUP, 'a')), 'pusher_address')
+    pusher.outputs['a'].writer.close()
+
+    assert get_saved_batches(pusher, 'a') == [[POWER_REPORT_1, POWER_REPORT_1]]
+
+
+def test_fan_out_pusher_acknowledge_a_message_once_its_reports_are_saved_to_all_the_databases():
+    release_save = Event()
+    slow_database = Mock()
+    slow_database.save_many.side_effect = lambda _: release_save.wait(5)
+    pusher = gen_fan_out_pusher({'slow': gen_output('slow', database=slow_database), 'fast': gen_output('fast')})
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.outputs['fast'].writer.close()
+
+    pusher.receiveMessage(WakeupMessage(None, (WRITE_WAKEUP, 'fast')), 'pusher_address')
+    assert get_saved_batches(pusher, 'fast') == [[POWER_REPORT_1]]
+    assert not get_acknowledgments(pusher)
+
+    release_save.set()
+    pusher.outputs['slow'].writer.close()
+    pusher.receiveMessage(WakeupMessage(None, (WRITE_WAKEUP, 'slow')), 'pusher_address')
+
+    assert get_acknowledgments(pusher) == [('formula_address', 1)]
+
+
+def test_send_GetPusherStatsMessage_to_fan_out_pusher_make_it_answer_statistics_summed_over_the_databases():
+    failing_database = Mock()
+    failing_database.save_many.side_effect = DBError('database down')
+    pusher = gen_fan_out_pusher({'a': gen_output('a'), 'b': gen_output('b', database=failing_database)})
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    for output in pusher.outputs.values():
+        output.writer.close()
+
+    pusher.receiveMessage(GetPusherStatsMessage('system'), 'system_address')
+
+    address, stats = pusher.send.call_args.args
+    assert address == 'system_address'
+    assert isinstance(stats, PusherStatsMessage)
+    assert (stats.queue_depth, stats.write_count, stats.written_report_count, stats.write_error_count) == (0, 2, 2, 1)
+
+
+def test_fan_out_pusher_spill_the_reports_of_a_failing_database_and_replay_them_once_it_recovers(tmp_path):
+    failing_database = Mock()
+    failing_database.save_many.side_effect = [DBError('database down'), None]
+    pusher = gen_fan_out_pusher({'a': gen_output('a'), 'b': gen_output('b', database=failing_database, spill_directory=str(tmp_path))})
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    for output in pusher.outputs.values():
+        output.writer.close()
+    pusher.receiveMessage(WakeupMessage(None, (WRITE_WAKEUP, 'a')), 'pusher_address')
+    pusher.receiveMessage(WakeupMessage(None, (WRITE_WAKEUP, 'b')), 'pusher_address')
+
+    assert get_saved_batches(pusher, 'a') == [[POWER_REPORT_1, POWER_REPORT_1]]
+    assert pusher.outputs['b'].spill_queue.report_count == 2
+    assert get_acknowledgments(pusher) == [('formula_address', 1)]
+    assert (SPILL_WAKEUP, 'b') in [call.args[1] for call in pusher.wakeupAfter.call_args_list]
+
+    pusher.outputs['b'].writer.start()
+    pusher.receiveMessage(WakeupMessage(None, (SPILL_WAKEUP, 'b')), 'pusher_address')
+    pusher.outputs['b'].writer.close()
+
+    assert get_saved_batches(pusher, 'b')[-1] == [POWER_REPORT_1, POWER_REPORT_1]
+    assert pusher.outputs['b'].spill_queue.is_empty()
@@ -0,0 +1,164 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import datetime
+
+import pytest
+from mock import Mock, patch
+
+from powerapi.formula import AbstractCpuDramFormula, CpuDramDomainValues, FormulaValues, FormulaStateStore, \
+    FormulaStateStoreException
+from powerapi.message import FormulaStartMessage, ReportBatch, EndMessage, SaveFormulaStateMessage
+from powerapi.report import HWPCReport
+
+FORMULA_ID = ('sensor', '0')
+
+
+class CountingFormula(AbstractCpuDramFormula):
+    """
+    formula whose state is the number of reports it received
+    """
+    def __init__(self):
+        AbstractCpuDramFormula.__init__(self, FormulaStartMessage)
+        self.report_count = 0
+
+    def receiveMsg_HWPCReport(self, _, __):
+        self.report_count += 1
+
+    def snapshot_state(self):
+        return {'report_count': self.report_count}
+
+    def restore_state(self, state):
+        self.report_count = state['report_count']
+
+
+def gen_report():
+    return HWPCReport(datetime.datetime.fromtimestamp(0), 'sensor', 'target', {})
+
+
+def gen_formula(state_store, snapshot_period=None, state=None):
+    """
+    return a started CountingFormula, not bound to any actor system, its send method is mocked
+    """
+    formula = CountingFormula()
+    formula.send = Mock()
+    formula._myRef = Mock(address='formula_address')
+    domain_values = CpuDramDomainValues('device', FORMULA_ID)
+    domain_values.state = state
+    formula.receiveMessage(FormulaStartMessage('dispatcher', 'formula', FormulaValues({}, state_store, snapshot_period),
+                                               domain_values), 'dispatcher_address')
+    return formula
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    return FormulaStateStore(str(tmp_path / 'states'))
+
+
+def test_load_state_of_unknown_formula_return_None(state_store):
+    assert state_store.load(FORMULA_ID) is None
+
+
+def test_saved_state_is_loaded_with_the_same_formula_id_only(state_store):
+    state_store.save(FORMULA_ID, {'report_count': 3})
+    state_store.save(('sensor', '1'), {'report_count': 4})
+
+    assert state_store.load(FORMULA_ID) == {'report_count': 3}
+    assert state_store.load(('sensor', '1')) == {'report_count': 4}
+    assert FormulaStateStore(state_store.directory).load(FORMULA_ID) == {'report_count': 3}
+
+
+def test_removed_state_is_not_loaded_anymore(state_store):
+    state_store.save(FORMULA_ID, {'report_count': 3})
+    state_store.remove(FORMULA_ID)
+    state_store.remove(FORMULA_ID)
+    assert state_store.load(FORMULA_ID) is None
+
+
+def test_load_corrupted_state_raise_FormulaStateStoreException(state_store):
+    state_store.save(FORMULA_ID, {'report_count': 3})
+    with open(state_store._get_path(FORMULA_ID), 'wb') as state_file:
+        state_file.write(b'not a pickle')
+    with pytest.raises(FormulaStateStoreException):
+        state_store.load(FORMULA_ID)
+
+
+def test_save_state_that_can_not_be_pickled_raise_FormulaStateStoreException(state_store):
+    with pytest.raises(FormulaStateStoreException):
+        state_store.save(FORMULA_ID, lambda: None)
+
+
+def test_formula_started_with_a_state_restore_it(state_store):
+    formula = gen_formula(state_store, state={'report_count': 5})
+    formula.receiveMessage(gen_report(), 'dispatcher_address')
+    assert formula.report_count == 6
+
+
+def test_formula_save_its_state_when_receiving_EndMessage(state_store):
+    formula = gen_formula(state_store)
+    formula.receiveMessage(gen_report(), 'dispatcher_address')
+    assert state_store.load(FORMULA_ID) is None
+
+    formula.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+    assert state_store.load(FORMULA_ID) == {'report_count': 1}
+
+
+def test_formula_save_its_state_when_receiving_SaveFormulaStateMessage(state_store):
+    formula = gen_formula(state_store)
+    formula.receiveMessage(gen_report(), 'dispatcher_address')
+    formula.receiveMessage(SaveFormulaStateMessage('dispatcher'), 'dispatcher_address')
+    assert state_store.load(FORMULA_ID) == {'report_count': 1}
+
+
+def test_formula_with_snapshot_period_save_its_state_after_a_report_batch_once_the_period_elapsed(state_store):
+    with patch('powerapi.formula.formula_actor.time.monotonic', return_value=100):
+        formula = gen_formula(state_store, snapshot_period=10)
+        formula.receiveMessage(gen_report(), 'dispatcher_address')
+    assert state_store.load(FORMULA_ID) is None
+
+    with patch('powerapi.formula.formula_actor.time.monotonic', return_value=110), \
+            patch.object(state_store, 'save', wraps=state_store.save) as save:
+        formula.receiveMessage(ReportBatch('dispatcher', [gen_report(), gen_report()]), 'dispatcher_address')
+        formula.receiveMessage(gen_report(), 'dispatcher_address')
+    save.assert_called_once_with(FORMULA_ID, {'report_count': 3})
+
+
+def test_formula_that_can_not_save_its_state_keep_running(state_store):
+    state_store.save = Mock(side_effect=FormulaStateStoreException('disk full'))
+    formula = gen_formula(state_store)
+    formula.receiveMessage(SaveFormulaStateMessage('dispatcher'), 'dispatcher_address')
+    formula.receiveMessage(gen_report(), 'dispatcher_address')
+    assert formula.report_count == 1
+
+
+def test_formula_without_state_store_do_not_save_its_state():
+    formula = gen_formula(None, snapshot_period=0)
+    formula.snapshot_state = Mock()
+    formula.receiveMessage(gen_report(), 'dispatcher_address')
+    formula.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+    formula.snapshot_state.assert_not_called()
@@ -0,0 +1,151 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from mock import Mock, patch
+
+from thespian.actors import ActorExitRequest, ChildActorExited, PoisonMessage
+
+from powerapi.formula import FormulaValues, DomainValues, FormulaWorkerActor, HostedFormulaAddress
+from powerapi.formula.simple_formula_actor import SimpleFormulaActor
+from powerapi.message import FormulaWorkerStartMessage, FormulaStartMessage, HostedFormulaMessage, OKMessage, EndMessage, \
+    FlowControlMessage, AckMessage, HostedFormulaMessageBatch
+from powerapi.report import PowerReport
+
+
+def gen_worker():
+    """
+    return a started FormulaWorkerActor hosting SimpleFormulaActor, not bound to any actor system
+    its parent is 'dispatcher_address' and its send method is mocked
+    """
+    worker = FormulaWorkerActor()
+    worker._myRef = Mock(address='worker_address')
+    worker.send = Mock()
+    worker.receiveMessage(FormulaWorkerStartMessage('dispatcher', 'worker', SimpleFormulaActor), 'dispatcher_address')
+    worker.send.reset_mock()
+    return worker
+
+
+def start_formula(worker, formula_name):
+    start_message = FormulaStartMessage('dispatcher', formula_name, FormulaValues({'pusher': 'pusher_address'}),
+                                        DomainValues('test_device', ('test_sensor',)))
+    worker.receiveMessage(HostedFormulaMessage('dispatcher', formula_name, start_message), 'dispatcher_address')
+
+
+def get_sent_messages(worker):
+    return [call.args for call in worker.send.call_args_list]
+
+
+def test_start_hosted_formula_make_worker_send_wrapped_OKMessage_to_dispatcher():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+
+    assert list(worker.formulas) == ['formula0']
+    address, message = worker.send.call_args.args
+    assert address == 'dispatcher_address'
+    assert isinstance(message, HostedFormulaMessage)
+    assert message.formula_name == 'formula0'
+    assert isinstance(message.message, OKMessage)
+
+
+def test_hosted_formula_send_its_reports_directly_to_the_pusher():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+    report = PowerReport.create_empty_report()
+    worker.receiveMessage(HostedFormulaMessage('dispatcher', 'formula0', report), 'dispatcher_address')
+
+    worker.send.assert_called_with('pusher_address', report)
+
+
+def test_messages_of_a_HostedFormulaMessageBatch_are_processed_by_their_formula():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+    start_formula(worker, 'formula1')
+    report = PowerReport.create_empty_report()
+    worker.receiveMessage(HostedFormulaMessageBatch('dispatcher', [('formula0', report), ('formula1', report)]), 'dispatcher_address')
+
+    assert get_sent_messages(worker)[-2:] == [('pusher_address', report), ('pusher_address', report)]
+
+
+def test_message_sent_to_unknown_formula_is_dropped():
+    worker = gen_worker()
+    worker.receiveMessage(HostedFormulaMessage('dispatcher', 'formula0', PowerReport.create_empty_report()), 'dispatcher_address')
+
+    assert not worker.send.called
+
+
+def test_hosted_formula_that_receive_EndMessage_ask_the_worker_to_stop_it():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+    worker.receiveMessage(HostedFormulaMessage('dispatcher', 'formula0', EndMessage('dispatcher')), 'dispatcher_address')
+
+    address, message = worker.send.call_args.args
+    assert address == 'worker_address'
+    assert message.formula_name == 'formula0'
+    assert isinstance(message.message, ActorExitRequest)
+
+
+def test_ActorExitRequest_remove_hosted_formula_and_notify_the_dispatcher():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+    worker.receiveMessage(HostedFormulaMessage('worker', 'formula0', ActorExitRequest()), 'worker_address')
+
+    assert not worker.formulas
+    address, message = worker.send.call_args.args
+    assert address == 'dispatcher_address'
+    assert isinstance(message.message, ChildActorExited)
+    assert message.message.childAddress == HostedFormulaAddress('worker_address', 'formula0')
+
+
+def test_hosted_formula_that_fail_to_process_a_message_send_back_a_wrapped_PoisonMessage():
+    worker = gen_worker()
+    start_formula(worker, 'formula0')
+    report = PowerReport.create_empty_report()
+    with patch.object(SimpleFormulaActor, 'receiveMsg_Report', side_effect=ValueError('crash')):
+        worker.receiveMessage(HostedFormulaMessage('dispatcher', 'formula0', report), 'dispatcher_address')
+
+    address, message = worker.send.call_args.args
+    assert address == 'dispatcher_address'
+    assert isinstance(message.message, PoisonMessage)
+    assert message.message.poisonMessage == report
+    assert 'crash' in message.message.details
+
+
+def test_pusher_acknowledgment_is_forwarded_to_the_formulas_that_sent_the_reports():
+    worker = gen_worker()
+    for formula_name in ['formula0', 'formula1']:
+        start_formula(worker, formula_name)
+        worker.receiveMessage(HostedFormulaMessage('dispatcher', formula_name, FlowControlMessage('dispatcher')), 'dispatcher_address')
+    for formula_name in ['formula0', 'formula1', 'formula0']:
+        worker.receiveMessage(HostedFormulaMessage('dispatcher', formula_name, PowerReport.create_empty_report()), 'dispatcher_address')
+    worker.send.reset_mock()
+
+    worker.receiveMessage(AckMessage('pusher', 3), 'pusher_address')
+
+    acks = {message.formula_name: message.message.count for address, message in get_sent_messages(worker)
+            if address == 'dispatcher_address' and isinstance(message.message, AckMessage)}
+    assert acks == {'formula0': 2, 'formula1': 1}
@@ -0,0 +1,117 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import datetime
+
+from mock import Mock
+
+from powerapi.formula import MultiTargetFormulaActor, CpuDramDomainValues, FormulaValues
+from powerapi.message import FormulaStartMessage, ReportBatch, EndMessage, ErrorMessage
+from powerapi.report import HWPCReport
+
+
+class ApertureShareFormula(MultiTargetFormulaActor):
+    """
+    formula that gives each target a power equal to its APERF counter, it records the matrices it receives
+    """
+    def __init__(self):
+        MultiTargetFormulaActor.__init__(self, FormulaStartMessage)
+        self.calls = []
+
+    def compute_power(self, counters, events):
+        self.calls.append((counters, events))
+        return counters[:, events.index(('msr', 'APERF'))]
+
+
+def gen_report(timestamp, target, aperf):
+    return HWPCReport(datetime.datetime.fromtimestamp(timestamp), 'sensor', target, {'msr': {'0': {'0': {'APERF': aperf}}}})
+
+
+def gen_formula(formula_id=('sensor', '0')):
+    """
+    return a started ApertureShareFormula, not bound to any actor system, its send method is mocked
+    """
+    formula = ApertureShareFormula()
+    formula._myRef = Mock(address='formula_address')
+    formula.send = Mock()
+    formula.receiveMessage(FormulaStartMessage('dispatcher', 'formula', FormulaValues({'pusher': 'pusher_address'}),
+                                               CpuDramDomainValues('device', formula_id)), 'dispatcher_address')
+    return formula
+
+
+def get_pushed_reports(formula):
+    pushed = []
+    for address, message in (call.args for call in formula.send.call_args_list):
+        if address == 'pusher_address':
+            pushed += message.reports if isinstance(message, ReportBatch) else [message]
+    return pushed
+
+
+def test_start_multi_target_formula_at_core_depth_answer_ErrorMessage():
+    formula = gen_formula(('sensor', '0', '1'))
+    _, message = formula.send.call_args_list[0].args
+    assert isinstance(message, ErrorMessage)
+
+
+def test_reports_of_a_timestamp_are_processed_together_when_a_newer_report_is_received():
+    formula = gen_formula()
+    formula.receiveMessage(gen_report(1, 'a', 10), 'dispatcher_address')
+    formula.receiveMessage(gen_report(1, 'b', 20), 'dispatcher_address')
+    assert not get_pushed_reports(formula)
+
+    formula.receiveMessage(gen_report(2, 'a', 30), 'dispatcher_address')
+
+    assert len(formula.calls) == 1
+    assert formula.calls[0][0].shape == (2, 1)
+    _, message = formula.send.call_args.args
+    assert isinstance(message, ReportBatch)
+    assert [(report.target, report.power) for report in message.reports] == [('a', 10), ('b', 20)]
+
+
+def test_report_batch_spanning_several_timestamps_push_one_ReportBatch():
+    formula = gen_formula()
+    reports = [gen_report(timestamp, target, timestamp) for timestamp in range(3) for target in ['a', 'b']]
+    formula.receiveMessage(ReportBatch('dispatcher', reports), 'dispatcher_address')
+
+    assert len(formula.calls) == 2
+    assert [(report.target, report.power) for report in get_pushed_reports(formula)] == [('a', 0), ('b', 0), ('a', 1), ('b', 1)]
+
+
+def test_report_older_than_current_timestamp_is_dropped():
+    formula = gen_formula()
+    formula.receiveMessage(gen_report(2, 'a', 10), 'dispatcher_address')
+    formula.receiveMessage(gen_report(1, 'b', 20), 'dispatcher_address')
+    assert formula.late_report_count == 1
+    assert list(formula.tick_reports) == ['a']
+
+
+def test_EndMessage_make_formula_process_the_current_timestamp():
+    formula = gen_formula()
+    formula.receiveMessage(gen_report(1, 'a', 10), 'dispatcher_address')
+    formula.receiveMessage(EndMessage('dispatcher'), 'dispatcher_address')
+    assert [(report.target, report.power) for report in get_pushed_reports(formula)] == [('a', 10)]
@@ -32,21 +32,25 @@ from multiprocessing import Pipe
 
 import pytest
 
-from mock import Mock
+from datetime import timedelta
+
+from mock import Mock, patch
 
 from thespian.actors import ActorExitRequest
 
 from powerapi.puller import PullerActor
-from powerapi.message import PullerStartMessage, ErrorMessage, StartMessage, EndMessage
+from powerapi.message import PullerStartMessage, ErrorMessage, StartMessage, EndMessage, ReportBatch, AckMessage
 from powerapi.filter import Filter, RouterWithoutRuleException
 from powerapi.report import Report
 from powerapi.test_utils.abstract_test import AbstractTestActor, AbstractTestActorWithDB, define_database_content, recv_from_pipe
 from powerapi.test_utils.db import FakeDB
 from powerapi.test_utils.dummy_actor import DummyActor, DummyStartMessage
 from powerapi.test_utils.actor import is_actor_alive, system
+from powerapi.utils import ReportBatcher, CreditWindow
 
 REPORT1 = Report(1, 2, 3)
 REPORT2 = Report(3, 4, 5)
+REPORTS_30 = [Report(i, 'sensor', 'target') for i in range(30)]
 
 
 def define_filter(filt):
@@ -151,3 +155,139 @@ class TestPuller(AbstractTestActorWithDB):
         answer = system.ask(actor, puller_start_message)
         assert isinstance(answer, ErrorMessage)
         assert answer.error_message == 'use PullerStartMessage instead of StartMessage'
+
+    @define_database_content(REPORTS_30)
+    def test_start_actor_with_db_that_contains_more_reports_than_batch_size_make_it_send_all_reports(self, system, started_actor,
+                                                                                                      content, dummy_pipe_out):
+        for report in content:
+            assert recv_from_pipe(dummy_pipe_out, 2) == ('dispatcher', report)
+
+    def test_starting_actor_with_a_batch_size_of_zero_must_answer_error_message(self, system, actor, fake_db, fake_filter):
+        puller_start_message = PullerStartMessage('system', 'puller_test', fake_db, fake_filter, False, batch_size=0)
+        answer = system.ask(actor, puller_start_message)
+        assert isinstance(answer, ErrorMessage)
+        assert answer.error_message == 'batch size must be greater than 0'
+
+    def test_starting_actor_with_a_time_budget_of_zero_must_answer_error_message(self, system, actor, fake_db, fake_filter):
+        puller_start_message = PullerStartMessage('system', 'puller_test', fake_db, fake_filter, False, time_budget=0)
+        answer = system.ask(actor, puller_start_message)
+        assert isinstance(answer, ErrorMessage)
+        assert answer.error_message == 'time budget must be greater than 0'
+
+    def test_starting_actor_with_zero_credits_must_answer_error_message(self, system, actor, fake_db, fake_filter):
+        puller_start_message = PullerStartMessage('system', 'puller_test', fake_db, fake_filter, False, credits=0)
+        answer = system.ask(actor, puller_start_message)
+        assert isinstance(answer, ErrorMessage)
+        assert answer.error_message == 'credits must be greater than 0'
+
+    def test_starting_actor_with_unknown_overflow_policy_must_answer_error_message(self, system, actor, fake_db, fake_filter):
+        puller_start_message = PullerStartMessage('system', 'puller_test', fake_db, fake_filter, False, credits=10,
+                                                  overflow_policy='block')
+        answer = system.ask(actor, puller_start_message)
+        assert isinstance(answer, ErrorMessage)
+        assert answer.error_message == 'overflow policy must be one of pause, drop'
+
+
+def gen_puller(content, batch_size=10, time_budget=None, report_batch_size=1, credits=None, overflow_policy='pause'):
+    """
+    return a PullerActor, not bound to any actor system, that pull the given content in stream mode
+    its send and wakeupAfter methods are mocked
+    """
+    puller = PullerActor()
+    puller.database = Mock(asynchrone=False)
+    puller.database_it = iter(content)
+    puller.report_filter = Filter()
+    puller.report_filter.filter(filter_rule, 'dispatcher')
+    puller.stream_mode = True
+    puller.report_modifier_list = []
+    puller._number_of_message_before_sleeping = batch_size
+    puller._time_budget = time_budget
+    if report_batch_size > 1:
+        puller._report_batcher = ReportBatcher(report_batch_size, 10)
+    if credits is not None:
+        puller._credit_window = CreditWindow(credits)
+        puller._overflow_policy = overflow_policy
+    puller.send = Mock()
+    puller.wakeupAfter = Mock()
+    return puller
+
+
+def test_launch_task_with_more_reports_than_batch_size_send_one_batch_and_wake_up_immediately():
+    puller = gen_puller(REPORTS_30, batch_size=3)
+    puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', report) for report in REPORTS_30[:3]]
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0))
+
+
+def test_launch_task_with_less_reports_than_batch_size_send_them_and_sleep_for_half_the_time_interval():
+    puller = gen_puller([REPORT1, REPORT2], batch_size=3)
+    puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', REPORT1), ('dispatcher', REPORT2)]
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0.025))
+
+
+def test_launch_task_with_empty_db_sleep_for_twice_the_time_interval():
+    puller = gen_puller([])
+    puller._launch_task()
+
+    puller.send.assert_not_called()
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0.1))
+
+
+def test_launch_task_stop_batch_when_time_budget_runs_out_and_wake_up_immediately():
+    puller = gen_puller(REPORTS_30, batch_size=10, time_budget=0.2)
+    with patch('powerapi.puller.time.monotonic', side_effect=[0, 0.1, 0.3]):
+        puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', report) for report in REPORTS_30[:2]]
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0))
+
+
+def test_launch_task_with_report_batch_size_send_full_report_batches_to_dispatcher():
+    puller = gen_puller(REPORTS_30, batch_size=6, report_batch_size=3)
+    puller._launch_task()
+
+    assert puller.send.call_count == 2
+    for (call, expected_reports) in zip(puller.send.call_args_list, [REPORTS_30[:3], REPORTS_30[3:6]]):
+        dispatcher, batch = call.args
+        assert dispatcher == 'dispatcher'
+        assert isinstance(batch, ReportBatch)
+        assert batch.reports == expected_reports
+
+
+def test_launch_task_with_report_batch_size_send_partial_batch_when_input_is_empty():
+    puller = gen_puller([REPORT1, REPORT2], batch_size=6, report_batch_size=3)
+    puller._launch_task()
+
+    puller.send.assert_called_once()
+    _, batch = puller.send.call_args.args
+    assert batch.reports == [REPORT1, REPORT2]
+
+
+def test_launch_task_with_pause_policy_stop_pulling_when_dispatcher_has_no_credit_left():
+    puller = gen_puller(REPORTS_30, batch_size=10, credits=2)
+    puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', report) for report in REPORTS_30[:2]]
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0.1))
+
+
+def test_receiving_AckMessage_from_dispatcher_give_back_credits_to_pull_reports():
+    puller = gen_puller(REPORTS_30, batch_size=10, credits=2)
+    puller._launch_task()
+    puller.receiveMessage(AckMessage('dispatcher', 2), 'dispatcher')
+    puller.send.reset_mock()
+    puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', report) for report in REPORTS_30[2:4]]
+
+
+def test_launch_task_with_drop_policy_drop_reports_when_dispatcher_has_no_credit_left():
+    puller = gen_puller(REPORTS_30, batch_size=5, credits=2, overflow_policy='drop')
+    puller._launch_task()
+
+    assert [call.args for call in puller.send.call_args_list] == [('dispatcher', report) for report in REPORTS_30[:2]]
+    assert puller.dropped_report_count == 3
+    puller.wakeupAfter.assert_called_once_with(timedelta(seconds=0))
@@ -26,16 +26,23 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from threading import Event
+
 import pytest
+from mock import Mock
 
-from thespian.actors import ActorExitRequest
+from thespian.actors import ActorExitRequest, WakeupMessage
 
 from powerapi.report import Report
 from powerapi.pusher import PusherActor
-from powerapi.message import PusherStartMessage, ErrorMessage, EndMessage
+from powerapi.message import PusherStartMessage, ErrorMessage, EndMessage, ReportBatch, FlowControlMessage, AckMessage, \
+    GetPusherStatsMessage, PusherStatsMessage
 from powerapi.test_utils.abstract_test import AbstractTestActorWithDB, recv_from_pipe
 from powerapi.test_utils.report.power import POWER_REPORT_1
 from powerapi.test_utils.actor import system
+from powerapi.actor import InitializationException
+from powerapi.pusher import WRITE_WAKEUP, SPILL_WAKEUP
+from powerapi.database import DBError
 
 class TestPuller(AbstractTestActorWithDB):
 
@@ -66,6 +73,291 @@ class TestPuller(AbstractTestActorWithDB):
         system.tell(started_actor, POWER_REPORT_1)
         assert recv_from_pipe(pipe_out, 0.5) == POWER_REPORT_1
 
+    def test_send_report_batch_to_pusher_make_it_save_all_reports_at_once(self, system, started_actor, pipe_out):
+        system.tell(started_actor, ReportBatch('system', [POWER_REPORT_1, POWER_REPORT_1]))
+        assert recv_from_pipe(pipe_out, 0.5) == [POWER_REPORT_1, POWER_REPORT_1]
+
+    def test_send_report_to_pusher_after_FlowControlMessage_make_it_acknowledge_the_report(self, system, started_actor, pipe_out):
+        system.tell(started_actor, FlowControlMessage('system'))
+        system.tell(started_actor, POWER_REPORT_1)
+        assert recv_from_pipe(pipe_out, 0.5) == POWER_REPORT_1
+        answer = system.listen(1)
+        assert isinstance(answer, AckMessage)
+        assert answer.count == 1
+
     def test_send_EndMessage_to_started_pusher_make_it_forward_to_supervisor(self, system, started_actor, pipe_out):
         system.tell(started_actor, EndMessage('system'))
         assert isinstance(system.listen(1), EndMessage)
+
+
+def gen_pusher(batch_size, linger_time=0.1, async_writes=False, database=None, write_queue_size=100, spill_directory=None):
+    """
+    return a started PusherActor, not bound to any actor system, that saves reports to a mocked database
+    its send and wakeupAfter methods are mocked
+    """
+    pusher = PusherActor()
+    pusher.send = Mock()
+    pusher.wakeupAfter = Mock()
+    pusher._myRef = Mock(address='pusher_address')
+    pusher._initialization(PusherStartMessage('system', 'pusher', Mock() if database is None else database, batch_size, linger_time,
+                                              async_writes, write_queue_size, spill_directory, 1.0, 4.0))
+    pusher.parent = 'supervisor_address'
+    return pusher
+
+
+def get_saved_batches(pusher):
+    return [call.args[0] for call in pusher.output.database.save_many.call_args_list]
+
+
+def get_acknowledgments(pusher):
+    return [(address, message.count) for address, message in (call.args for call in pusher.send.call_args_list)
+            if isinstance(message, AckMessage)]
+
+
+@pytest.mark.parametrize('batch_size, linger_time', [(0, 0.1), (10, 0)])
+def test_initialize_pusher_with_wrong_batching_parameters_raise_InitializationException(batch_size, linger_time):
+    with pytest.raises(InitializationException):
+        gen_pusher(batch_size, linger_time)
+
+
+def test_pusher_with_batch_size_save_buffered_reports_at_once_when_buffer_is_full():
+    pusher = gen_pusher(3)
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+
+    assert get_saved_batches(pusher) == [[POWER_REPORT_1] * 3]
+    pusher.output.database.save.assert_not_called()
+    assert [report for report, _ in pusher.output.report_batcher.batches['database'][1]] == [POWER_REPORT_1]
+    pusher.wakeupAfter.assert_called_once()
+
+
+def test_pusher_with_batch_size_save_buffered_reports_after_linger_time():
+    pusher = gen_pusher(10)
+    # the first report waited for the linger time when the pusher is woken up
+    pusher.output.report_batcher.linger_time = 0
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    assert not get_saved_batches(pusher)
+
+    pusher.receiveMessage(WakeupMessage(None), 'pusher_address')
+
+    assert get_saved_batches(pusher) == [[POWER_REPORT_1]]
+    assert pusher.output.report_batcher.is_empty()
+
+
+def test_pusher_with_batch_size_save_buffered_reports_before_forwarding_EndMessage():
+    pusher = gen_pusher(10)
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+
+    assert get_saved_batches(pusher) == [[POWER_REPORT_1]]
+    assert isinstance(pusher.send.call_args_list[0].args[1], EndMessage)
+
+
+def test_pusher_with_batch_size_acknowledge_a_message_once_all_its_reports_are_saved():
+    pusher = gen_pusher(2)
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    assert len(get_saved_batches(pusher)) == 1
+    assert not get_acknowledgments(pusher)
+
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+
+    assert len(get_saved_batches(pusher)) == 2
+    assert get_acknowledgments(pusher) == [('formula_address', 2)]
+
+
+def test_pusher_with_async_writes_acknowledge_reports_once_saved_by_the_writer_thread():
+    release_save = Event()
+    database = Mock()
+    database.save_many.side_effect = lambda _: release_save.wait(5)
+    pusher = gen_pusher(1, async_writes=True, database=database)
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    assert pusher.output.writer.pending_count == 2
+    pusher.wakeupAfter.assert_called_once()
+    assert pusher.wakeupAfter.call_args.args[1] == WRITE_WAKEUP
+
+    release_save.set()
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+
+    assert get_saved_batches(pusher) == [[POWER_REPORT_1], [POWER_REPORT_1, POWER_REPORT_1]]
+    assert get_acknowledgments(pusher) == [('formula_address', 2)]
+    assert pusher.output.writer.pending_count == 0
+
+
+def test_pusher_with_async_writes_keep_receiving_reports_and_hold_their_acknowledgment_when_the_write_queue_is_full():
+    release_save = Event()
+    database = Mock()
+    database.save_many.side_effect = lambda _: release_save.wait(5)
+    pusher = gen_pusher(1, async_writes=True, database=database, write_queue_size=1)
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+
+    for _ in range(4):
+        pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1]), 'formula_address')
+    pusher.receiveMessage(WakeupMessage(None, WRITE_WAKEUP), 'pusher_address')
+
+    assert pusher.output.writer.backlog
+    assert pusher.output.writer.pending_count == 4
+    assert not get_acknowledgments(pusher)
+
+    release_save.set()
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+    assert database.save_many.call_count == 4
+    assert get_acknowledgments(pusher) == [('formula_address', 4)]
+
+
+def test_pusher_with_async_writes_acknowledge_saved_reports_when_woken_up():
+    pusher = gen_pusher(1, async_writes=True)
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    pusher.output.writer.close()
+
+    pusher.receiveMessage(WakeupMessage(None, WRITE_WAKEUP), 'pusher_address')
+
+    assert get_acknowledgments(pusher) == [('formula_address', 1)]
+    assert pusher.wakeupAfter.call_count == 1
+
+
+def test_send_GetPusherStatsMessage_to_pusher_make_it_answer_its_write_statistics():
+    database = Mock()
+    database.save_many.side_effect = [None, DBError('database down')]
+    pusher = gen_pusher(1, database=database)
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1]), 'formula_address')
+
+    pusher.receiveMessage(GetPusherStatsMessage('system'), 'system_address')
+
+    address, stats = pusher.send.call_args.args
+    assert address == 'system_address'
+    assert isinstance(stats, PusherStatsMessage)
+    assert (stats.queue_depth, stats.write_count, stats.written_report_count, stats.write_error_count) == (0, 2, 2, 1)
+    assert stats.mean_write_latency >= 0
+
+
+def get_spill_wakeup_delays(pusher):
+    return [delay.total_seconds() for delay, payload in (call.args for call in pusher.wakeupAfter.call_args_list) if payload == SPILL_WAKEUP]
+
+
+def test_pusher_with_spill_directory_spill_reports_the_database_failed_to_save_and_acknowledge_them(tmp_path):
+    database = Mock()
+    database.save_many.side_effect = DBError('database down')
+    pusher = gen_pusher(1, database=database, spill_directory=str(tmp_path))
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+
+    # once a write failed, the following reports are spilled without trying to save them
+    assert database.save_many.call_count == 1
+    database.save.assert_not_called()
+    assert pusher.output.spill_queue.report_count == 3
+    assert get_acknowledgments(pusher) == [('formula_address', 1), ('formula_address', 1)]
+    assert get_spill_wakeup_delays(pusher) == [1.0]
+
+
+def test_pusher_save_spilled_reports_in_bulk_once_the_database_recovers(tmp_path):
+    database = Mock()
+    database.save_many.side_effect = [DBError('database down'), None]
+    pusher = gen_pusher(1, database=database, spill_directory=str(tmp_path))
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+
+    pusher.receiveMessage(WakeupMessage(None, SPILL_WAKEUP), 'pusher_address')
+
+    assert database.save_many.call_args.args[0] == [POWER_REPORT_1] * 3
+    assert pusher.output.spill_queue.is_empty()
+    assert pusher.output.replayed_report_count == 3
+    pusher.receiveMessage(POWER_REPORT_1, 'formula_address')
+    database.save.assert_called_once_with(POWER_REPORT_1)
+
+
+def test_pusher_double_the_time_before_replaying_spilled_reports_after_each_failure(tmp_path):
+    database = Mock()
+    database.save_many.side_effect = DBError('database down')
+    pusher = gen_pusher(1, database=database, spill_directory=str(tmp_path))
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1]), 'formula_address')
+
+    for _ in range(3):
+        pusher.receiveMessage(WakeupMessage(None, SPILL_WAKEUP), 'pusher_address')
+
+    assert get_spill_wakeup_delays(pusher) == [1.0, 2.0, 4.0, 4.0]
+    assert pusher.output.spill_queue.report_count == 1
+
+
+def test_pusher_replay_reports_spilled_by_a_previous_pusher(tmp_path):
+    database = Mock()
+    database.save_many.side_effect = DBError('database down')
+    gen_pusher(1, database=database, spill_directory=str(tmp_path)).receiveMessage(ReportBatch('formula', [POWER_REPORT_1]), 'formula_address')
+
+    pusher = gen_pusher(1, spill_directory=str(tmp_path))
+
+    assert pusher.output.spill_queue.report_count == 1
+    assert get_spill_wakeup_delays(pusher) == [1.0]
+
+
+def test_pusher_with_async_writes_spill_reports_when_the_write_queue_is_full(tmp_path):
+    release_save = Event()
+    database = Mock()
+    database.save_many.side_effect = lambda _: release_save.wait(5)
+    pusher = gen_pusher(1, async_writes=True, database=database, write_queue_size=1, spill_directory=str(tmp_path))
+    pusher.receiveMessage(FlowControlMessage('formula'), 'formula_address')
+
+    for _ in range(4):
+        pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1]), 'formula_address')
+    release_save.set()
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+
+    # one write is running, one waits in the queue, the other ones are spilled by the writer thread
+    assert pusher.output.spilled_report_count + database.save_many.call_count == 4
+    assert pusher.output.spilled_report_count >= 2
+    assert get_acknowledgments(pusher) == [('formula_address', 4)]
+
+
+def test_pusher_with_async_writes_spill_and_replay_reports_in_the_order_they_were_received(tmp_path):
+    write_started = Event()
+    release_save = Event()
+    saved_timestamps = []
+
+    def save_many(reports):
+        saved_timestamps.append([report.timestamp for report in reports])
+        if len(saved_timestamps) == 1:
+            write_started.set()
+            release_save.wait(5)
+            raise DBError('database down')
+
+    database = Mock()
+    database.save_many.side_effect = save_many
+    pusher = gen_pusher(1, async_writes=True, database=database, write_queue_size=1, spill_directory=str(tmp_path))
+    pusher.receiveMessage(ReportBatch('formula', [Report(0, 'sensor', 'target')]), 'formula_address')
+    write_started.wait(5)
+    # the first write is running, the second one waits in the queue and the other ones overflow it
+    for timestamp in range(1, 4):
+        pusher.receiveMessage(ReportBatch('formula', [Report(timestamp, 'sensor', 'target')]), 'formula_address')
+
+    release_save.set()
+    pusher.receiveMessage(WakeupMessage(None, SPILL_WAKEUP), 'pusher_address')
+    pusher.receiveMessage(EndMessage('formula'), 'formula_address')
+
+    assert pusher.output.spilled_report_count == 4
+    assert saved_timestamps == [[0], [0, 1, 2, 3]]
+    assert pusher.output.spill_queue.is_empty()
+
+
+def test_pusher_stats_report_spill_size_and_replayed_reports(tmp_path):
+    database = Mock()
+    database.save_many.side_effect = [DBError('database down'), None]
+    pusher = gen_pusher(1, database=database, spill_directory=str(tmp_path))
+    pusher.receiveMessage(ReportBatch('formula', [POWER_REPORT_1, POWER_REPORT_1]), 'formula_address')
+
+    pusher.receiveMessage(GetPusherStatsMessage('system'), 'system_address')
+    stats = pusher.send.call_args.args[1]
+    assert (stats.spilled_report_count, stats.replayed_report_count) == (2, 0)
+    assert stats.spill_size > 0
+
+    pusher.receiveMessage(WakeupMessage(None, SPILL_WAKEUP), 'pusher_address')
+    pusher.receiveMessage(GetPusherStatsMessage('system'), 'system_address')
+    stats = pusher.send.call_args.args[1]
+    assert (stats.spill_size, stats.replayed_report_count) == (0, 2)
+    assert stats.replay_rate > 0
@@ -0,0 +1,131 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from powerapi.formula import RecursiveLeastSquares, RegressionException
+
+
+@pytest.fixture
+def samples():
+    """
+    samples of the relation y = 3 * x0 - 2 * x1 + 5
+    """
+    generator = np.random.default_rng(42)
+    features = generator.uniform(0, 10, size=(200, 2))
+    targets = features @ np.array([3.0, -2.0]) + 5.0
+    return features, targets
+
+
+def test_rls_model_converge_to_linear_relation(samples):
+    model = RecursiveLeastSquares(2)
+    model.update_many(*samples)
+
+    assert model.sample_count == 200
+    assert np.allclose(model.coefficients, [3.0, -2.0], atol=1e-3)
+    assert model.intercept == pytest.approx(5.0, abs=1e-2)
+    assert model.predict(np.array([1.0, 1.0])) == pytest.approx(6.0, abs=1e-2)
+
+
+def test_rls_model_match_batch_least_squares_on_noisy_data(samples):
+    features, targets = samples
+    noisy_targets = targets + np.random.default_rng(0).normal(0, 0.5, size=targets.shape)
+    model = RecursiveLeastSquares(2, initial_covariance=1e8)
+    model.update_many(features, noisy_targets)
+
+    expected, *_ = np.linalg.lstsq(np.column_stack([features, np.ones(len(features))]), noisy_targets, rcond=None)
+    assert np.allclose(model.weights, expected, atol=1e-3)
+
+
+def test_rls_model_without_intercept(samples):
+    features, _ = samples
+    model = RecursiveLeastSquares(2, fit_intercept=False)
+    model.update_many(features, features @ np.array([3.0, -2.0]))
+
+    assert model.weights.shape == (2,)
+    assert model.intercept == 0.0
+    assert np.allclose(model.predict(features[:3]), features[:3] @ np.array([3.0, -2.0]), atol=1e-3)
+
+
+def test_rls_model_with_forgetting_factor_follow_drifting_relation(samples):
+    features, targets = samples
+    model = RecursiveLeastSquares(2, forgetting_factor=0.9)
+    model.update_many(features, targets)
+    model.update_many(features, features @ np.array([1.0, 1.0]))
+
+    assert np.allclose(model.coefficients, [1.0, 1.0], atol=1e-3)
+    assert model.intercept == pytest.approx(0.0, abs=1e-2)
+
+
+def test_rls_model_snapshot_can_be_serialized_and_restored(samples):
+    model = RecursiveLeastSquares(2, forgetting_factor=0.99)
+    model.update_many(*samples)
+
+    for restored_snapshot in (json.loads(json.dumps(model.snapshot())), pickle.loads(pickle.dumps(model.snapshot()))):
+        restored = RecursiveLeastSquares.from_snapshot(restored_snapshot)
+        assert restored.forgetting_factor == 0.99
+        assert restored.sample_count == model.sample_count
+        assert np.array_equal(restored.weights, model.weights)
+        assert np.array_equal(restored.covariance, model.covariance)
+
+
+def test_rls_model_restored_from_snapshot_keep_learning_as_original(samples):
+    features, targets = samples
+    model = RecursiveLeastSquares(2)
+    model.update_many(features[:100], targets[:100])
+    restored = RecursiveLeastSquares.from_snapshot(model.snapshot())
+
+    model.update_many(features[100:], targets[100:])
+    restored.update_many(features[100:], targets[100:])
+    assert np.allclose(restored.weights, model.weights)
+
+
+def test_restore_rls_model_from_invalid_snapshot_raise_exception():
+    snapshot = RecursiveLeastSquares(2).snapshot()
+    snapshot['covariance'] = [[1.0]]
+    with pytest.raises(RegressionException):
+        RecursiveLeastSquares.from_snapshot(snapshot)
+    with pytest.raises(RegressionException):
+        RecursiveLeastSquares.from_snapshot({'feature_number': 2})
+
+
+@pytest.mark.parametrize('parameters', [{'feature_number': 0}, {'feature_number': 2, 'forgetting_factor': 0},
+                                        {'feature_number': 2, 'forgetting_factor': 1.5},
+                                        {'feature_number': 2, 'initial_covariance': -1}])
+def test_create_rls_model_with_invalid_parameters_raise_exception(parameters):
+    with pytest.raises(RegressionException):
+        RecursiveLeastSquares(**parameters)
+
+
+def test_update_rls_model_with_wrong_feature_number_raise_exception():
+    with pytest.raises(RegressionException):
+        RecursiveLeastSquares(2).update(np.array([1.0, 2.0, 3.0]), 1.0)
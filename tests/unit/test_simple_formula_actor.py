@@ -27,13 +27,15 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import pytest
+from mock import Mock
 
 from thespian.actors import ActorExitRequest
 
 from powerapi.formula.dummy import DummyFormulaActor, DummyFormulaValues
 from powerapi.formula import FormulaValues, DomainValues
 from powerapi.formula.simple_formula_actor import SimpleFormulaActor
-from powerapi.message import StartMessage, FormulaStartMessage, ErrorMessage, EndMessage, OKMessage
+from powerapi.message import StartMessage, FormulaStartMessage, ErrorMessage, EndMessage, OKMessage, ReportBatch, \
+    FlowControlMessage, AckMessage
 from powerapi.report import Report, PowerReport, HWPCReport
 from powerapi.test_utils.abstract_test import AbstractTestActor, recv_from_pipe
 from powerapi.test_utils.actor import system
@@ -73,3 +75,57 @@ class TestSimpleFormula(AbstractTestActor):
 
         _, msg = recv_from_pipe(dummy_pipe_out, 2)
         assert msg == report1
+
+    def test_send_report_batch_to_simple_formula_make_formula_send_one_report_batch_to_logger(self, system, started_actor,
+                                                                                           dummy_pipe_out):
+        report1 = PowerReport.create_empty_report()
+        report2 = PowerReport.create_empty_report()
+        system.tell(started_actor, ReportBatch('system', [report1, report2]))
+
+        _, msg = recv_from_pipe(dummy_pipe_out, 2)
+        assert isinstance(msg, ReportBatch)
+        assert msg.reports == [report1, report2]
+        assert recv_from_pipe(dummy_pipe_out, 0.5) == (None, None)
+
+
+def gen_simple_formula():
+    """
+    return a SimpleFormulaActor, not bound to any actor system, connected to one pusher, its send method is mocked
+    """
+    formula = SimpleFormulaActor()
+    formula.name = 'formula'
+    formula.pushers = {'pusher': 'pusher_address'}
+    formula.send = Mock()
+    return formula
+
+
+def test_send_FlowControlMessage_to_formula_make_it_forward_FlowControlMessage_to_pushers():
+    formula = gen_simple_formula()
+    formula.receiveMessage(FlowControlMessage('dispatcher'), 'dispatcher_address')
+
+    address, message = formula.send.call_args.args
+    assert address == 'pusher_address'
+    assert isinstance(message, FlowControlMessage)
+
+
+def test_formula_with_flow_control_acknowledge_report_when_pusher_acknowledge_its_output():
+    formula = gen_simple_formula()
+    formula.receiveMessage(FlowControlMessage('dispatcher'), 'dispatcher_address')
+    report = PowerReport.create_empty_report()
+    formula.receiveMessage(report, 'dispatcher_address')
+    formula.send.assert_called_with('pusher_address', report)
+
+    formula.receiveMessage(AckMessage('pusher', 1), 'pusher_address')
+    address, message = formula.send.call_args.args
+    assert address == 'dispatcher_address'
+    assert isinstance(message, AckMessage)
+    assert message.count == 1
+
+
+def test_formula_without_flow_control_does_not_acknowledge_reports():
+    formula = gen_simple_formula()
+    report = PowerReport.create_empty_report()
+    formula.receiveMessage(report, 'dispatcher_address')
+    formula.receiveMessage(AckMessage('pusher', 1), 'pusher_address')
+
+    formula.send.assert_called_once_with('pusher_address', report)
@@ -0,0 +1,103 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+from datetime import timedelta
+
+import pytest
+
+from mock import Mock
+
+from thespian.actors import ActorExitRequest
+
+from powerapi.actor import TimedActor
+from powerapi.message import StartMessage, GetWakeupStatsMessage, WakeupStatsMessage
+from powerapi.test_utils.actor import system
+
+
+class FakeTimedActor(TimedActor):
+    """
+    TimedActor that find no data to process each time it wakes up
+    """
+    def __init__(self):
+        TimedActor.__init__(self, StartMessage, 0.1, min_time_interval=0.05, max_time_interval=0.4)
+
+    def _launch_task(self):
+        self._schedule_next_task(False)
+
+
+@pytest.fixture
+def timed_actor():
+    """
+    return a FakeTimedActor, not bound to any actor system, with a mocked wakeupAfter method
+    """
+    actor = FakeTimedActor()
+    actor.wakeupAfter = Mock()
+    return actor
+
+
+def test_schedule_next_task_after_data_found_halve_the_time_interval(timed_actor):
+    timed_actor._schedule_next_task(True)
+    timed_actor.wakeupAfter.assert_called_once_with(timedelta(seconds=0.05))
+
+
+def test_schedule_next_task_after_data_found_dont_go_under_min_time_interval(timed_actor):
+    timed_actor._schedule_next_task(True)
+    timed_actor._schedule_next_task(True)
+    timed_actor.wakeupAfter.assert_called_with(timedelta(seconds=0.05))
+
+
+def test_schedule_next_task_after_no_data_found_double_the_time_interval(timed_actor):
+    timed_actor._schedule_next_task(False)
+    timed_actor.wakeupAfter.assert_called_once_with(timedelta(seconds=0.2))
+
+
+def test_schedule_next_task_after_no_data_found_dont_go_over_max_time_interval(timed_actor):
+    for _ in range(4):
+        timed_actor._schedule_next_task(False)
+    timed_actor.wakeupAfter.assert_called_with(timedelta(seconds=0.4))
+
+
+def test_schedule_next_task_with_backlog_wake_up_immediately_and_shorten_the_time_interval(timed_actor):
+    timed_actor._schedule_next_task(True, backlog=True)
+    timed_actor.wakeupAfter.assert_called_once_with(timedelta(seconds=0))
+    assert timed_actor._current_time_interval == timedelta(seconds=0.05)
+
+
+def test_wakeup_stats_hit_ratio():
+    assert WakeupStatsMessage('actor', 0.1, 3, 1).hit_ratio == 0.75
+    assert WakeupStatsMessage('actor', 0.1, 0, 0).hit_ratio == 0.0
+
+
+def test_send_GetWakeupStatsMessage_to_started_timed_actor_make_it_answer_its_stats(system):
+    actor = system.createActor(FakeTimedActor)
+    system.ask(actor, StartMessage('system', 'timed_actor'))
+    answer = system.ask(actor, GetWakeupStatsMessage('system'), 1)
+    system.tell(actor, ActorExitRequest())
+
+    assert isinstance(answer, WakeupStatsMessage)
+    assert 0.1 <= answer.time_interval <= 0.4
+    assert answer.hit_count == 0
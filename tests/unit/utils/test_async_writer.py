@@ -0,0 +1,123 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from threading import Event
+
+from powerapi.utils import AsyncWriter
+
+
+def test_writes_submitted_to_async_writer_are_run_in_order_on_its_thread():
+    written = []
+    writer = AsyncWriter(written.append, 0)
+    writer.start()
+    writer.submit([1, 2], 'a')
+    writer.submit([3], 'b')
+    writer.close()
+
+    assert written == [[1, 2], [3]]
+    assert writer.pop_completed() == ['a', 'b']
+    assert writer.pending_count == 0
+
+
+def test_async_writer_does_not_block_the_submitter_while_writing():
+    release_write = Event()
+    writer = AsyncWriter(lambda _: release_write.wait(5), 2)
+    writer.start()
+    writer.submit([1], 'a')
+    writer.submit([2], 'b')
+
+    assert writer.pop_completed() == []
+    assert writer.pending_count == 2
+
+    release_write.set()
+    writer.close()
+    assert writer.pop_completed() == ['a', 'b']
+
+
+def test_writes_submitted_while_async_writer_queue_is_full_wait_in_its_backlog():
+    write_started = Event()
+    release_write = Event()
+    written = []
+
+    def write(data):
+        write_started.set()
+        release_write.wait(5)
+        written.append(data)
+
+    writer = AsyncWriter(write, 1)
+    writer.start()
+    writer.submit('a', 'a')
+    write_started.wait(5)
+    for data in 'bcd':
+        writer.submit(data, data)
+
+    assert list(writer.backlog) == [('c', 'c'), ('d', 'd')]
+    assert writer.queue_depth == 3
+    assert not writer.try_submit('e', 'e')
+
+    release_write.set()
+    writer.close()
+    assert written == ['a', 'b', 'c', 'd']
+    assert writer.pop_completed() == ['a', 'b', 'c', 'd']
+    assert writer.pending_count == 0
+
+
+def test_async_writer_move_backlog_writes_to_its_queue_when_done_writes_are_collected():
+    written = []
+    writer = AsyncWriter(written.append, 1)
+    writer.submit('a', 'a')
+    writer.submit('b', 'b')
+    assert list(writer.backlog) == [('b', 'b')]
+
+    writer.queue.get_nowait()
+    writer.pop_completed()
+
+    assert not writer.backlog
+    assert writer.queue.get_nowait() == ('b', 'b')
+
+
+def test_failed_write_is_completed_and_async_writer_keep_writing():
+    written = []
+
+    def write(data):
+        if data == 'fail':
+            raise ValueError()
+        written.append(data)
+
+    writer = AsyncWriter(write, 0)
+    writer.start()
+    writer.submit('fail', 'a')
+    writer.submit('ok', 'b')
+    writer.close()
+
+    assert written == ['ok']
+    assert writer.pop_completed() == ['a', 'b']
+
+
+def test_close_async_writer_that_is_not_started_do_nothing():
+    AsyncWriter(print, 0).close()
@@ -0,0 +1,86 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from powerapi.utils import CreditWindow, AckTracker, PendingAck
+
+
+def test_credit_window_has_credit_until_credits_are_consumed():
+    window = CreditWindow(2)
+    window.consume('a')
+    assert window.has_credit('a')
+    assert not window.is_exhausted()
+    window.consume('a')
+    assert not window.has_credit('a')
+    assert window.has_credit('b')
+    assert window.is_exhausted()
+
+
+def test_credit_window_release_give_back_credits():
+    window = CreditWindow(1)
+    window.consume('a')
+    window.release('a', 1)
+    assert window.has_credit('a')
+    assert not window.is_exhausted()
+
+
+def test_credit_window_release_more_credits_than_consumed_does_not_grant_extra_credits():
+    window = CreditWindow(1)
+    window.release('a', 3)
+    window.consume('a')
+    assert not window.has_credit('a')
+
+
+def test_ack_tracker_acknowledge_upstream_message_when_all_downstream_messages_are_acknowledged():
+    tracker = AckTracker()
+    pending_ack = PendingAck('upstream')
+    tracker.sent('f1', [pending_ack])
+    tracker.sent('f2', [pending_ack])
+
+    assert tracker.acknowledged('f1', 1) == []
+    assert tracker.acknowledged('f2', 1) == ['upstream']
+
+
+def test_ack_tracker_acknowledge_downstream_messages_in_sending_order():
+    tracker = AckTracker()
+    first, second = PendingAck('u1'), PendingAck('u2')
+    tracker.sent('f', [first])
+    tracker.sent('f', [])
+    tracker.sent('f', [second])
+
+    assert tracker.acknowledged('f', 2) == ['u1']
+    assert tracker.acknowledged('f', 1) == ['u2']
+
+
+def test_ack_tracker_forget_acknowledge_all_messages_sent_to_a_downstream_actor():
+    tracker = AckTracker()
+    first, second = PendingAck('u1'), PendingAck('u2')
+    tracker.sent('f', [first, second])
+    tracker.sent('f', [second])
+
+    assert tracker.forget('f') == ['u1', 'u2']
+    assert tracker.acknowledged('f', 1) == []
@@ -0,0 +1,151 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+
+from powerapi.utils import PrefixIndex
+
+
+def test_get_from_empty_index_return_empty_list():
+    assert PrefixIndex().get(['A', 'B']) == []
+
+
+def test_get_with_empty_prefix_return_all_values_in_insertion_order():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    index.add(('C', 'D'), 2)
+    index.add(('A', 'E'), 3)
+    assert index.get([]) == [1, 2, 3]
+
+
+def test_get_with_prefix_return_values_in_insertion_order_whatever_their_path():
+    index = PrefixIndex()
+    index.add(('A', 'C'), 1)
+    index.add(('A', 'B', 'D'), 2)
+    index.add(('A',), 3)
+    index.add(('A', 'B'), 4)
+    assert index.get(['A']) == [1, 2, 3, 4]
+
+
+def test_replaced_value_keep_its_rank_in_insertion_order():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    index.add(('A', 'C'), 2)
+    index.add(('A', 'B'), 3)
+    assert index.get(['A']) == [3, 2]
+
+
+def test_value_removed_then_added_again_is_put_at_the_end_of_insertion_order():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    index.add(('A', 'C'), 2)
+    index.remove(('A', 'B'))
+    index.add(('A', 'B'), 3)
+    assert index.get(['A']) == [2, 3]
+
+
+def test_get_with_prefix_return_values_whose_path_starts_with_prefix():
+    index = PrefixIndex()
+    index.add(('A', 'B', 'C'), 1)
+    index.add(('A', 'B', 'D'), 2)
+    index.add(('A', 'E', 'C'), 3)
+    assert index.get(['A', 'B']) == [1, 2]
+    assert index.get(['A', 'E', 'C']) == [3]
+    assert index.get(['A', 'F']) == []
+
+
+def test_add_value_on_existing_path_replace_it():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    index.add(('A', 'B'), 2)
+    assert index.get(['A']) == [2]
+    assert len(index) == 1
+
+
+def test_remove_value_make_it_unreachable_and_prune_empty_nodes():
+    index = PrefixIndex()
+    index.add(('A', 'B', 'C'), 1)
+    index.add(('A', 'D', 'E'), 2)
+    index.remove(('A', 'B', 'C'))
+
+    assert index.get(['A']) == [2]
+    assert list(index.root.children['A'].children) == ['D']
+    assert len(index) == 1
+
+
+def test_remove_last_value_empty_the_index():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    index.remove(('A', 'B'))
+    assert index.root.children == {}
+    assert len(index) == 0
+
+
+def test_remove_value_keep_values_stored_under_its_path():
+    index = PrefixIndex()
+    index.add(('A',), 1)
+    index.add(('A', 'B'), 2)
+    index.remove(('A',))
+    assert index.get(['A']) == [2]
+
+
+def test_remove_unknown_path_raise_KeyError():
+    index = PrefixIndex()
+    index.add(('A', 'B'), 1)
+    with pytest.raises(KeyError):
+        index.remove(('A', 'C'))
+    with pytest.raises(KeyError):
+        index.remove(('A',))
+
+
+class ComparisonCounter(str):
+    """
+    label that counts how many times it is compared for equality, a linear scan of the children of a node compares
+    the searched label with each of them
+    """
+    comparison_count = 0
+    __hash__ = str.__hash__
+
+    def __eq__(self, other):
+        ComparisonCounter.comparison_count += 1
+        return str.__eq__(self, other)
+
+
+def test_add_and_remove_5k_values_under_a_shared_prefix_never_scan_the_children_of_a_node():
+    labels = [ComparisonCounter('target' + str(i)) for i in range(5000)]
+    index = PrefixIndex()
+    ComparisonCounter.comparison_count = 0
+    for i, label in enumerate(labels):
+        index.add(('sensor', label), i)
+    assert index.get(['sensor']) == list(range(5000))
+    for label in labels:
+        index.remove(('sensor', label))
+
+    # each operation compares its label with a few others, a linear scan would compare it with all the labels
+    assert ComparisonCounter.comparison_count <= 10 * len(labels)
+    assert len(index) == 0
@@ -0,0 +1,80 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from mock import patch
+
+from powerapi.utils import ReportBatcher
+
+
+def test_add_report_to_a_batch_that_is_not_full_return_None():
+    batcher = ReportBatcher(3, 1)
+    assert batcher.add('a', 1) is None
+    assert batcher.add('a', 2) is None
+    assert not batcher.is_empty()
+
+
+def test_add_report_that_fill_the_batch_return_the_batch_and_remove_it_from_buffer():
+    batcher = ReportBatcher(2, 1)
+    batcher.add('a', 1)
+    assert batcher.add('a', 2) == [1, 2]
+    assert batcher.is_empty()
+
+
+def test_reports_with_different_keys_are_put_in_different_batches():
+    batcher = ReportBatcher(2, 1)
+    batcher.add('a', 1)
+    batcher.add('b', 2)
+    assert batcher.add('a', 3) == [1, 3]
+    assert batcher.pop_all() == [('b', [2])]
+
+
+def test_pop_expired_only_return_batches_older_than_linger_time():
+    batcher = ReportBatcher(10, 1)
+    with patch('powerapi.utils.report_batcher.time.monotonic', side_effect=[0, 0.5, 1.2]):
+        batcher.add('a', 1)
+        batcher.add('b', 2)
+        assert batcher.pop_expired() == [('a', [1])]
+    assert batcher.pop_all() == [('b', [2])]
+
+
+def test_pop_all_empty_the_buffer():
+    batcher = ReportBatcher(10, 1)
+    batcher.add('a', 1)
+    batcher.add('b', 2)
+    assert batcher.pop_all() == [('a', [1]), ('b', [2])]
+    assert batcher.is_empty()
+    assert batcher.pop_all() == []
+
+
+def test_pop_return_and_remove_the_batch_of_a_destination():
+    batcher = ReportBatcher(10, 1)
+    batcher.add('a', 1)
+    batcher.add('b', 2)
+    assert batcher.pop('a') == [1]
+    assert batcher.pop('a') is None
+    assert batcher.pop_all() == [('b', [2])]
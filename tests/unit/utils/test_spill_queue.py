@@ -0,0 +1,105 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+
+import pytest
+
+from powerapi.utils import SpillQueue
+
+
+@pytest.fixture
+def spill_directory(tmp_path):
+    return str(tmp_path / 'spill')
+
+
+def get_segment_files(spill_directory):
+    return [file_name for file_name in os.listdir(spill_directory) if file_name.endswith('.spill')]
+
+
+def test_batches_appended_to_spill_queue_are_read_in_order(spill_directory):
+    queue = SpillQueue(spill_directory)
+    queue.append([1, 2])
+    queue.append([3])
+
+    assert queue.report_count == 3
+    assert queue.peek(10) == ([1, 2, 3], 2)
+    assert queue.peek(2) == ([1, 2], 1)
+    assert queue.peek(1) == ([1, 2], 1)
+
+
+def test_committed_batches_are_removed_from_spill_queue(spill_directory):
+    queue = SpillQueue(spill_directory)
+    queue.append([1, 2])
+    queue.append([3])
+    queue.commit(1)
+
+    assert queue.peek(10) == ([3], 1)
+    assert queue.report_count == 1
+    queue.commit(1)
+    assert queue.is_empty()
+    assert queue.size == 0
+    assert queue.peek(10) == ([], 0)
+
+
+def test_spill_queue_read_batches_left_by_previous_queue_first(spill_directory):
+    queue = SpillQueue(spill_directory)
+    queue.append([1])
+    queue.append([2])
+    queue.commit(1)
+
+    restored = SpillQueue(spill_directory)
+    restored.append([3])
+    assert restored.report_count == 2
+    assert restored.peek(10) == ([2, 3], 2)
+
+
+def test_spill_queue_ignore_batch_truncated_by_a_crash(spill_directory):
+    queue = SpillQueue(spill_directory)
+    queue.append([1])
+    queue.append([2])
+    segment_path = os.path.join(spill_directory, get_segment_files(spill_directory)[0])
+    os.truncate(segment_path, os.path.getsize(segment_path) - 1)
+
+    restored = SpillQueue(spill_directory)
+    assert restored.peek(10) == ([1], 1)
+    assert restored.report_count == 1
+
+
+def test_spill_queue_delete_segment_files_whose_batches_are_committed(spill_directory):
+    queue = SpillQueue(spill_directory, segment_size=1)
+    for report in range(3):
+        queue.append([report])
+    assert len(get_segment_files(spill_directory)) == 3
+
+    queue.commit(2)
+    assert len(get_segment_files(spill_directory)) == 1
+    queue.commit(1)
+    queue.append([4])
+    assert len(get_segment_files(spill_directory)) == 1
+    assert queue.peek(10) == ([4], 1)
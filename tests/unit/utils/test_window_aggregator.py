@@ -0,0 +1,114 @@
+# Copyright (c) 2021, INRIA
+# Copyright (c) 2021, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+
+from powerapi.utils import TumblingWindowAggregator
+
+
+def test_add_values_of_the_same_window_return_no_closed_window():
+    aggregator = TumblingWindowAggregator(10)
+    assert aggregator.add('a', 100, 1) == []
+    assert aggregator.add('a', 105, 3) == []
+    assert not aggregator.is_empty()
+
+
+def test_add_value_of_a_later_window_close_the_window_of_its_key():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 102, 10)
+    aggregator.add('a', 106, 20)
+    aggregator.add('a', 108, 30)
+
+    [(key, window)] = aggregator.add('a', 111, 40)
+
+    assert key == 'a'
+    assert (window.start, window.end, window.count) == (100, 110, 3)
+    assert (window.mean, window.min, window.max) == (20, 10, 30)
+    # each value is held until the next one, the last one until the end of the window
+    assert window.energy == pytest.approx(10 * 4 + 20 * 2 + 30 * 2)
+    assert list(aggregator.windows) == ['a']
+
+
+def test_windows_of_different_keys_are_aggregated_separately():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 100, 1)
+    aggregator.add('b', 100, 5)
+    aggregator.add('a', 101, 3)
+
+    windows = dict(aggregator.pop_all())
+
+    assert windows['a'].mean == 2
+    assert windows['b'].mean == 5
+    assert aggregator.is_empty()
+
+
+def test_window_of_a_key_that_stopped_receiving_values_is_closed_one_window_length_after_its_end():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 100, 1)
+    aggregator.add('b', 100, 1)
+    assert [key for key, _ in aggregator.add('b', 115, 1)] == ['b']
+
+    closed = aggregator.add('b', 121, 1)
+
+    assert [(key, window.start) for key, window in closed] == [('b', 110), ('a', 100)]
+
+
+def test_value_of_an_already_closed_window_is_dropped():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 100, 1)
+    aggregator.add('a', 112, 1)
+
+    assert aggregator.add('a', 105, 1) == []
+
+    assert aggregator.late_count == 1
+    assert aggregator.windows['a'].count == 1
+
+
+def test_each_stream_has_its_own_watermark():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 100, 1, stream='sensor_a')
+    aggregator.add('b', 100, 1, stream='sensor_b')
+    aggregator.add('b', 135, 1, stream='sensor_b')
+
+    # sensor_a lags behind sensor_b, its values are neither late nor its windows expired
+    assert aggregator.add('a', 105, 3, stream='sensor_a') == []
+
+    assert aggregator.late_count == 0
+    assert aggregator.watermarks == {'sensor_a': 105, 'sensor_b': 135}
+    assert aggregator.windows['a'].count == 2
+
+
+def test_window_expire_with_the_watermark_of_its_stream_only():
+    aggregator = TumblingWindowAggregator(10)
+    aggregator.add('a', 100, 1, stream='sensor_a')
+    aggregator.add('b', 100, 1, stream='sensor_b')
+
+    closed = aggregator.add('a2', 121, 1, stream='sensor_a')
+
+    assert [key for key, _ in closed] == ['a']
+    assert list(aggregator.windows) == ['b', 'a2']